@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name        : aseg_client.py
+# Description : Submit segmentations to the evaluation service (see
+#               aseg_server.py). Standard library only: fast start-up.
+#
+# Authors     : William A. Romero R.  <romero@creatis.insa-lyon.fr>
+#                                     <contact@waromero.com>
+#-------------------------------------------------------------------------------
+import os
+import sys
+import csv
+import json
+import argparse
+import urllib.error
+import urllib.request
+
+
+if __name__ == '__main__':
+    """
+    Example:
+
+    [mainframe@user myosaiq]$ ./aseg_client.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv
+    [mainframe@user myosaiq]$ ./aseg_client.py -r ./references/RefSegmentation_01.nii.gz -t ./TarSegmentation.nii.gz
+    [mainframe@user myosaiq]$ ./aseg_client.py --status
+    """
+
+    cmdLineParser = argparse.ArgumentParser(description='Submit segmentations to the evaluation service (aseg_server.py).')
+    #_________COMMAND-LINE_OPTIONS_________
+    cmdLineParser.add_argument("-v", "--version",   action='version', version='%(prog)s 0.1.0 - Evaluation Service Client.')
+    cmdLineParser.add_argument("-i", "--input",     dest="input_csv_file", default=None, help="Input CSV file with two columns: <REFERENCE FILE>, <TARGET FILE>.")
+    cmdLineParser.add_argument("-r", "--reference", dest="reference_file", default=None, help="Reference segmentation (single pair).")
+    cmdLineParser.add_argument("-t", "--target",    dest="target_file", default=None, help="Target segmentation (single pair).")
+    cmdLineParser.add_argument("-o", "--output",    dest="output_csv_file", default=None, help="Output CSV file with results (default: print).")
+    cmdLineParser.add_argument("--wide",            dest="wide", action='store_true', help="Wide layout: one row per segmentation, one column per label and metric.")
+    cmdLineParser.add_argument("--status",          dest="status", action='store_true', help="Print the service status.")
+    cmdLineParser.add_argument("--server",          dest="server", default="http://127.0.0.1:8777", help="Service URL (default: http://127.0.0.1:8777).")
+
+    cmdLineArgs = cmdLineParser.parse_args()
+
+    SERVER_URL = cmdLineArgs.server.rstrip("/")
+
+    try:
+        if cmdLineArgs.status:
+            with urllib.request.urlopen( SERVER_URL + "/status" ) as response:
+                print( json.dumps( json.load(response), indent=2 ) )
+            sys.exit(0)
+
+        """
+        ------------------------------------------------------------------------
+        1. Job: (reference, target) pairs, as absolute paths.
+        ------------------------------------------------------------------------
+        """
+        if cmdLineArgs.input_csv_file is not None:
+            with open( cmdLineArgs.input_csv_file, newline="" ) as csvFile:
+                pairs = [ ( row["REFERENCE"], row["TARGET"] ) for row in csv.DictReader( csvFile ) ]
+
+        elif (cmdLineArgs.reference_file is not None) and (cmdLineArgs.target_file is not None):
+            pairs = [ ( cmdLineArgs.reference_file, cmdLineArgs.target_file ) ]
+
+        else:
+            cmdLineParser.error("-i or -r/-t required.")
+
+        job = { "pairs": [ [ os.path.abspath(pair[0]), os.path.abspath(pair[1]) ] for pair in pairs ],
+                "layout": "wide" if cmdLineArgs.wide else "long" }
+
+        """
+        ------------------------------------------------------------------------
+        2. Submit and export results.
+        ------------------------------------------------------------------------
+        """
+        request = urllib.request.Request( SERVER_URL + "/assess",
+                                          data=json.dumps(job).encode("utf-8"),
+                                          headers={ "Content-Type": "application/json" } )
+
+        with urllib.request.urlopen( request ) as response:
+            results = json.load( response )
+
+        outputFile = sys.stdout
+
+        if cmdLineArgs.output_csv_file is not None:
+            outputFile = open( cmdLineArgs.output_csv_file, "w", newline="" )
+
+        with outputFile:
+            writer = csv.writer( outputFile, lineterminator="\n" )
+            writer.writerow( results["columns"] )
+            writer.writerows( [ [ "" if value is None else value for value in row ] for row in results["data"] ] )
+
+        if cmdLineArgs.output_csv_file is not None:
+            print("[aseg_client] Results to CSV file done!")
+
+    except urllib.error.HTTPError as error:
+        print("[aseg_client Error] %s" % error.read().decode("utf-8"), file=sys.stderr)
+        sys.exit(1)
+
+    except urllib.error.URLError as error:
+        print("[aseg_client Error] Service not available (%s): %s" % (SERVER_URL, error.reason), file=sys.stderr)
+        sys.exit(1)
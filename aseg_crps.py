@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name        : aseg_crps.py
+# Description : Score CDF submissions against the volumes of segmentations.
+#
+# Authors     : William A. Romero R.  <romero@creatis.insa-lyon.fr>
+#                                     <contact@waromero.com>
+#-------------------------------------------------------------------------------
+import os
+import sys
+import argparse
+
+import pandas as pd
+from myosaiq import SegmentationsCRPS
+
+
+if __name__ == '__main__':
+    """
+    Example:
+
+    [mainframe@user myosaiq]$ ./aseg_crps.py -i ./data/Segmentations.csv -f ./submission.csv -o ./ResultsCRPS.csv
+    [mainframe@user myosaiq]$ ./aseg_crps.py -i ./data/Segmentations.csv -f ./submission.npz -o ./ResultsCRPS.csv --cases ./ResultsCRPSCases.csv -j 4
+    [mainframe@user myosaiq]$ ./aseg_crps.py -i ./data/Segmentations.csv -f ./submission.csv -o ./ResultsCRPS.csv -s ./references_store
+    [mainframe@user myosaiq]$ ./aseg_crps.py -i ./data/Segmentations.csv -o ./BaselineCRPS.csv
+    """
+
+    cmdLineParser = argparse.ArgumentParser(description='Calculate the CRPS of a CDF submission against the reference volumes of a set of segmentations.')
+    #_________COMMAND-LINE_OPTIONS_________
+    cmdLineParser.add_argument("-v", "--version", action='version', version='%(prog)s 0.1.0 - Segmentations CRPS.')
+    cmdLineParser.add_argument("-i", "--input",   dest="input_csv_file", help="Input CSV file with a <REFERENCE FILE> column (and <TARGET FILE>, used without submission). Check test data for examples.", required=True)
+    cmdLineParser.add_argument("-f", "--file",    dest="cdf_file", default=None,
+                               help="CDF submission: ID, LABEL, P0, P1, ... P599 (.csv) or ID, LABEL and P arrays (.npz). Case IDs are reference file names without extension, labels LV, MYO, MI or MVO. Without submission, target volumes are scored.")
+    cmdLineParser.add_argument("-o", "--output",  dest="output_csv_file", help="Output CSV file with the CRPS of each label.", required=True)
+    cmdLineParser.add_argument("--cases",         dest="cases_file", default=None, help="Output CSV file with the reference volume and CRPS of each case and label.")
+    cmdLineParser.add_argument("-j", "--jobs",    dest="jobs", type=int, default=1, help="Number of worker processes (default: 1, sequential).")
+    cmdLineParser.add_argument("-s", "--store",   dest="store_dir", default=None, help="Reference store directory (see aseg_precompute.py).")
+    cmdLineParser.add_argument("--mmap",          dest="memory_map", action='store_true', help="Memory-map uncompressed NIfTI (.nii) files instead of reading them.")
+
+    cmdLineArgs = cmdLineParser.parse_args()
+
+    """
+    ----------------------------------------------------------------------------
+    1. Create an instance of the SegmentationsCRPS class
+.   ----------------------------------------------------------------------------
+    """
+    segmentationsCRPS = SegmentationsCRPS( cmdLineArgs.input_csv_file,
+                                           cmdLineArgs.cdf_file,
+                                           jobs=cmdLineArgs.jobs,
+                                           referenceStoreDir=cmdLineArgs.store_dir,
+                                           memoryMap=cmdLineArgs.memory_map )
+
+    print( segmentationsCRPS )
+
+    """
+    ----------------------------------------------------------------------------
+    2. Calculate reference volumes and CRPS, and export results.
+.   ----------------------------------------------------------------------------
+    """
+    segmentationsCRPS.Compute()
+
+    pd.options.display.float_format = '{:18,.4f}'.format
+
+    print( "\n", segmentationsCRPS.GetDataFrame(), "\n" )
+
+    segmentationsCRPS.ToCSV( cmdLineArgs.output_csv_file, cmdLineArgs.cases_file )
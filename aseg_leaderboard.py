@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name        : aseg_leaderboard.py
+# Description : Assess and rank several submissions against one reference set.
+#
+# Authors     : William A. Romero R.  <romero@creatis.insa-lyon.fr>
+#                                     <contact@waromero.com>
+#-------------------------------------------------------------------------------
+import os
+import argparse
+
+import pandas as pd
+from myosaiq import Leaderboard
+
+
+if __name__ == '__main__':
+    """
+    Example:
+
+    [mainframe@user myosaiq]$ ./aseg_leaderboard.py -i ./data/References.csv -t TEAM_A=./submissions/team_a -t TEAM_B=./submissions/team_b.csv -o ./leaderboard
+    """
+
+    cmdLineParser = argparse.ArgumentParser(description='Calculate evaluation metrics of several submissions and rank them.')
+    #_________COMMAND-LINE_OPTIONS_________
+    cmdLineParser.add_argument("-v", "--version", action='version', version='%(prog)s 0.1.0 - Leaderboard.')
+    cmdLineParser.add_argument("-i", "--input",   dest="input_csv_file", help="Input CSV file with a <REFERENCE FILE> column. Check test data for examples.", required=True)
+    cmdLineParser.add_argument("-t", "--team",    dest="teams", action="append", required=True,
+                               help="Submission as <TEAM>=<DIRECTORY or CSV FILE> (repeat for each team). Directory targets have the file name of their reference; CSV files have REFERENCE and TARGET columns.")
+    cmdLineParser.add_argument("-o", "--output",  dest="output_dir", help="Output directory: <TEAM>.csv results and Ranking.csv.", required=True)
+    cmdLineParser.add_argument("-j", "--jobs",    dest="jobs", type=int, default=1, help="Number of worker processes (default: 1, sequential).")
+    cmdLineParser.add_argument("-s", "--store",   dest="store_dir", default=None, help="Reference store directory (see aseg_precompute.py).")
+    cmdLineParser.add_argument("--mmap",          dest="memory_map", action='store_true', help="Memory-map uncompressed NIfTI (.nii) files instead of reading them.")
+    cmdLineParser.add_argument("-e", "--surface-engine", dest="surface_engine", choices=["distancemap", "kdtree"], default="distancemap", help="HD/ASSD engine: SimpleITK distance maps (default) or KD-tree of surface points (requires scipy).")
+
+    cmdLineParser.add_argument("-b", "--bootstrap", dest="bootstrap", type=int, default=0, help="Number of bootstrap resamples for confidence intervals of overall metrics (default: 0, none).")
+    cmdLineParser.add_argument("--confidence",    dest="confidence", type=float, default=0.95, help="Bootstrap confidence level (default: 0.95).")
+    cmdLineParser.add_argument("--seed",          dest="seed", type=int, default=None, help="Bootstrap random seed (default: none).")
+
+    cmdLineArgs = cmdLineParser.parse_args()
+
+    INPUT_CSV_FILE_PATH = cmdLineArgs.input_csv_file
+    OUTPUT_DIR = cmdLineArgs.output_dir
+
+    SUBMISSIONS = {}
+
+    for team in cmdLineArgs.teams:
+        if "=" in team:
+            teamName, submission = team.split( "=", 1 )
+        else:
+            submission = team
+            teamName = os.path.splitext( os.path.basename(os.path.normpath(submission)) )[0]
+
+        SUBMISSIONS[teamName] = submission
+
+    """
+    ----------------------------------------------------------------------------
+    1. Create an instance of the Leaderboard class
+.   ----------------------------------------------------------------------------
+    """
+    leaderboard = Leaderboard( INPUT_CSV_FILE_PATH,
+                               SUBMISSIONS,
+                               jobs=cmdLineArgs.jobs,
+                               referenceStoreDir=cmdLineArgs.store_dir,
+                               memoryMap=cmdLineArgs.memory_map,
+                               surfaceEngine=cmdLineArgs.surface_engine )
+
+    print( leaderboard )
+
+    """
+    ----------------------------------------------------------------------------
+    2. Calculate metrics, rank submissions and export results.
+.   ----------------------------------------------------------------------------
+    """
+    leaderboard.Compute()
+
+    if cmdLineArgs.bootstrap > 0:
+        leaderboard.ComputeConfidenceIntervals( cmdLineArgs.bootstrap, cmdLineArgs.confidence, cmdLineArgs.seed )
+
+    pd.options.display.float_format = '{:18,.3f}'.format
+
+    print( "\n", leaderboard.GetRankingDataFrame()[ ["RANK", "TEAM", "CASES", "MISSING", "MEAN RANK"] ], "\n" )
+
+    leaderboard.ToCSV( OUTPUT_DIR )
@@ -20,6 +20,16 @@ if __name__ == '__main__':
     Example:
 
     [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv 
+    [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv -j 4
+    [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv -p 2
+    [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv --mmap
+    [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv -e kdtree
+    [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv --slices ./ResultsSlices.csv --slice-jobs 4
+    [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv -c ./cache
+    [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv -s ./references_store
+    [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv -t ./Timings.csv --trace-memory
+    [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.parquet -f parquet --wide
+    [mainframe@user myosaiq]$ ./aseg_list.py -i ./data/Segmentations.csv -o ./ResultsSegmentations.csv -b 2000 --seed 1
     """
 
     cmdLineParser = argparse.ArgumentParser(description='Calculate evaluation metrics for a set of segmentations.')
@@ -27,18 +37,53 @@ if __name__ == '__main__':
     cmdLineParser.add_argument("-v", "--version",   action='version', version='%(prog)s 0.1.0 - Assess Segmentations.')
     cmdLineParser.add_argument("-i", "--input",  dest="input_csv_file",  help="Input CSV file with two columns: <REFERENCE FILE>, <TARGET FILE>. Check test data for examples.", required=True)
     cmdLineParser.add_argument("-o", "--output", dest="output_csv_file", help="Output CSV file with results.", required=True)   
+    cmdLineParser.add_argument("-f", "--format", dest="output_format", choices=["csv", "parquet", "arrow"], default="csv", help="Output file format (default: csv). Parquet and Arrow IPC require pyarrow.")
+    cmdLineParser.add_argument("--wide",         dest="wide", action='store_true', help="Wide layout: one row per segmentation, one column per label and metric.")
+    cmdLineParser.add_argument("-b", "--bootstrap", dest="bootstrap", type=int, default=0, help="Number of bootstrap resamples for confidence intervals of overall metrics (CI LOW, CI HIGH columns; default: 0, none).")
+    cmdLineParser.add_argument("--confidence",   dest="confidence", type=float, default=0.95, help="Bootstrap confidence level (default: 0.95).")
+    cmdLineParser.add_argument("--seed",         dest="seed", type=int, default=None, help="Bootstrap random seed (default: none).")
+    cmdLineParser.add_argument("-j", "--jobs",   dest="jobs", type=int, default=1, help="Number of worker processes (default: 1, sequential).")
+    cmdLineParser.add_argument("-p", "--prefetch", dest="prefetch", type=int, default=0, help="Sequential execution: number of upcoming cases read in background while computing (default: 0).")
+    cmdLineParser.add_argument("-c", "--cache",  dest="cache_dir", default=None, help="Results cache directory: unchanged (reference, target) pairs are not recomputed.")
+    cmdLineParser.add_argument("--cache-size",   dest="cache_size", type=int, default=512, help="Results cache size cap in MB (default: 512).")
+    cmdLineParser.add_argument("--mmap",         dest="memory_map", action='store_true', help="Memory-map uncompressed NIfTI (.nii) files instead of reading them.")
+    cmdLineParser.add_argument("-e", "--surface-engine", dest="surface_engine", choices=["distancemap", "kdtree"], default="distancemap", help="HD/ASSD engine: SimpleITK distance maps (default) or KD-tree of surface points (requires scipy).")
+    cmdLineParser.add_argument("--slices",       dest="slices_file", default=None, help="Slice-wise (2D) evaluation: output CSV file with per-slice metrics. Case HD and ASSD are reduced from in-plane slice distances.")
+    cmdLineParser.add_argument("--slice-jobs",   dest="slice_jobs", type=int, default=1, help="Slice-wise evaluation: threads computing the slices of a case (default: 1).")
+    cmdLineParser.add_argument("-s", "--store",  dest="store_dir", default=None, help="Reference store directory (see aseg_precompute.py).")
+    cmdLineParser.add_argument("-t", "--timings", dest="timings_file", default=None, help="Output CSV (or .json) file with per-stage timings of computed cases.")
+    cmdLineParser.add_argument("--trace-memory", dest="trace_memory", action='store_true', help="Add per-stage peak memory to timings (slower).")
 
     cmdLineArgs = cmdLineParser.parse_args()
 
     INPUT_CSV_FILE_PATH = cmdLineArgs.input_csv_file
     OUTPUT_CSV_FILE_PATH = cmdLineArgs.output_csv_file
+    OUTPUT_FORMAT = cmdLineArgs.output_format
+    OUTPUT_LAYOUT = "wide" if cmdLineArgs.wide else "long"
+    NUM_JOBS = cmdLineArgs.jobs
+    CACHE_DIR = cmdLineArgs.cache_dir
+    CACHE_MAX_SIZE = cmdLineArgs.cache_size * 1024 * 1024
+    STORE_DIR = cmdLineArgs.store_dir
+    TIMINGS_FILE_PATH = cmdLineArgs.timings_file
+    SLICES_FILE_PATH = cmdLineArgs.slices_file
 
     """
     ----------------------------------------------------------------------------
     1. Create an instance of the AssessSegmentations class
 .   ----------------------------------------------------------------------------
     """    
-    aSegmentations = AssessSegmentations( INPUT_CSV_FILE_PATH )
+    aSegmentations = AssessSegmentations( INPUT_CSV_FILE_PATH,
+                                          jobs=NUM_JOBS,
+                                          prefetch=cmdLineArgs.prefetch,
+                                          memoryMap=cmdLineArgs.memory_map,
+                                          surfaceEngine=cmdLineArgs.surface_engine,
+                                          sliceWise=SLICES_FILE_PATH is not None,
+                                          sliceJobs=cmdLineArgs.slice_jobs,
+                                          cacheDir=CACHE_DIR,
+                                          cacheMaxSize=CACHE_MAX_SIZE,
+                                          referenceStoreDir=STORE_DIR,
+                                          profile=TIMINGS_FILE_PATH is not None,
+                                          traceMemory=cmdLineArgs.trace_memory )
 
     print( aSegmentations )
 
@@ -51,6 +96,9 @@ if __name__ == '__main__':
     
     aSegmentations.Compute()
 
+    if cmdLineArgs.bootstrap > 0:
+        aSegmentations.ComputeConfidenceIntervals( cmdLineArgs.bootstrap, cmdLineArgs.confidence, cmdLineArgs.seed )
+
     evaluationResults = aSegmentations.GetDataFrame()
 
     # Retrieve specific data: Left-Ventricle volume stats
@@ -61,4 +109,17 @@ if __name__ == '__main__':
 
     print("\n",statsReference,"\n\n",statsTarget )
 
-    aSegmentations.ToCSV( OUTPUT_CSV_FILE_PATH )
+    if OUTPUT_FORMAT == "parquet":
+        aSegmentations.ToParquet( OUTPUT_CSV_FILE_PATH, OUTPUT_LAYOUT )
+
+    elif OUTPUT_FORMAT == "arrow":
+        aSegmentations.ToArrow( OUTPUT_CSV_FILE_PATH, OUTPUT_LAYOUT )
+
+    else:
+        aSegmentations.ToCSV( OUTPUT_CSV_FILE_PATH, OUTPUT_LAYOUT )
+
+    if SLICES_FILE_PATH is not None:
+        aSegmentations.SlicesToCSV( SLICES_FILE_PATH )
+
+    if TIMINGS_FILE_PATH is not None:
+        aSegmentations.TimingsToFile( TIMINGS_FILE_PATH )
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name        : aseg_merge.py
+# Description : Merge partial results of shards (see aseg_shard.py).
+#
+# Authors     : William A. Romero R.  <romero@creatis.insa-lyon.fr>
+#                                     <contact@waromero.com>
+#-------------------------------------------------------------------------------
+import sys
+import argparse
+
+import pandas as pd
+from myosaiq import AssessSegmentations
+
+
+if __name__ == '__main__':
+    """
+    Example:
+
+    [mainframe@user myosaiq]$ ./aseg_merge.py -i ./partials/shard_*.npz -o ./ResultsSegmentations.csv
+    [mainframe@user myosaiq]$ ./aseg_merge.py -i ./partials/shard_*.npz -o ./ResultsSegmentations.parquet -f parquet --wide
+    """
+
+    cmdLineParser = argparse.ArgumentParser(description='Merge partial results of shards into overall evaluation results.')
+    #_________COMMAND-LINE_OPTIONS_________
+    cmdLineParser.add_argument("-v", "--version", action='version', version='%(prog)s 0.1.0 - Merge Assessments.')
+    cmdLineParser.add_argument("-i", "--input",   dest="partial_files", nargs="+", help="Partial results files (.npz) of the shards.", required=True)
+    cmdLineParser.add_argument("-o", "--output",  dest="output_file", help="Output file with results.", required=True)
+    cmdLineParser.add_argument("-f", "--format",  dest="output_format", choices=["csv", "parquet", "arrow"], default="csv", help="Output file format (default: csv). Parquet and Arrow IPC require pyarrow.")
+    cmdLineParser.add_argument("--wide",          dest="wide", action='store_true', help="Wide layout: one row per segmentation, one column per label and metric.")
+
+    cmdLineParser.add_argument("-b", "--bootstrap", dest="bootstrap", type=int, default=0, help="Number of bootstrap resamples for confidence intervals of overall metrics (CI LOW, CI HIGH columns; default: 0, none).")
+    cmdLineParser.add_argument("--confidence",    dest="confidence", type=float, default=0.95, help="Bootstrap confidence level (default: 0.95).")
+    cmdLineParser.add_argument("--seed",          dest="seed", type=int, default=None, help="Bootstrap random seed (default: none).")
+
+    cmdLineArgs = cmdLineParser.parse_args()
+
+    OUTPUT_FILE_PATH = cmdLineArgs.output_file
+    OUTPUT_FORMAT = cmdLineArgs.output_format
+    OUTPUT_LAYOUT = "wide" if cmdLineArgs.wide else "long"
+
+    """
+    ----------------------------------------------------------------------------
+    1. Merge partial results and calculate overall statistics.
+.   ----------------------------------------------------------------------------
+    """
+    aSegmentations = AssessSegmentations( None )
+
+    if not aSegmentations.LoadPartials( cmdLineArgs.partial_files ):
+        print("[aseg_merge] Partial results not merged: a complete set of shards of the same input list is expected.")
+        sys.exit(1)
+
+    if cmdLineArgs.bootstrap > 0:
+        aSegmentations.ComputeConfidenceIntervals( cmdLineArgs.bootstrap, cmdLineArgs.confidence, cmdLineArgs.seed )
+
+    print("[aseg_merge] %d segmentations." % aSegmentations.NUM_SEGMENTATIONS)
+
+    evaluationResults = aSegmentations.GetDataFrame()
+
+    pd.options.display.float_format = '{:18,.3f}'.format
+
+    print( "\n", evaluationResults.loc[evaluationResults['SEGMENTATION ID'].isin(['REFERENCE AVG', 'TARGET AVG'])], "\n" )
+
+    """
+    ----------------------------------------------------------------------------
+    2. Export results.
+.   ----------------------------------------------------------------------------
+    """
+    if OUTPUT_FORMAT == "parquet":
+        aSegmentations.ToParquet( OUTPUT_FILE_PATH, OUTPUT_LAYOUT )
+
+    elif OUTPUT_FORMAT == "arrow":
+        aSegmentations.ToArrow( OUTPUT_FILE_PATH, OUTPUT_LAYOUT )
+
+    else:
+        aSegmentations.ToCSV( OUTPUT_FILE_PATH, OUTPUT_LAYOUT )
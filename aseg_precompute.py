@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name        : aseg_precompute.py
+# Description : Precompute reference segmentation data.
+#
+# Authors     : William A. Romero R.  <romero@creatis.insa-lyon.fr>
+#                                     <contact@waromero.com>
+#-------------------------------------------------------------------------------
+import argparse
+
+import pandas as pd
+from myosaiq import ReferenceStore, verifyFile
+
+
+if __name__ == '__main__':
+    """
+    Example:
+
+    [mainframe@user myosaiq]$ ./aseg_precompute.py -i ./data/Segmentations.csv -s ./references_store
+    """
+
+    cmdLineParser = argparse.ArgumentParser(description='Precompute reference segmentation data (label counts, contours and distance maps).')
+    #_________COMMAND-LINE_OPTIONS_________
+    cmdLineParser.add_argument("-v", "--version", action='version', version='%(prog)s 0.1.0 - Precompute references.')
+    cmdLineParser.add_argument("-i", "--input",   dest="input_csv_file", help="Input CSV file with a <REFERENCE FILE> column. Check test data for examples.", required=True)
+    cmdLineParser.add_argument("-s", "--store",   dest="store_dir",      help="Reference store directory.", required=True)
+    cmdLineParser.add_argument("-f", "--force",   dest="force", action="store_true", help="Recompute references already in the store.")
+
+    cmdLineArgs = cmdLineParser.parse_args()
+
+    INPUT_CSV_FILE_PATH = cmdLineArgs.input_csv_file
+    STORE_DIR = cmdLineArgs.store_dir
+
+    """
+    ----------------------------------------------------------------------------
+    1. Create an instance of the ReferenceStore class
+.   ----------------------------------------------------------------------------
+    """
+    referenceStore = ReferenceStore( STORE_DIR )
+
+    print( referenceStore )
+
+    """
+    ----------------------------------------------------------------------------
+    2. Precompute each reference segmentation (once).
+.   ----------------------------------------------------------------------------
+    """
+    referenceFiles = pd.read_csv( INPUT_CSV_FILE_PATH, sep="," )["REFERENCE"].drop_duplicates()
+
+    for referenceFile in referenceFiles:
+        if not verifyFile( referenceFile ):
+            print("[ReferenceStore] %s  File does not exist!" % referenceFile)
+            continue
+
+        if referenceStore.Has( referenceFile ) and not cmdLineArgs.force:
+            print("\t%s  (stored)" % referenceFile)
+            continue
+
+        if referenceStore.Precompute( referenceFile ):
+            print("\t%s  (done)" % referenceFile)
+        else:
+            print("\t%s  (failed)" % referenceFile)
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name        : aseg_server.py
+# Description : Evaluation service: assess segmentations submitted over a
+#               local HTTP endpoint (see aseg_client.py).
+#
+# Authors     : William A. Romero R.  <romero@creatis.insa-lyon.fr>
+#                                     <contact@waromero.com>
+#-------------------------------------------------------------------------------
+import sys
+import json
+import signal
+import argparse
+import traceback
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+from myosaiq import EvaluationService, SERVICE_PORT, SERVICE_MAX_REFERENCES, log
+
+
+class EvaluationRequestHandler( BaseHTTPRequestHandler ):
+    """
+    HTTP requests (JSON):
+
+        GET  /status   Service status.
+        POST /assess   Job { "pairs": [ [ reference, target ], ... ],
+                       "layout": "long" | "wide" } -> results table
+                       { "columns": [ ... ], "data": [ [ ... ], ... ] }
+                       (NaN as null).
+    """
+    service = None
+
+    def do_GET( self ):
+        if self.path == "/status":
+            self.__Reply( 200, self.service.GetStatus() )
+        else:
+            self.__Reply( 404, { "error": "Unknown path %s" % self.path } )
+
+
+    def do_POST( self ):
+        if self.path != "/assess":
+            self.__Reply( 404, { "error": "Unknown path %s" % self.path } )
+            return
+
+        try:
+            job = json.loads( self.rfile.read( int(self.headers.get("Content-Length", 0)) ) )
+            pairs = [ ( str(pair[0]), str(pair[1]) ) for pair in job["pairs"] ]
+            layout = job.get( "layout", "long" )
+
+        except Exception as exception:
+            self.__Reply( 400, { "error": "Invalid job: %s" % str(exception) } )
+            return
+
+        try:
+            dataFrame = self.service.Assess( pairs ).GetDataFrame( layout )
+            data = dataFrame.astype( object ).where( dataFrame.notna(), None ).values.tolist()
+
+            self.__Reply( 200, { "columns": list(dataFrame.columns), "data": data } )
+
+        except Exception as exception:
+            log.error("[EvaluationRequestHandler::POST Exception] %s" % str(exception))
+            log.error("[EvaluationRequestHandler::POST Exception] %s" % str(traceback.format_exc()))
+            self.__Reply( 500, { "error": str(exception) } )
+
+
+    def __Reply( self, status, content ):
+        body = json.dumps( content ).encode( "utf-8" )
+
+        self.send_response( status )
+        self.send_header( "Content-Type", "application/json" )
+        self.send_header( "Content-Length", str(len(body)) )
+        self.end_headers()
+        self.wfile.write( body )
+
+
+if __name__ == '__main__':
+    """
+    Example:
+
+    [mainframe@user myosaiq]$ ./aseg_server.py -i ./data/References.csv -j 4
+    [mainframe@user myosaiq]$ ./aseg_server.py -i ./data/References.csv -j 4 -s ./references_store --port 8777
+    """
+
+    cmdLineParser = argparse.ArgumentParser(description='Evaluation service: keep references in memory and assess submitted segmentations (see aseg_client.py).')
+    #_________COMMAND-LINE_OPTIONS_________
+    cmdLineParser.add_argument("-v", "--version", action='version', version='%(prog)s 0.1.0 - Evaluation Service.')
+    cmdLineParser.add_argument("-i", "--input",   dest="input_csv_file", default=None, help="CSV file with a REFERENCE column: references loaded at start-up (optional).")
+    cmdLineParser.add_argument("-j", "--jobs",    dest="jobs", type=int, default=1, help="Number of threads assessing cases, shared by all jobs (default: 1).")
+    cmdLineParser.add_argument("-s", "--store",   dest="store_dir", default=None, help="Reference store directory (see aseg_precompute.py).")
+    cmdLineParser.add_argument("--mmap",          dest="memory_map", action='store_true', help="Memory-map uncompressed NIfTI (.nii) files instead of reading them.")
+    cmdLineParser.add_argument("-e", "--surface-engine", dest="surface_engine", choices=["distancemap", "kdtree"], default="distancemap", help="HD/ASSD engine (default: distancemap).")
+    cmdLineParser.add_argument("--max-references", dest="max_references", type=int, default=SERVICE_MAX_REFERENCES, help="Reference images kept in memory (default: %d)." % SERVICE_MAX_REFERENCES)
+    cmdLineParser.add_argument("--host",          dest="host", default="127.0.0.1", help="Host address (default: 127.0.0.1, local only).")
+    cmdLineParser.add_argument("--port",          dest="port", type=int, default=SERVICE_PORT, help="Port (default: %d)." % SERVICE_PORT)
+
+    cmdLineArgs = cmdLineParser.parse_args()
+
+    """
+    ----------------------------------------------------------------------------
+    1. Create the evaluation service and load references.
+.   ----------------------------------------------------------------------------
+    """
+    service = EvaluationService( jobs=cmdLineArgs.jobs,
+                                 referenceStoreDir=cmdLineArgs.store_dir,
+                                 memoryMap=cmdLineArgs.memory_map,
+                                 surfaceEngine=cmdLineArgs.surface_engine,
+                                 maxReferences=cmdLineArgs.max_references )
+
+    if cmdLineArgs.input_csv_file is not None:
+        service.LoadReferences( pd.read_csv( cmdLineArgs.input_csv_file, sep="," )["REFERENCE"].tolist() )
+
+    """
+    ----------------------------------------------------------------------------
+    2. Serve jobs (one thread per request) until interrupted (or SIGTERM).
+.   ----------------------------------------------------------------------------
+    """
+    EvaluationRequestHandler.service = service
+
+    server = ThreadingHTTPServer( (cmdLineArgs.host, cmdLineArgs.port), EvaluationRequestHandler )
+
+    signal.signal( signal.SIGTERM, lambda signalNumber, frame: sys.exit(0) )
+
+    print("[aseg_server] Serving on http://%s:%d (%d references loaded)." % (cmdLineArgs.host, cmdLineArgs.port, len(service.references)), flush=True)
+
+    try:
+        server.serve_forever()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        server.server_close()
+        service.Shutdown()
+        print("[aseg_server] Stopped.")
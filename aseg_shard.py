@@ -0,0 +1,68 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name        : aseg_shard.py
+# Description : Assess one shard of a set of segmentations (partial results).
+#
+# Authors     : William A. Romero R.  <romero@creatis.insa-lyon.fr>
+#                                     <contact@waromero.com>
+#-------------------------------------------------------------------------------
+import os
+import argparse
+
+from myosaiq import AssessSegmentations
+
+
+if __name__ == '__main__':
+    """
+    Example (rows i mod 3 of the input file, see aseg_merge.py):
+
+    [mainframe@user myosaiq]$ ./aseg_shard.py -i ./data/Segmentations.csv --shard 0 --shards 3 -o ./partials/shard_0.npz
+    [mainframe@user myosaiq]$ ./aseg_shard.py -i ./data/Segmentations.csv --shard 1 --shards 3 -o ./partials/shard_1.npz -j 4
+    [mainframe@user myosaiq]$ ./aseg_shard.py -i ./data/Segmentations.csv --shard 2 --shards 3 -o ./partials/shard_2.npz -s ./references_store
+    """
+
+    cmdLineParser = argparse.ArgumentParser(description='Calculate evaluation metrics for one shard (rows i mod K) of a set of segmentations.')
+    #_________COMMAND-LINE_OPTIONS_________
+    cmdLineParser.add_argument("-v", "--version", action='version', version='%(prog)s 0.1.0 - Assess Segmentations (shard).')
+    cmdLineParser.add_argument("-i", "--input",   dest="input_csv_file", help="Input CSV file with two columns: <REFERENCE FILE>, <TARGET FILE>. Check test data for examples.", required=True)
+    cmdLineParser.add_argument("--shard",         dest="shard", type=int, help="Shard index i (0 <= i < K).", required=True)
+    cmdLineParser.add_argument("--shards",        dest="shards", type=int, help="Number of shards K.", required=True)
+    cmdLineParser.add_argument("-o", "--output",  dest="output_file", help="Output partial results file (.npz).", required=True)
+    cmdLineParser.add_argument("-j", "--jobs",    dest="jobs", type=int, default=1, help="Number of worker processes (default: 1, sequential).")
+    cmdLineParser.add_argument("-c", "--cache",   dest="cache_dir", default=None, help="Results cache directory: unchanged (reference, target) pairs are not recomputed.")
+    cmdLineParser.add_argument("-s", "--store",   dest="store_dir", default=None, help="Reference store directory (see aseg_precompute.py).")
+
+    cmdLineArgs = cmdLineParser.parse_args()
+
+    if not (0 <= cmdLineArgs.shard < cmdLineArgs.shards):
+        cmdLineParser.error("--shard must be in [0, --shards).")
+
+    OUTPUT_FILE_PATH = cmdLineArgs.output_file
+
+    outputDir = os.path.dirname( OUTPUT_FILE_PATH )
+
+    if outputDir:
+        os.makedirs( outputDir, exist_ok=True )
+
+    """
+    ----------------------------------------------------------------------------
+    1. Create an instance of the AssessSegmentations class (shard rows only)
+.   ----------------------------------------------------------------------------
+    """
+    aSegmentations = AssessSegmentations( cmdLineArgs.input_csv_file,
+                                          jobs=cmdLineArgs.jobs,
+                                          cacheDir=cmdLineArgs.cache_dir,
+                                          referenceStoreDir=cmdLineArgs.store_dir,
+                                          shard=(cmdLineArgs.shard, cmdLineArgs.shards) )
+
+    print( aSegmentations )
+
+    """
+    ----------------------------------------------------------------------------
+    2. Calculate metrics and export partial results.
+.   ----------------------------------------------------------------------------
+    """
+    aSegmentations.Compute()
+
+    aSegmentations.ToPartial( OUTPUT_FILE_PATH )
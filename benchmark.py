@@ -0,0 +1,354 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name        : benchmark.py
+# Description : Benchmark the assessment tools with synthetic cardiac phantoms.
+#
+# Authors     : William A. Romero R.  <romero@creatis.insa-lyon.fr>
+#                                     <contact@waromero.com>
+#-------------------------------------------------------------------------------
+import os
+import io
+import sys
+import time
+import json
+import shutil
+import subprocess
+import resource
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+import SimpleITK as sitk
+
+from myosaiq import AssessSegmentation, AssessSegmentations, VolumesCDF, MAX_VOLUME, \
+                    LEFT_VENTRICULAR_CAVITY, MYOCARDIUM, MYOCARDIAL_INFARCTION, MVO
+
+#-------------------------------------------------------------------------------
+# DEFS
+#-------------------------------------------------------------------------------
+IN_PLANE_SPACING = 1.25     # in mm
+FIELD_OF_VIEW_Z = 100.0     # in mm, short-axis stack coverage
+
+LV_RADIUS = 25.0            # in mm, LV cavity (short axis)
+LV_LENGTH = 40.0            # in mm, LV cavity (long axis, half length)
+MYO_THICKNESS = 9.0         # in mm
+
+# Peak RSS: largest of the measured process (MAIN) and of its largest worker process (WORKER, -j > 1).
+RESULT_COLUMNS = [ "ENTRY POINT", "MATRIX", "THICKNESS", "CASES", "WALL TIME (s)", "CASES/s", "PEAK RSS (MB)", "MAIN RSS (MB)", "WORKER RSS (MB)" ]
+
+#-------------------------------------------------------------------------------
+# Synthetic data.
+#-------------------------------------------------------------------------------
+def makePhantom( matrixSize, sliceThickness, center, scale, infarctAngles, mvoAngles ):
+    """
+    Return a label image (UInt16) of nested ellipsoidal shells:
+    LV cavity, MYO shell, MI sector of the MYO shell and MVO core of MI.
+
+    matrixSize      In-plane matrix size (pixels).
+    sliceThickness  Slice thickness (mm).
+    center          Ellipsoid center (x, y, z) in mm, relative to the volume center.
+    scale           Scale factor of the radii.
+    infarctAngles   MI sector (start, end) in radians.
+    mvoAngles       MVO sector (start, end) in radians.
+    """
+    numberOfSlices = max( 1, int(round(FIELD_OF_VIEW_Z / sliceThickness)) )
+
+    z = ( np.arange(numberOfSlices) - (numberOfSlices - 1) / 2.0 ) * sliceThickness - center[2]
+    y = ( np.arange(matrixSize) - (matrixSize - 1) / 2.0 ) * IN_PLANE_SPACING - center[1]
+    x = ( np.arange(matrixSize) - (matrixSize - 1) / 2.0 ) * IN_PLANE_SPACING - center[0]
+
+    z, y, x = np.meshgrid( z, y, x, indexing="ij", sparse=True )
+
+    innerRadius = LV_RADIUS * scale
+    outerRadius = (LV_RADIUS + MYO_THICKNESS) * scale
+
+    inner = (x / innerRadius)**2 + (y / innerRadius)**2 + (z / (LV_LENGTH * scale))**2
+    outer = (x / outerRadius)**2 + (y / outerRadius)**2 + (z / ((LV_LENGTH + MYO_THICKNESS) * scale))**2
+    angle = np.arctan2( y, x )
+
+    labels = np.zeros( (numberOfSlices, matrixSize, matrixSize), dtype=np.uint16 )
+
+    myocardium = (outer <= 1.0) & (inner > 1.0)
+    infarct = myocardium & (angle >= infarctAngles[0]) & (angle < infarctAngles[1])
+
+    # MVO: sub-endocardial core of the infarct.
+    mvo = infarct & (angle >= mvoAngles[0]) & (angle < mvoAngles[1]) & (inner <= 1.35)
+
+    labels[myocardium] = MYOCARDIUM
+    labels[inner <= 1.0] = LEFT_VENTRICULAR_CAVITY
+    labels[infarct] = MYOCARDIAL_INFARCTION
+    labels[mvo] = MVO
+
+    image = sitk.GetImageFromArray( labels )
+    image.SetSpacing( (IN_PLANE_SPACING, IN_PLANE_SPACING, sliceThickness) )
+
+    return image
+
+
+def makeCohort( outputDir, numberOfCases, matrixSize, sliceThickness, seed=0 ):
+    """
+    Write reference/target phantom pairs (perturbed targets) and the
+    segmentation list (CSV file). Return the CSV file path.
+    """
+    rng = np.random.default_rng( seed )
+
+    os.makedirs( os.path.join(outputDir, "reference"), exist_ok=True )
+    os.makedirs( os.path.join(outputDir, "target"), exist_ok=True )
+
+    rows = [ "REFERENCE,TARGET" ]
+
+    for case in range(numberOfCases):
+        scale = rng.uniform( 0.8, 1.2 )
+        infarctStart = rng.uniform( -np.pi, np.pi / 2.0 )
+        infarctAngles = ( infarctStart, infarctStart + rng.uniform(0.5, 1.5) )
+        mvoStart = infarctAngles[0] + 0.2
+        mvoAngles = ( mvoStart, mvoStart + rng.uniform(0.1, 0.3) )
+
+        reference = makePhantom( matrixSize, sliceThickness, (0.0, 0.0, 0.0), scale, infarctAngles, mvoAngles )
+
+        # Target: shifted center, scaled radii and jittered sectors.
+        target = makePhantom( matrixSize, sliceThickness,
+                              tuple( rng.normal(0.0, 1.5, 3) ),
+                              scale * rng.uniform( 0.95, 1.05 ),
+                              tuple( np.array(infarctAngles) + rng.normal(0.0, 0.05, 2) ),
+                              tuple( np.array(mvoAngles) + rng.normal(0.0, 0.02, 2) ) )
+
+        referenceFile = os.path.join( outputDir, "reference", "%04d_D8.nii.gz" % case )
+        targetFile = os.path.join( outputDir, "target", "%04d_D8.nii.gz" % case )
+
+        sitk.WriteImage( reference, referenceFile )
+        sitk.WriteImage( target, targetFile )
+
+        rows.append( "%s,%s" % (referenceFile, targetFile) )
+
+    csvFilePath = os.path.join( outputDir, "Segmentations.csv" )
+
+    with open( csvFilePath, "w" ) as csvFile:
+        csvFile.write( "\n".join(rows) + "\n" )
+
+    return csvFilePath
+
+
+def makeCDFFile( filePath, numberOfVolumes, seed=0 ):
+    """
+    Write a CSV file with synthetic cumulative distributions:
+    ID, VOL, P0, P1, ..., P599 (logistic CDF around a noisy estimate).
+    """
+    rng = np.random.default_rng( seed )
+
+    volumes = rng.uniform( 20.0, 300.0, numberOfVolumes )
+    estimates = volumes + rng.normal( 0.0, 10.0, numberOfVolumes )
+    widths = rng.uniform( 3.0, 15.0, numberOfVolumes )
+
+    n = np.arange( MAX_VOLUME )
+    cdf = 1.0 / ( 1.0 + np.exp( -(n[np.newaxis, :] - estimates[:, np.newaxis]) / widths[:, np.newaxis] ) )
+
+    with open( filePath, "w" ) as cdfFile:
+        cdfFile.write( "ID,VOL," + ",".join( "P%d" % index for index in n ) + "\n" )
+
+        for index in range(numberOfVolumes):
+            cdfFile.write( "%06d_D8,%.4f," % (index, volumes[index]) )
+            cdfFile.write( ",".join( "%.4f" % value for value in cdf[index] ) + "\n" )
+
+    return filePath
+
+#-------------------------------------------------------------------------------
+# Benchmarks.
+#-------------------------------------------------------------------------------
+def runAssessSegmentation( csvFilePath, jobs ):
+    """
+    AssessSegmentation.Compute, case by case.
+    """
+    with open( csvFilePath, "r" ) as csvFile:
+        pairs = [ line.strip().split(",") for line in csvFile.readlines()[1:] if line.strip() ]
+
+    for referenceFile, targetFile in pairs:
+        aseg = AssessSegmentation( referenceFile, targetFile )
+        aseg.Compute()
+
+    return len(pairs)
+
+
+def runAssessSegmentations( csvFilePath, jobs ):
+    """
+    AssessSegmentations.Compute, whole list.
+    """
+    aSegmentations = AssessSegmentations( csvFilePath, jobs=jobs )
+    aSegmentations.Compute()
+    aSegmentations.GetDataFrame()
+
+    return len(aSegmentations.assessments)
+
+
+def runCalcCRPS( csvFilePath, jobs ):
+    """
+    VolumesCDF.CalcCRPS.
+    """
+    volumes = VolumesCDF( csvFilePath )
+    volumes.CalcCRPS()
+
+    return volumes.NUM_VOLUMES
+
+
+ENTRY_POINTS = { "AssessSegmentation.Compute":runAssessSegmentation,
+                 "AssessSegmentations.Compute":runAssessSegmentations,
+                 "VolumesCDF.CalcCRPS":runCalcCRPS }
+
+
+def getPeakRSS( who ):
+    """
+    Return the peak RSS (in MB) of resource.RUSAGE_SELF or of the largest
+    terminated child process (resource.RUSAGE_CHILDREN).
+    """
+    # ru_maxrss: kilobytes on Linux, bytes on macOS.
+    peakRSS = resource.getrusage( who ).ru_maxrss
+
+    return peakRSS / (1024.0 * 1024.0) if sys.platform == "darwin" else peakRSS / 1024.0
+
+
+def measure( entryPoint, csvFilePath, jobs, connection ):
+    """
+    Run an entry point (in a child process) and send back (wall time,
+    number of cases, peak RSS, main RSS, worker RSS in MB). Worker
+    processes (-j > 1) are not counted in the RSS of the measured process:
+    the worker RSS is the one of the largest of them (not the sum of
+    concurrent workers).
+    """
+    with contextlib.redirect_stdout( io.StringIO() ):
+        start = time.perf_counter()
+        numberOfCases = ENTRY_POINTS[entryPoint]( csvFilePath, jobs )
+        wallTime = time.perf_counter() - start
+
+    mainRSS = getPeakRSS( resource.RUSAGE_SELF )
+    workerRSS = getPeakRSS( resource.RUSAGE_CHILDREN )
+
+    connection.send( (wallTime, numberOfCases, max(mainRSS, workerRSS), mainRSS, workerRSS) )
+    connection.close()
+
+
+def benchmark( entryPoint, csvFilePath, jobs=1 ):
+    """
+    Return (wall time, number of cases, peak RSS, main RSS, worker RSS) of
+    an entry point, measured in a fresh process.
+    """
+    parentConnection, childConnection = multiprocessing.Pipe( duplex=False )
+
+    process = multiprocessing.Process( target=measure, args=(entryPoint, csvFilePath, jobs, childConnection) )
+    process.start()
+    result = parentConnection.recv()
+    process.join()
+
+    return result
+
+
+def measureImportTime( moduleName, runs ):
+    """
+    Return the median time (in s) of importing a module in fresh Python
+    processes (cold interpreter, warm file system cache).
+    """
+    code = "import time; start = time.perf_counter(); import %s; print(time.perf_counter() - start)" % moduleName
+
+    importTimes = [ float( subprocess.check_output( [ sys.executable, "-c", code ], cwd=os.path.dirname(os.path.abspath(__file__)) ) )
+                    for _ in range(runs) ]
+
+    return float( np.median(importTimes) )
+
+
+def printResults( results ):
+    """
+    Print benchmark results.
+    """
+    print("\n{:<28} {:>7} {:>10} {:>7} {:>14} {:>10} {:>14} {:>14} {:>16}\n".format( *RESULT_COLUMNS ))
+
+    for row in results:
+        print("{:<28} {:>7} {:>10} {:>7} {:>14.3f} {:>10.2f} {:>14.1f} {:>14.1f} {:>16.1f}".format( *row ))
+
+    print()
+
+
+if __name__ == '__main__':
+    """
+    Example:
+
+    [mainframe@user myosaiq]$ ./benchmark.py --matrix 128 256 --thickness 8 --cases 10 --cdf-rows 1000 2000
+    """
+
+    cmdLineParser = argparse.ArgumentParser(description='Benchmark the assessment tools with synthetic cardiac phantoms.')
+    #_________COMMAND-LINE_OPTIONS_________
+    cmdLineParser.add_argument("-v", "--version",  action='version', version='%(prog)s 0.1.0 - Benchmark.')
+    cmdLineParser.add_argument("--matrix",    dest="matrix_sizes", type=int,   nargs="+", default=[256],  help="In-plane matrix sizes (default: 256).")
+    cmdLineParser.add_argument("--thickness", dest="thicknesses",  type=float, nargs="+", default=[8.0],  help="Slice thicknesses in mm (default: 8).")
+    cmdLineParser.add_argument("--cases",     dest="cohort_sizes", type=int,   nargs="+", default=[10],   help="Cohort sizes (default: 10).")
+    cmdLineParser.add_argument("--cdf-rows",  dest="cdf_rows",     type=int,   nargs="+", default=[1000], help="Number of rows of the CDF files (default: 1000).")
+    cmdLineParser.add_argument("-j", "--jobs", dest="jobs",        type=int,   default=1, help="Worker processes for AssessSegmentations (default: 1).")
+    cmdLineParser.add_argument("--seed",      dest="seed",         type=int,   default=0, help="Random seed (default: 0).")
+    cmdLineParser.add_argument("--data-dir",  dest="data_dir",     default=None, help="Keep synthetic data in this directory (default: temporary directory).")
+    cmdLineParser.add_argument("--import-runs", dest="import_runs", type=int, default=0, help="Also measure the import time of myosaiq_crps, myosaiq and of pandas and SimpleITK (median of N fresh processes; default: 0, not measured).")
+    cmdLineParser.add_argument("-o", "--output", dest="output_file", default=None, help="Save results (.csv or .json).")
+
+    cmdLineArgs = cmdLineParser.parse_args()
+
+    DATA_DIR = cmdLineArgs.data_dir if cmdLineArgs.data_dir is not None else tempfile.mkdtemp( prefix="myosaiq_bench_" )
+
+    results = []
+
+    try:
+        """
+        ------------------------------------------------------------------------
+        1. Segmentation entry points: matrix size x slice thickness x cohort size.
+.       ------------------------------------------------------------------------
+        """
+        for matrixSize in cmdLineArgs.matrix_sizes:
+            for sliceThickness in cmdLineArgs.thicknesses:
+                for numberOfCases in cmdLineArgs.cohort_sizes:
+                    cohortDir = os.path.join( DATA_DIR, "m%d_t%g_n%d" % (matrixSize, sliceThickness, numberOfCases) )
+                    csvFilePath = makeCohort( cohortDir, numberOfCases, matrixSize, sliceThickness, cmdLineArgs.seed )
+
+                    for entryPoint in ("AssessSegmentation.Compute", "AssessSegmentations.Compute"):
+                        wallTime, cases, peakRSS, mainRSS, workerRSS = benchmark( entryPoint, csvFilePath, cmdLineArgs.jobs )
+                        results.append( [ entryPoint, matrixSize, sliceThickness, cases, wallTime, cases / wallTime, peakRSS, mainRSS, workerRSS ] )
+
+                        print("[Benchmark] %s  matrix %d, thickness %g mm, %d cases: %.3f s" % (entryPoint, matrixSize, sliceThickness, cases, wallTime))
+
+        """
+        ------------------------------------------------------------------------
+        2. CRPS: number of CDF rows.
+.       ------------------------------------------------------------------------
+        """
+        for numberOfVolumes in cmdLineArgs.cdf_rows:
+            cdfFilePath = makeCDFFile( os.path.join(DATA_DIR, "cdf_%d.csv" % numberOfVolumes), numberOfVolumes, cmdLineArgs.seed )
+
+            wallTime, cases, peakRSS, mainRSS, workerRSS = benchmark( "VolumesCDF.CalcCRPS", cdfFilePath )
+            results.append( [ "VolumesCDF.CalcCRPS", "-", "-", cases, wallTime, cases / wallTime, peakRSS, mainRSS, workerRSS ] )
+
+            print("[Benchmark] VolumesCDF.CalcCRPS  %d rows: %.3f s" % (cases, wallTime))
+
+        """
+        ------------------------------------------------------------------------
+        3. Import time (CRPS path without pandas/SimpleITK, see myosaiq_crps).
+.       ------------------------------------------------------------------------
+        """
+        for moduleName in ( ("myosaiq_crps", "myosaiq", "pandas, SimpleITK") if cmdLineArgs.import_runs > 0 else () ):
+            importTime = measureImportTime( moduleName, cmdLineArgs.import_runs )
+
+            print("[Benchmark] import %s: %.1f ms (median of %d runs)" % (moduleName, importTime * 1000.0, cmdLineArgs.import_runs))
+
+    finally:
+        if cmdLineArgs.data_dir is None:
+            shutil.rmtree( DATA_DIR, ignore_errors=True )
+
+    printResults( results )
+
+    if cmdLineArgs.output_file is not None:
+        if cmdLineArgs.output_file.endswith(".json"):
+            with open( cmdLineArgs.output_file, "w" ) as outputFile:
+                json.dump( [ dict(zip(RESULT_COLUMNS, row)) for row in results ], outputFile, indent=2 )
+
+        else:
+            pd.DataFrame( data=results, columns=RESULT_COLUMNS ).to_csv( cmdLineArgs.output_file, index=None, header=True, sep="," )
+
+        print("[Benchmark] Results saved to %s" % cmdLineArgs.output_file)
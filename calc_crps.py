@@ -11,7 +11,7 @@ import os
 import sys
 import argparse
 
-from myosaiq import VolumesCDF
+from myosaiq_crps import VolumesCDF
 
 
 if __name__ == '__main__':
@@ -19,12 +19,15 @@ if __name__ == '__main__':
     Example:
 
     [mainframe@user myosaiq]$ ./calc_crps.py -f ./data/MYO_volumes.csv
+    [mainframe@user myosaiq]$ ./calc_crps.py -f ./data/MYO_volumes.csv -c ./data/MYO_volumes.npy
+    [mainframe@user myosaiq]$ ./calc_crps.py -f ./data/MYO_volumes.npy
     """
 
     cmdLineParser = argparse.ArgumentParser(description='Calculate CRPS from a .csv file.')
     #_________COMMAND-LINE_OPTIONS_________
     cmdLineParser.add_argument("-v", "--version",   action='version', version='%(prog)s 0.1.0 - Calculate CRPS.')
-    cmdLineParser.add_argument("-f", "--file", dest="cdf_file",  help="CSV file with cumulative distributions. Check test data for examples.", required=True)
+    cmdLineParser.add_argument("-f", "--file", dest="cdf_file",  help="CSV, .npy or .npz file with cumulative distributions (see VolumesCDF). Check test data for examples.", required=True)
+    cmdLineParser.add_argument("-c", "--convert", dest="output_file", default=None, help="Also save the distributions as .npy (float32, with a .ids file) or .npz (memory-mapped when scored).")
    
     cmdLineArgs = cmdLineParser.parse_args()
 
@@ -34,5 +37,8 @@ if __name__ == '__main__':
 
     crps = volumes.CalcCRPS()
 
+    if cmdLineArgs.output_file is not None:
+        volumes.Save( cmdLineArgs.output_file )
+
     print("\nCRPS = %.4f\n" %  crps)
 
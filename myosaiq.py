@@ -8,14 +8,69 @@
 #                                     <contact@waromero.com>
 #-------------------------------------------------------------------------------
 import os
+import sys
+import json
+import time
+import shutil
+import pickle
+import hashlib
+import importlib.util
 import traceback
 import logging
+import warnings
+import contextlib
+import threading
+import itertools
+import tracemalloc
 
 from pathlib import Path
+from functools import partial
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import numpy as np
-import pandas as pd
-import SimpleITK as sitk
+
+from myosaiq_crps import ROUND_DECIMALS, MAX_VOLUME, VolumesCDF, VolumesCDFException, calcCRPSSums, verifyFile, log
+
+
+class LazyModule( object ):
+    """
+    Module imported (importlib.import_module) on first attribute access.
+    Only this handle is lazy: nothing is registered in sys.modules before
+    the actual import, so other importers get the real module.
+    """
+    def __init__( self, moduleName ):
+        self.__dict__["moduleName"] = moduleName
+        self.__dict__["module"] = None
+
+
+    def __getattr__( self, name ):
+        if self.module is None:
+            self.__dict__["module"] = importlib.import_module( self.moduleName )
+
+        return getattr( self.module, name )
+
+
+    def __setattr__( self, name, value ):
+        raise AttributeError( "%s: lazy module handle is read-only." % self.moduleName )
+
+
+def lazyImport( moduleName ):
+    """
+    Return a module-local handle of a module imported on first attribute
+    access (LazyModule), None if it is not installed. Heavy dependencies
+    are only imported when segmentations are assessed (not for CRPS, see
+    myosaiq_crps).
+    """
+    if importlib.util.find_spec( moduleName ) is None:
+        return None
+
+    return LazyModule( moduleName )
+
+
+pd = lazyImport( "pandas" )
+sitk = lazyImport( "SimpleITK" )
+scipy = lazyImport( "scipy" )      # KD-tree surface engine (None = not available).
 
 #-------------------------------------------------------------------------------
 # DEFS
@@ -38,39 +93,151 @@ METRIC = [ "VOLUME",
            "HD",
            "ASSD" ]
 
-ROUND_DECIMALS = 4
 ROUND_DECIMALS_ASSD_HD = 3     # Default 3
 ROUND_DECIMALS_DICE = 3        # Default 3
 ROUND_DECIMALS_VOLUME = 1      # Default 1
 ROUND_DECIMALS_VOLUME_MAE = 3  # Default 3
 
-MAX_VOLUME = 600            # in mL
+# Metrics of the result tables: ( METRIC, MyosaiqMetrics attribute, decimals ).
+TABLE_METRICS = [ ( "VOLUME",     "VOLUME",     ROUND_DECIMALS_VOLUME ),
+                  ( "VOLUME MAE", "VOLUME_MAE", ROUND_DECIMALS_VOLUME_MAE ),
+                  ( "VOLUME CC",  "VOLUME_CC",  ROUND_DECIMALS_VOLUME_MAE ),
+                  ( "DICE",       "DICE",       ROUND_DECIMALS_DICE ),
+                  ( "HD",         "HD",         ROUND_DECIMALS_ASSD_HD ),
+                  ( "ASSD",       "ASSD",       ROUND_DECIMALS_ASSD_HD ) ]
+
+TABLE_COLUMNS = [ "SEGMENTATION ID", "LABEL", "METRIC", "VALUE", "STD" ]
+
+CRPS_COLUMNS = [ "LABEL", "CASES", "MISSING", "CRPS" ]          # Per label, and ALL labels
+CRPS_CASE_COLUMNS = [ "ID", "LABEL", "VOLUME", "CRPS" ]         # in mL
+
+CI_COLUMNS = [ "CI LOW", "CI HIGH" ]    # Bootstrap confidence interval of overall statistics
+
+BOOTSTRAP_RESAMPLES = 2000
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_BLOCK_SIZE = 4 * 1024 * 1024  # Resample weights per block (in values)
+
+# Leaderboard ranking metrics: ( METRIC, lower is better ).
+RANKING_METRICS = [ ( "DICE",       False ),
+                    ( "HD",         True ),
+                    ( "ASSD",       True ),
+                    ( "VOLUME MAE", True ) ]
 
 MM_TO_ML_FACTOR = 0.001
 
+ROI_MARGIN = 2              # in pixels, around the label bounding boxes
+
+SURFACE_ENGINE_DISTANCE_MAP = "distancemap"     # SimpleITK signed Maurer distance maps.
+SURFACE_ENGINE_KDTREE = "kdtree"                # KD-tree of surface points (requires scipy).
+
+SPARSE_LABEL_MAX_PIXELS = 512       # Labels up to this size (reference + target) use SparseSurfaceDistances (0 = never).
+SPARSE_BLOCK_SIZE = 256 * 1024      # Point pairs per distance block (SparseSurfaceDistances)
+
+SURFACE_DISTANCE_PERCENTILE = 95    # HD95
+
+CONFUSION_MATRIX_CHUNK_SIZE = 1024 * 1024   # Pixels per label code chunk (see AssessSegmentation::CalcConfusionMatrix)
+
+METRICS_VERSION = "5"       # Update when metric definitions change (invalidates cached results).
+REFERENCE_STORE_VERSION = "2"       # Update when the reference store layout changes.
+
+CACHE_MAX_SIZE = 512 * 1024 * 1024      # in bytes
+
+SERVICE_PORT = 8777                     # Evaluation service (see aseg_server.py), on localhost
+SERVICE_MAX_REFERENCES = 256            # Reference images kept in memory by the service
+
+SLICE_COLUMNS = [ "SEGMENTATION ID", "SLICE", "LABEL", "REFERENCE VOLUME", "TARGET VOLUME", "DICE", "HD", "ASSD" ]   # in mL, mm (HD), voxels (ASSD)
+
+TIMING_COLUMNS = [ "SEGMENTATION ID", "STAGE", "LABEL", "TIME", "PEAK MEMORY" ]   # in s, MB
+
+NO_PROFILING = contextlib.nullcontext()
+
+# NIfTI-1 data types memory-mapped by readLabelImage: { datatype code : NumPy type }.
+NIFTI_LABEL_TYPES = { 2:np.uint8,
+                      4:np.int16,
+                      256:np.int8,
+                      512:np.uint16 }
+
 #-------------------------------------------------------------------------------
 # Core classes and functions.
 #-------------------------------------------------------------------------------
+class PartialResultsException(Exception):
+    """
+    Partial results files (shards) that cannot be merged.
+    """
+
+
 class AssessSegmentations( object ):
     """
     Input file list manager class.
     """
-    def __init__( self, inputFilePath ):
+    def __init__( self, inputFilePath, jobs=1, threadsPerJob=None, cacheDir=None, cacheMaxSize=CACHE_MAX_SIZE, referenceStoreDir=None,
+                  profile=False, traceMemory=False, prefetch=0, memoryMap=False, surfaceEngine=SURFACE_ENGINE_DISTANCE_MAP,
+                  sliceWise=False, sliceJobs=1, shard=None ):
         """
         Default constructor.
+
+        jobs               Number of worker processes (1 = sequential).
+        threadsPerJob      SimpleITK threads per worker process. By default,
+                           the available cores are shared among the workers.
+        cacheDir           Directory of the results cache (None = no cache).
+        cacheMaxSize       Size cap of the results cache (in bytes).
+        referenceStoreDir  Directory of precomputed reference data
+                           (see ReferenceStore, None = not used).
+        profile            Record per-stage timings (see StageProfiler).
+        traceMemory        Record per-stage peak memory (requires profile).
+        prefetch           Number of upcoming cases read by background
+                           threads while the current one is computed
+                           (sequential execution only, 0 = no prefetch).
+        memoryMap          Memory-map uncompressed NIfTI files instead of
+                           reading them (see readLabelImage).
+        surfaceEngine      HD/ASSD engine: SURFACE_ENGINE_DISTANCE_MAP or
+                           SURFACE_ENGINE_KDTREE.
+        sliceWise          Slice-wise (2D) evaluation (see AssessSegmentation).
+        sliceJobs          Threads computing the slices of a case.
+        shard              (index, number of shards): only rows with
+                           row % number of shards == index are assessed
+                           (see ToPartial and LoadPartials).
         """
         self.FILE_PATH = None
         self.NUM_SEGMENTATIONS = 0
 
+        self.jobs = max( 1, int(jobs) )
+        self.threadsPerJob = threadsPerJob
+
+        self.cache = None
+        self.referenceStoreDir = referenceStoreDir
+
+        self.profile = profile
+        self.traceMemory = traceMemory
+        self.timings = []
+
+        self.prefetch = max( 0, int(prefetch) )
+        self.memoryMap = memoryMap
+        self.surfaceEngine = surfaceEngine
+
+        self.sliceWise = sliceWise
+        self.sliceJobs = sliceJobs
+        self.sliceMetrics = []
+
+        self.shard = shard
+
+        if cacheDir is not None:
+            self.cache = ResultsCache( cacheDir, cacheMaxSize )
+
         self.segmentationsData = None
         self.referenceList = None
         self.targetList = None
 
         self.assessments = []
+        self.results = None
+        self.statistics = RunningStatistics()
 
         self.overallReferenceMetrics = MyosaiqMetrics("REFERENCE AVG")
         self.overallTargetMetrics = MyosaiqMetrics("TARGET AVG")
 
+        if inputFilePath is None:
+            return      # Assessments are set with SetAssessments().
+
         if verifyFile( inputFilePath ):
             self.FILE_PATH = inputFilePath
             self.__Load()
@@ -126,141 +293,246 @@ class AssessSegmentations( object ):
             return
 
         print("[AssessSegmentations::Compute] Executing ...")
-                  
-        for segmentation in assessmentPlan:
-            aseg = AssessSegmentation( segmentation[0],  # Reference 
-                                       segmentation[1] ) # Target
-            aseg.Compute()
-            
-            self.assessments.append( aseg )
 
-        for key in LABEL:
+        metrics = [ None ] * len(assessmentPlan)
+        caseSliceMetrics = [ None ] * len(assessmentPlan)
+        cacheKeys = [ None ] * len(assessmentPlan)
 
-            refVolume = []
-            refVolumeAD = []
-            refDICE = []
-            refHD = []
-            refASSD = []
-
-            tarVolume = []
-            tarVolumeAD = []
-            tarDICE = []
-            tarHD = []
-            tarASSD = []            
-
-            for seg in self.assessments:
-                refVolume.append(  seg.referenceMetrics.VOLUME[key].value )
-                refVolumeAD.append(seg.referenceMetrics.VOLUME_MAE[key].value)
-                refDICE.append(    seg.referenceMetrics.DICE[key].value)
-                refHD.append(      seg.referenceMetrics.HD[key].value)
-                refASSD.append(    seg.referenceMetrics.ASSD[key].value)
-
-                tarVolume.append(  seg.targetMetrics.VOLUME[key].value )
-                tarVolumeAD.append(seg.targetMetrics.VOLUME_MAE[key].value)
-                tarDICE.append(    seg.targetMetrics.DICE[key].value)
-                tarHD.append(      seg.targetMetrics.HD[key].value)
-                tarASSD.append(    seg.targetMetrics.ASSD[key].value)  
-
-            if len(refVolume) > 1:
-                self.overallReferenceMetrics.VOLUME[key].value = np.nanmean(refVolume)
-                self.overallReferenceMetrics.VOLUME[key].std = np.nanstd(refVolume)
+        if self.cache is not None:
+            for index, segmentation in enumerate(assessmentPlan):
+                cacheKeys[index] = self.cache.GetKey( segmentation[0], segmentation[1], self.sliceWise, self.surfaceEngine )
+                cachedResults = self.cache.Get( cacheKeys[index], segmentation[0], segmentation[1] )
 
-            else:
-                self.overallReferenceMetrics.VOLUME[key].value = refVolume[0]
-                self.overallReferenceMetrics.VOLUME[key].std = np.nanstd(refVolume)
+                # Slice-wise entries must have their slice records.
+                if (cachedResults is None) or (self.sliceWise and cachedResults[2] is None):
+                    continue
 
+                metrics[index] = cachedResults[:2]
+                caseSliceMetrics[index] = cachedResults[2]
 
-            actual = np.array(refVolume)
-            predicted = np.array(tarVolume)
+        pending = [ index for index in range(len(assessmentPlan)) if metrics[index] is None ]
 
-            actual = actual[~np.isnan(actual)]
-            predicted = predicted[~np.isnan(predicted)]
-            
-            mae = float( np.nanmean( np.abs(actual - predicted) ) )
+        # Overall statistics are updated as each case is available (see GetRunningMetrics).
+        self.statistics = RunningStatistics()
+        self.sliceMetrics = []
 
-            # print( np.corrcoef(actual, predicted) )
-            
-            coco = np.NaN
+        for caseMetrics in metrics:
+            if caseMetrics is not None:
+                self.statistics.Update( caseMetrics[0], caseMetrics[1] )
 
-            if(actual.shape[0] > 1):
-                coco = np.corrcoef(actual, predicted)[0,1].tolist()
+        if self.cache is not None:
+            print("[AssessSegmentations::Compute] %d/%d results from cache." % (len(assessmentPlan) - len(pending), len(assessmentPlan)))
 
-            self.overallReferenceMetrics.VOLUME_MAE[key].value = mae
-            self.overallReferenceMetrics.VOLUME_CC[key].value = coco
+        computedMetrics = self.__ComputeMetrics( [ assessmentPlan[index] for index in pending ] )
 
-            self.overallReferenceMetrics.VOLUME_LOA[key].value = 1.96 * self.overallReferenceMetrics.VOLUME[key].std
-            
-            self.overallReferenceMetrics.DICE[key].value = np.nanmean(refDICE)
-            self.overallReferenceMetrics.DICE[key].std = np.nanstd(refDICE)
+        for index, caseResults in zip( pending, computedMetrics ):
+            caseMetrics = caseResults[:2]
+            metrics[index] = caseMetrics
 
-            self.overallReferenceMetrics.HD[key].value = np.nanmean(refHD)
-            self.overallReferenceMetrics.HD[key].std = np.nanstd(refHD)
+            self.statistics.Update( caseMetrics[0], caseMetrics[1] )
 
-            self.overallReferenceMetrics.ASSD[key].value = np.nanmean(refASSD)
-            self.overallReferenceMetrics.ASSD[key].std = np.nanstd(refASSD) 
+            if caseResults[2] is not None:
+                self.timings.extend( caseResults[2] )
 
-            self.overallTargetMetrics.VOLUME[key].value = np.nanmean(tarVolume)
-            self.overallTargetMetrics.VOLUME[key].std = np.nanstd(tarVolume)
+            caseSliceMetrics[index] = caseResults[3]
 
-            self.overallTargetMetrics.VOLUME_MAE[key].value = mae
-            self.overallTargetMetrics.VOLUME_CC[key].value = coco
+            if self.cache is not None:
+                self.cache.Put( cacheKeys[index], caseMetrics, caseResults[3] )
 
-            self.overallTargetMetrics.VOLUME_LOA[key].value = 1.96 * self.overallTargetMetrics.VOLUME[key].std
-            
-            self.overallTargetMetrics.DICE[key].value = np.nanmean(tarDICE)
-            self.overallTargetMetrics.DICE[key].std = np.nanstd(tarDICE)
+        if self.cache is not None:
+            self.cache.Evict()
 
-            self.overallTargetMetrics.HD[key].value = np.nanmean(tarHD)
-            self.overallTargetMetrics.HD[key].std = np.nanstd(tarHD)
+        # Slice records in input order, cached cases included.
+        for sliceRecords in caseSliceMetrics:
+            if sliceRecords is not None:
+                self.sliceMetrics.extend( sliceRecords )
 
-            self.overallTargetMetrics.ASSD[key].value = np.nanmean(tarASSD)
-            self.overallTargetMetrics.ASSD[key].std = np.nanstd(tarASSD)
+        # Only metrics are kept: memory does not grow with the images of the cohort.
+        self.SetAssessments( [ AssessmentResult( segmentation[0],  # Reference
+                                                 segmentation[1],  # Target
+                                                 caseMetrics[0],
+                                                 caseMetrics[1],
+                                                 segmentation[2] ) for segmentation, caseMetrics in zip( assessmentPlan, metrics ) ],
+                             self.statistics )
 
         print("[AssessSegmentations::Compute] Finished!")
 
 
+    def SetAssessments( self, assessments, statistics=None ):
+        """
+        Set the assessments (AssessmentResult list, e.g. computed
+        elsewhere) and calculate overall statistics (statistics: the
+        RunningStatistics of these assessments, if already updated).
+        """
+        self.assessments = list( assessments )
+
+        if statistics is None:
+            statistics = RunningStatistics()
+
+            for aseg in self.assessments:
+                statistics.Update( aseg.referenceMetrics, aseg.targetMetrics )
+
+        self.statistics = statistics
+
+        if not self.assessments:
+            return
+
+        self.__Store()
+        self.__Aggregate()
+
+
+    def __ComputeMetrics( self, assessmentPlan ):
+        """
+        Calculate metrics of each (reference, target) pair, sequentially or
+        in a pool of worker processes. Workers return MyosaiqMetrics only;
+        results (referenceMetrics, targetMetrics, timings) are yielded as
+        they finish, in the order of the assessment plan.
+        """
+        referenceFiles = [ segmentation[0] for segmentation in assessmentPlan ]
+        targetFiles = [ segmentation[1] for segmentation in assessmentPlan ]
+
+        assess = partial( computeAssessment,
+                          referenceStoreDir=self.referenceStoreDir,
+                          profile=self.profile,
+                          traceMemory=self.traceMemory,
+                          memoryMap=self.memoryMap,
+                          surfaceEngine=self.surfaceEngine,
+                          sliceWise=self.sliceWise,
+                          sliceJobs=self.sliceJobs )
+
+        if ((self.jobs == 1) or (len(assessmentPlan) < 2)) and (self.prefetch > 0):
+            yield from self.__ComputePrefetched( assess, referenceFiles, targetFiles )
+            return
+
+        yield from mapInWorkers( assess, self.jobs, self.threadsPerJob, referenceFiles, targetFiles )
+
+
+    def __ComputePrefetched( self, assess, referenceFiles, targetFiles ):
+        """
+        Sequential assessment with image prefetching: background threads
+        read (and decompress) up to self.prefetch upcoming case pairs while
+        the current case is computed. Results keep the plan order.
+        """
+        load = partial( loadAssessmentImages, referenceStoreDir=self.referenceStoreDir, memoryMap=self.memoryMap )
+
+        loading = deque()
+        nextIndex = 0
+
+        with ThreadPoolExecutor( max_workers=min( self.prefetch, os.cpu_count() or 1 ) ) as executor:
+
+            for index in range( len(referenceFiles) ):
+                # Current case plus self.prefetch cases ahead (bounded queue).
+                while (nextIndex < len(referenceFiles)) and (nextIndex <= index + self.prefetch):
+                    loading.append( executor.submit(load, referenceFiles[nextIndex], targetFiles[nextIndex]) )
+                    nextIndex += 1
+
+                referenceImage, targetImage = loading.popleft().result()
+
+                yield assess( referenceFiles[index], targetFiles[index],
+                              referenceImage=referenceImage,
+                              targetImage=targetImage )
+
+
+    def __Store( self ):
+        """
+        Fill the results store: overall metrics (first two rows, see
+        __Aggregate), then reference and target metrics of each case.
+        """
+        segmentationNames = [ self.overallReferenceMetrics.segmentationName,
+                              self.overallTargetMetrics.segmentationName ]
+
+        for aseg in self.assessments:
+            segmentationNames.append( aseg.referenceMetrics.segmentationName )
+            segmentationNames.append( aseg.targetMetrics.segmentationName )
+
+        self.results = MetricsStore( segmentationNames )
+
+        for index, aseg in enumerate( self.assessments ):
+            self.results.Set( 2 + 2 * index, aseg.referenceMetrics )
+            self.results.Set( 3 + 2 * index, aseg.targetMetrics )
+
+
+    def __Aggregate( self ):
+        """
+        Set overall (per-label) statistics from the running statistics of
+        the assessments (see RunningStatistics).
+        """
+        self.overallReferenceMetrics, self.overallTargetMetrics = self.statistics.GetMetrics()
+
+        self.results.Set( 0, self.overallReferenceMetrics )
+        self.results.Set( 1, self.overallTargetMetrics )
+
+
+    def GetRunningMetrics( self ):
+        """
+        Return overall (reference, target) MyosaiqMetrics of the cases
+        assessed so far (may be queried while Compute() is running).
+        """
+        return self.statistics.GetMetrics()
+
 
     def __VerifyFilePaths( self ):
         """
-        Verify files.
+        Verify files (rows of the shard, if any): [ (reference, target, row) ].
         """
         verifiedList = []
 
         if self.referenceList is not None:
             for index, row in self.referenceList.iterrows():
+                if (self.shard is not None) and (index % self.shard[1] != self.shard[0]):
+                    continue
+
                 referenceSegmentation = row[0]
                 targetSegmentation = self.targetList.iloc[index]["TARGET"]
                 
                 if verifyFile(referenceSegmentation) and \
                 verifyFile(targetSegmentation):
-                    verifiedList.append( (referenceSegmentation, targetSegmentation) )
+                    verifiedList.append( (referenceSegmentation, targetSegmentation, index) )
                 else:
                     print("[AssessSegmentations::VerifyFilePaths Warning] %s  <- %s  File does not exist!" % (referenceSegmentation, targetSegmentation) )
 
         return verifiedList
     
 
-    def GetDataFrame( self ):
+    def ComputeConfidenceIntervals( self, resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE, seed=None ):
         """
-        Return DataFrame
+        Bootstrap confidence intervals of the overall statistics (CI LOW
+        and CI HIGH columns of GetDataFrame, see MetricsStore.Bootstrap).
         """
-        dataFrame = self.overallReferenceMetrics.GetDataFrame()
-        dataFrame = pd.concat([dataFrame, self.overallTargetMetrics.GetDataFrame()])
-                
-        for aseg in self.assessments:            
-            dataFrame = pd.concat( [dataFrame, aseg.referenceMetrics.GetDataFrame()] )
-            dataFrame = pd.concat( [dataFrame, aseg.targetMetrics.GetDataFrame()] )
+        if self.results is None:
+            return
 
+        self.results.Bootstrap( resamples, confidence, seed )
 
-        return dataFrame
+
+    def GetDataFrame( self, layout="long" ):
+        """
+        Return DataFrame (built from the results store).
+
+        layout  "long": one row per segmentation, label and metric.
+                "wide": one row per segmentation, one column per label
+                        and metric (see MetricsStore.GetWideDataFrame).
+        """
+        results = self.results
+
+        if results is None:
+            results = MetricsStore( [ self.overallReferenceMetrics.segmentationName,
+                                      self.overallTargetMetrics.segmentationName ] )
+            results.Set( 0, self.overallReferenceMetrics )
+            results.Set( 1, self.overallTargetMetrics )
+
+        if layout == "wide":
+            return results.GetWideDataFrame()
+
+        return results.GetDataFrame()
 
     
-    def ToCSV( self, filePath ):
+    def ToCSV( self, filePath, layout="long" ):
         """
         Export results to CSV file.
         """
         try:
-            dataFrame = self.GetDataFrame()
+            dataFrame = self.GetDataFrame( layout )
             dataFrame.to_csv (filePath, index = None, header=True, sep=",")
             print("[AssessSegmentations::ToCSV] Results to CSV file done!")
 
@@ -269,13 +541,237 @@ class AssessSegmentations( object ):
             log.error("[AssessSegmentations::ToCSV Exception] %s" % str(traceback.format_exc()))
 
 
+    def ToParquet( self, filePath, layout="long" ):
+        """
+        Export results to a Parquet file (typed columns, requires pyarrow).
+        """
+        try:
+            dataFrame = getTypedDataFrame( self.GetDataFrame(layout) )
+            dataFrame.to_parquet( filePath, index=False )
+            print("[AssessSegmentations::ToParquet] Results to Parquet file done!")
+
+        except Exception as exception:
+            log.error("[AssessSegmentations::ToParquet Exception] %s" % str(exception))
+            log.error("[AssessSegmentations::ToParquet Exception] %s" % str(traceback.format_exc()))
+
+
+    def ToArrow( self, filePath, layout="long" ):
+        """
+        Export results to an Arrow IPC (Feather) file (typed columns,
+        requires pyarrow).
+        """
+        try:
+            dataFrame = getTypedDataFrame( self.GetDataFrame(layout) )
+            dataFrame.to_feather( filePath )
+            print("[AssessSegmentations::ToArrow] Results to Arrow file done!")
+
+        except Exception as exception:
+            log.error("[AssessSegmentations::ToArrow Exception] %s" % str(exception))
+            log.error("[AssessSegmentations::ToArrow Exception] %s" % str(traceback.format_exc()))
+
+
+    def ToPartial( self, filePath ):
+        """
+        Export the per-case table metrics (see MetricsStore) and input rows
+        to a compact partial results file (.npz), to be merged with the
+        other shards by LoadPartials. The shard (index, number of shards)
+        and the full input list are stored to validate the merge.
+        """
+        try:
+            numberOfCases = len(self.assessments)
+
+            shard = self.shard if self.shard is not None else (0, 1)
+
+            inputReferenceFiles = []
+            inputTargetFiles = []
+
+            if self.referenceList is not None:
+                inputReferenceFiles = self.referenceList["REFERENCE"].astype(str).tolist()
+                inputTargetFiles = self.targetList["TARGET"].astype(str).tolist()
+
+            values = np.full( (numberOfCases * 2, len(LABEL), len(TABLE_METRICS)), np.NaN )
+            stds = np.full( values.shape, np.NaN )
+            segmentationNames = []
+
+            if numberOfCases > 0:
+                values = self.results.values[2:]
+                stds = self.results.stds[2:]
+                segmentationNames = self.results.segmentationNames[2:]
+
+            np.savez_compressed( filePath,
+                                 metricsVersion=np.array( METRICS_VERSION ),
+                                 shardIndex=np.array( shard[0], dtype=np.int64 ),
+                                 shardCount=np.array( shard[1], dtype=np.int64 ),
+                                 inputReferenceFiles=np.array( inputReferenceFiles, dtype=str ),
+                                 inputTargetFiles=np.array( inputTargetFiles, dtype=str ),
+                                 rows=np.array( [ aseg.row for aseg in self.assessments ], dtype=np.int64 ),
+                                 referenceFiles=np.array( [ aseg.REFERENCE_SEGMENTATION_FILE_PATH for aseg in self.assessments ], dtype=str ),
+                                 targetFiles=np.array( [ aseg.TARGET_SEGMENTATION_FILE_PATH for aseg in self.assessments ], dtype=str ),
+                                 segmentationNames=np.array( segmentationNames, dtype=str ),
+                                 values=values,
+                                 stds=stds )
+
+            print("[AssessSegmentations::ToPartial] Partial results to file done!")
+
+        except Exception as exception:
+            log.error("[AssessSegmentations::ToPartial Exception] %s" % str(exception))
+            log.error("[AssessSegmentations::ToPartial Exception] %s" % str(traceback.format_exc()))
+
+
+    def LoadPartials( self, filePaths ):
+        """
+        Merge partial results files (see ToPartial): cases follow the input
+        rows, and overall statistics are calculated as in a single run.
+        The partials must be the complete set of shards of the same input
+        list, each shard once, with rows of their own shard only. Return
+        False (nothing merged) otherwise.
+        """
+        assessments = []
+
+        try:
+            shardFiles = {}
+            shardSettings = None
+
+            for filePath in filePaths:
+                with np.load( filePath, allow_pickle=False ) as partial:
+                    if str( partial["metricsVersion"] ) != METRICS_VERSION:
+                        raise PartialResultsException( "%s: metrics version does not match!" % filePath )
+
+                    shardIndex = int( partial["shardIndex"] )
+                    shardCount = int( partial["shardCount"] )
+
+                    inputReferenceFiles = partial["inputReferenceFiles"].tolist()
+                    inputTargetFiles = partial["inputTargetFiles"].tolist()
+
+                    if shardSettings is None:
+                        shardSettings = ( shardCount, inputReferenceFiles, inputTargetFiles )
+
+                    elif ( shardCount, inputReferenceFiles, inputTargetFiles ) != shardSettings:
+                        raise PartialResultsException( "%s: number of shards or input list differs from %s!" % (filePath, next(iter(shardFiles.values()))) )
+
+                    if shardIndex in shardFiles:
+                        raise PartialResultsException( "%s: shard %d of %d already loaded from %s!" % (filePath, shardIndex, shardCount, shardFiles[shardIndex]) )
+
+                    shardFiles[shardIndex] = filePath
+
+                    results = MetricsStore( partial["segmentationNames"] )
+                    results.values = partial["values"]
+                    results.stds = partial["stds"]
+
+                    for index, row in enumerate( partial["rows"] ):
+                        row = int(row)
+                        referenceFile = str( partial["referenceFiles"][index] )
+                        targetFile = str( partial["targetFiles"][index] )
+
+                        if (row % shardCount != shardIndex) or (row >= len(inputReferenceFiles)) or \
+                           ( (referenceFile, targetFile) != (inputReferenceFiles[row], inputTargetFiles[row]) ):
+                            raise PartialResultsException( "%s: row %d does not match shard %d of %d of the input list!" % (filePath, row, shardIndex, shardCount) )
+
+                        assessments.append( AssessmentResult( referenceFile,
+                                                              targetFile,
+                                                              results.GetMetrics( 2 * index ),
+                                                              results.GetMetrics( 2 * index + 1 ),
+                                                              row ) )
+
+            if shardSettings is None:
+                raise PartialResultsException( "No partial results files!" )
+
+            missingShards = sorted( set( range(shardSettings[0]) ) - set( shardFiles ) )
+
+            if missingShards:
+                raise PartialResultsException( "Missing shards %s of %d!" % (missingShards, shardSettings[0]) )
+
+        except Exception as exception:
+            log.error("[AssessSegmentations::LoadPartials Exception] %s" % str(exception))
+            log.error("[AssessSegmentations::LoadPartials Exception] %s" % str(traceback.format_exc()))
+
+            self.NUM_SEGMENTATIONS = 0
+            self.SetAssessments( [] )
+
+            return False
+
+        assessments.sort( key=lambda aseg: aseg.row )
+
+        self.NUM_SEGMENTATIONS = len(assessments)
+        self.SetAssessments( assessments )
+
+        return True
+
+
+    def GetSliceDataFrame( self ):
+        """
+        Return per-slice metrics (slice-wise evaluation, computed cases
+        only) as a DataFrame.
+        """
+        return pd.DataFrame( data=self.sliceMetrics, columns=SLICE_COLUMNS )
+
+
+    def SlicesToCSV( self, filePath ):
+        """
+        Export per-slice metrics to CSV file.
+        """
+        try:
+            dataFrame = self.GetSliceDataFrame()
+            dataFrame.to_csv( filePath, index = None, header=True, sep="," )
+            print("[AssessSegmentations::SlicesToCSV] Slice metrics to CSV file done!")
+
+        except Exception as exception:
+            log.error("[AssessSegmentations::SlicesToCSV Exception] %s" % str(exception))
+            log.error("[AssessSegmentations::SlicesToCSV Exception] %s" % str(traceback.format_exc()))
+
+
+    def GetTimingsDataFrame( self ):
+        """
+        Return per-stage timings (computed cases only) as a DataFrame.
+        """
+        return getTimingsDataFrame( self.timings )
+
+
+    def TimingsToFile( self, filePath ):
+        """
+        Export per-stage timings to a CSV or JSON (.json) file.
+        """
+        try:
+            dataFrame = self.GetTimingsDataFrame()
+
+            if filePath.endswith(".json"):
+                dataFrame.to_json( filePath, orient="records", indent=2 )
+            else:
+                dataFrame.to_csv( filePath, index = None, header=True, sep="," )
+
+            print("[AssessSegmentations::TimingsToFile] Timings to file done!")
+
+        except Exception as exception:
+            log.error("[AssessSegmentations::TimingsToFile Exception] %s" % str(exception))
+            log.error("[AssessSegmentations::TimingsToFile Exception] %s" % str(traceback.format_exc()))
+
+
 class AssessSegmentation( object ):
     """
     Input file list manager class.
     """
-    def __init__( self, refSegFilePath, tarSegFilePath ):
+    def __init__( self, refSegFilePath, tarSegFilePath, referenceStore=None, profile=False, traceMemory=False, referenceImage=None, targetImage=None,
+                  memoryMap=False, surfaceEngine=SURFACE_ENGINE_DISTANCE_MAP, sliceWise=False, sliceJobs=1 ):
         """
         Default constructor.
+
+        referenceStore  ReferenceStore with precomputed reference data
+                        (None = reference data is computed).
+        referenceImage  Reference image already loaded (UInt16), shared by
+                        several assessments (None = read from file).
+        targetImage     Target image already loaded (UInt16, None = read
+                        from file).
+        memoryMap       Memory-map uncompressed NIfTI files (see
+                        readLabelImage).
+        surfaceEngine   HD/ASSD engine: SURFACE_ENGINE_DISTANCE_MAP
+                        (DistanceMapSurfaceDistances) or
+                        SURFACE_ENGINE_KDTREE (KDTreeSurfaceDistances).
+        sliceWise       Slice-wise (2D) evaluation along the slice axis:
+                        per-slice metrics (sliceMetrics), in addition to
+                        the case (3D) metrics.
+        sliceJobs       Threads computing the slices.
+        profile         Record per-stage timings (see StageProfiler).
+        traceMemory     Record per-stage peak memory (requires profile).
         """
         self.REFERENCE_SEGMENTATION_FILE_PATH = None
         self.TARGET_SEGMENTATION_FILE_PATH = None
@@ -292,6 +788,37 @@ class AssessSegmentation( object ):
 
         self.referenceLabels = None
 
+        self.confusionMatrix = None
+
+        self.directedSurfaceDistances = {}
+
+        self.referenceStore = referenceStore
+        self.precomputedReference = None
+
+        self.referenceImage = referenceImage
+        self.targetImage = targetImage
+
+        self.memoryMap = memoryMap
+
+        self.surfaceEngine = surfaceEngine
+
+        if (surfaceEngine == SURFACE_ENGINE_KDTREE) and (scipy is None):
+            print("[AssessSegmentation] KD-tree surface engine requires scipy, using distance maps!")
+            self.surfaceEngine = SURFACE_ENGINE_DISTANCE_MAP
+
+        self.sliceWise = sliceWise
+        self.sliceJobs = max( 1, int(sliceJobs) )
+
+        self.sliceMetrics = []              # [ SEGMENTATION ID, SLICE, LABEL, ... ] (see SLICE_COLUMNS)
+
+        self.profiler = None
+
+        self.referenceBoundingBoxes = {}
+        self.targetBoundingBoxes = {}
+
+        self.referenceVoxels = None         # LabelVoxels (None with precomputed reference data)
+        self.targetVoxels = None
+
         self.pixelVolume = 0
 
         if ( verifyFile(refSegFilePath) ):
@@ -306,7 +833,10 @@ class AssessSegmentation( object ):
                 self.referenceMetrics = MyosaiqMetrics( self.REFERENCE_SEGMENTATION_FILE_NAME )
                 self.targetMetrics = MyosaiqMetrics( self.TARGET_SEGMENTATION_FILE_NAME )
 
-                self.__Load()
+                if profile:
+                    self.profiler = StageProfiler( self.REFERENCE_SEGMENTATION_FILE_NAME, traceMemory )
+
+                # Images are loaded by Compute().
 
             else:
                 print("[AssessSegmentation] Missing target segmentation file!")
@@ -328,35 +858,117 @@ class AssessSegmentation( object ):
 
     def __Load( self ):
         """
-        Load images.
+        Load images. Return True on success.
         """
         try:            
-            self.referenceImageSegmentation = sitk.Cast(sitk.ReadImage( self.REFERENCE_SEGMENTATION_FILE_PATH ), sitk.sitkUInt16 ) 
-            self.targetImageSegmentation = sitk.Cast(   sitk.ReadImage( self.TARGET_SEGMENTATION_FILE_PATH ),    sitk.sitkUInt16 )
+            if (self.referenceStore is not None) and self.referenceStore.Has( self.REFERENCE_SEGMENTATION_FILE_PATH ):
+                self.precomputedReference = self.referenceStore.Load( self.REFERENCE_SEGMENTATION_FILE_PATH )
+
+                self.referenceImageSegmentation = self.precomputedReference.GetImage()
+
+            elif self.referenceImage is not None:
+                self.referenceImageSegmentation = self.referenceImage
+
+            else:
+                self.referenceImageSegmentation = readLabelImage( self.REFERENCE_SEGMENTATION_FILE_PATH, self.memoryMap )
+
+            if self.targetImage is not None:
+                self.targetImageSegmentation = self.targetImage
 
-            referenceLabelShapeStats = sitk.LabelShapeStatisticsImageFilter()
-            referenceLabelShapeStats.Execute(self.referenceImageSegmentation)
+            else:
+                self.targetImageSegmentation = readLabelImage( self.TARGET_SEGMENTATION_FILE_PATH, self.memoryMap )
 
-            self.referenceLabels = referenceLabelShapeStats.GetLabels()
+            return True
 
         except Exception as exception:
             log.error("[AssessSegmentation::Load Exception] %s" % str(exception))
             log.error("[AssessSegmentation::Load Exception] %s" % str(traceback.format_exc()))
 
+            self.__Release()
+
+            return False
+
 
     def Compute( self ):
         """
-        Calculate metrics
+        Calculate metrics.
+        Images are loaded here and released once the metrics are extracted.
         """
         if (self.REFERENCE_SEGMENTATION_FILE_PATH is None) or (self.TARGET_SEGMENTATION_FILE_PATH is None):
             return 
-        
-        self.__VerifySpacingOrigin()
 
-        self.__CalcVolume()
-        self.__CalcDICE()          # DICE Must be calculated BEFORE HD and/or ASSD.
-        self.__CalcHD()
-        self.__CalcASSD()
+        start = time.perf_counter()
+
+        if self.profiler is not None:
+            self.profiler.Start()
+
+        try:
+            with self.__Stage( "Load" ):
+                if not self.__Load():
+                    return
+
+            self.__VerifySpacingOrigin()
+
+            with self.__Stage( "ConfusionMatrix" ):
+                self.__CalcConfusionMatrix()   # Labels, volumes and overlap measures.
+
+            with self.__Stage( "Volume" ):
+                self.__CalcVolume()
+
+            with self.__Stage( "DICE" ):
+                self.__CalcDICE()          # DICE Must be calculated BEFORE HD and/or ASSD.
+
+            if self.sliceWise:
+                with self.__Stage( "SliceMetrics" ):
+                    self.__CalcSliceMetrics()
+
+            self.__CalcSurfaceDistances()
+
+        finally:
+            self.__Release()
+
+            if self.profiler is not None:
+                self.profiler.AddRecord( "Compute", None, time.perf_counter() - start )
+                self.profiler.Stop()
+
+
+    def __Stage( self, stage, label=None ):
+        """
+        Profiling context of a stage (no-op when profiling is disabled).
+        """
+        if self.profiler is None:
+            return NO_PROFILING
+
+        return self.profiler.Stage( stage, label )
+
+
+    def GetTimingsDataFrame( self ):
+        """
+        Return per-stage timings as a DataFrame (empty without profiling).
+        """
+        records = self.profiler.records if self.profiler is not None else []
+
+        return getTimingsDataFrame( records )
+
+
+    def __Release( self ):
+        """
+        Release images and intermediate data.
+        """
+        self.referenceImageSegmentation = None
+        self.targetImageSegmentation = None
+
+        self.referenceImage = None
+        self.targetImage = None
+
+        self.precomputedReference = None
+
+
+        self.referenceBoundingBoxes = {}
+        self.targetBoundingBoxes = {}
+
+        self.referenceVoxels = None
+        self.targetVoxels = None
 
 
     def __VerifySpacingOrigin( self ):
@@ -374,159 +986,1906 @@ class AssessSegmentation( object ):
         self.pixelVolume = referenceXSize * referenceYSize * referenceZSize
 
 
-    def __CalcVolume( self ):
+    def __CalcConfusionMatrix( self ):
         """
-        Calculate volume
+        Calculate the label confusion matrix (reference label x target
+        label pixel counts) in a single pass over both label images, and
+        the reference labels. Labels above the MYOSAIQ labels are counted
+        together in the last row/column (negative ones as background).
+
+        Label codes (reference * number of labels + target) are uint16 and
+        counted by chunks of CONFUSION_MATRIX_CHUNK_SIZE pixels, so no full
+        size copy of the images is made (bincount casts its input to intp).
         """
-        refLabelShapeStats = sitk.LabelShapeStatisticsImageFilter()
-        tarLabelShapeStats = sitk.LabelShapeStatisticsImageFilter()
+        referenceArray = getImageArray( self.referenceImageSegmentation ).reshape( -1 )
+        targetArray = getImageArray( self.targetImageSegmentation ).reshape( -1 )
 
-        refLabelShapeStats.Execute(self.referenceImageSegmentation)
-        tarLabelShapeStats.Execute(self.targetImageSegmentation)
+        numberOfLabels = max( LABEL ) + 2
 
-        # xSize, ySize, zSize = self.referenceImageSegmentation.GetSpacing()
-        # pixelVolume = xSize*ySize*zSize
+        chunkSize = max( 1, min( CONFUSION_MATRIX_CHUNK_SIZE, referenceArray.size ) )
 
-        for label in self.referenceLabels:
-            try:
-                referencePixels = refLabelShapeStats.GetNumberOfPixels( label )
-                targetPixels = tarLabelShapeStats.GetNumberOfPixels( label ) 
+        referenceCodes = np.empty( chunkSize, dtype=np.uint16 )
+        targetCodes = np.empty( chunkSize, dtype=np.uint16 )
 
-                referenceVolume = referencePixels * self.pixelVolume * MM_TO_ML_FACTOR
-                targetVolume    = targetPixels * self.pixelVolume * MM_TO_ML_FACTOR
+        labelCounts = np.zeros( numberOfLabels**2, dtype=np.int64 )
 
-                absDifference = np.abs(referenceVolume - targetVolume)
+        for start in range( 0, referenceArray.size, chunkSize ):
+            stop = min( start + chunkSize, referenceArray.size )
 
-                self.referenceMetrics.VOLUME[label].value = referenceVolume
-                self.referenceMetrics.VOLUME_MAE[label].value = absDifference
+            labelCodes = referenceCodes[:stop - start]
+            targetLabels = targetCodes[:stop - start]
 
-                self.targetMetrics.VOLUME[label].value = targetVolume
-                self.targetMetrics.VOLUME_MAE[label].value = absDifference
-        
-            except Exception as exception:
-                self.referenceMetrics.VOLUME[label].value = np.NAN
-                self.referenceMetrics.VOLUME_MAE[label].value = np.NAN
+            np.clip( referenceArray[start:stop], 0, numberOfLabels - 1, out=labelCodes, casting="unsafe" )
+            np.clip( targetArray[start:stop], 0, numberOfLabels - 1, out=targetLabels, casting="unsafe" )
 
-                self.targetMetrics.VOLUME[label].value = np.NAN
-                self.targetMetrics.VOLUME_MAE[label].value = np.NAN
+            labelCodes *= numberOfLabels
+            labelCodes += targetLabels
 
-                log.error("[AssessSegmentation::CalcVolume Exception] %s" % str(exception))
-                log.error("[AssessSegmentation::CalcVolume Exception] %s" % str(traceback.format_exc()))                
+            labelCounts += np.bincount( labelCodes, minlength=numberOfLabels**2 )
 
+        self.confusionMatrix = labelCounts.reshape( numberOfLabels, numberOfLabels )
 
-    def __CalcDICE( self ):
-        """
-        Calculate DICE
-        """
-        overlapMeasures = sitk.LabelOverlapMeasuresImageFilter()
-        overlapMeasures.Execute(self.referenceImageSegmentation, self.targetImageSegmentation)
+        referencePixels = self.confusionMatrix.sum( axis=1 )
 
-        for label in self.referenceLabels:
-            try:
-                self.referenceMetrics.DICE[label].value = overlapMeasures.GetDiceCoefficient( label )
-                self.targetMetrics.DICE[label].value = overlapMeasures.GetDiceCoefficient( label )
+        self.referenceLabels = tuple( label for label in LABEL if referencePixels[label] > 0 )
 
-            except Exception as exception:
-                self.referenceMetrics.DICE[label].value = np.NAN
-                self.targetMetrics.DICE[label].value = np.NAN
-                
-                log.error("[AssessSegmentation::CalcDICE Exception] %s" % str(exception))
-                log.error("[AssessSegmentation::CalcDICE Exception] %s" % str(traceback.format_exc()))   
 
+    def __CalcVolume( self ):
+        """
+        Calculate volume
+        """
+        referencePixels = self.confusionMatrix.sum( axis=1 )
+        targetPixels = self.confusionMatrix.sum( axis=0 )
+
+        for label in self.referenceLabels:
+            if targetPixels[label] == 0:
+                # Missing label in the target segmentation.
+                self.referenceMetrics.VOLUME[label].value = np.NAN
+                self.referenceMetrics.VOLUME_MAE[label].value = np.NAN
+
+                self.targetMetrics.VOLUME[label].value = np.NAN
+                self.targetMetrics.VOLUME_MAE[label].value = np.NAN
+
+                continue
+
+            referenceVolume = referencePixels[label] * self.pixelVolume * MM_TO_ML_FACTOR
+            targetVolume    = targetPixels[label] * self.pixelVolume * MM_TO_ML_FACTOR
+
+            absDifference = np.abs(referenceVolume - targetVolume)
+
+            self.referenceMetrics.VOLUME[label].value = referenceVolume
+            self.referenceMetrics.VOLUME_MAE[label].value = absDifference
 
-    def __CalcHD( self ):
+            self.targetMetrics.VOLUME[label].value = targetVolume
+            self.targetMetrics.VOLUME_MAE[label].value = absDifference
+
+
+    def __CalcDICE( self ):
         """
-        Calculate Hausdorff distance
+        Calculate DICE (and JACCARD, SENSITIVITY, PRECISION)
         """
-        hausdorffDistanceImage = sitk.HausdorffDistanceImageFilter()
+        truePositives = np.diag( self.confusionMatrix ).astype( np.float64 )
+
+        referencePixels = self.confusionMatrix.sum( axis=1 )
+        targetPixels = self.confusionMatrix.sum( axis=0 )
 
         for label in self.referenceLabels:
-            try:
-                hausdorffDistanceImage.Execute( self.referenceImageSegmentation == label, 
-                                                self.targetImageSegmentation == label )
-                
-                self.referenceMetrics.HD[label].value = hausdorffDistanceImage.GetHausdorffDistance()
-                self.targetMetrics.HD[label].value = hausdorffDistanceImage.GetHausdorffDistance()
+            dice = 2.0 * truePositives[label] / ( referencePixels[label] + targetPixels[label] )
+            jaccard = truePositives[label] / ( referencePixels[label] + targetPixels[label] - truePositives[label] )
+            sensitivity = truePositives[label] / referencePixels[label]
+            precision = truePositives[label] / targetPixels[label] if targetPixels[label] > 0 else np.NAN
 
-            except Exception as exception:
-                self.referenceMetrics.HD[label].value = np.NAN
-                self.targetMetrics.HD[label].value = np.NAN
-                
-                log.error("[AssessSegmentation::CalcHD Exception] %s" % str(exception))
-                log.error("[AssessSegmentation::CalcHD Exception] %s" % str(traceback.format_exc()))   
+            for metrics in (self.referenceMetrics, self.targetMetrics):
+                metrics.DICE[label].value = dice
+                metrics.JACCARD[label].value = jaccard
+                metrics.SENSITIVITY[label].value = sensitivity
+                metrics.PRECISION[label].value = precision
+
+
+    def __GetLabelRegion( self, label ):
+        """
+        Region of interest (index, size) of a label: union of the reference
+        and target bounding boxes, padded by ROI_MARGIN pixels and clipped
+        to the image grid. The margin keeps contours and outside distances
+        of the label identical to the ones of the full image.
+        """
+        imageSize = self.referenceImageSegmentation.GetSize()
+        dimension = len(imageSize)
+
+        lowerIndex = list(imageSize)
+        upperIndex = [0] * dimension
+
+        for boundingBoxes in (self.referenceBoundingBoxes, self.targetBoundingBoxes):
+            if boundingBoxes.get( label ) is None:
+                continue
+
+            boundingBox = boundingBoxes[ label ]   # (index..., size...)
+
+            for axis in range(dimension):
+                lowerIndex[axis] = min( lowerIndex[axis], boundingBox[axis] )
+                upperIndex[axis] = max( upperIndex[axis], boundingBox[axis] + boundingBox[dimension + axis] )
+
+        regionIndex = [ max( 0, lowerIndex[axis] - ROI_MARGIN ) for axis in range(dimension) ]
+        regionSize = [ min( imageSize[axis], upperIndex[axis] + ROI_MARGIN ) - regionIndex[axis] for axis in range(dimension) ]
+
+        return regionIndex, regionSize
+
+
+    def __GetReferenceRegion( self, label, referenceMaskArray, regionIndex, regionSize ):
+        """
+        Reference mask, slice distance map (see getSliceDistanceMap) and
+        contour of a label, on a region of interest (NumPy arrays, z-y-x
+        order). Precomputed reference data is used when available.
+        """
+        if self.precomputedReference is not None:
+            return self.precomputedReference.GetLabelRegion( label, regionIndex, regionSize )
+
+        referenceMaskArray = referenceMaskArray[ getRegionSlices(regionIndex, regionSize) ]
+
+        return referenceMaskArray, getSliceDistanceMap( referenceMaskArray ), getContourArray( referenceMaskArray )
+
+
+    def __CalcSliceMetrics( self ):
+        """
+        Calculate per-slice (2D) volume, DICE, HD and ASSD of each label
+        along the slice axis, with self.sliceJobs threads.
+        """
+        referenceArray = getImageArray( self.referenceImageSegmentation )
+        targetArray = getImageArray( self.targetImageSegmentation )
+
+        calcSlice = partial( self.__CalcSlice, referenceArray, targetArray )
+
+        if self.sliceJobs == 1:
+            slices = list( map(calcSlice, range(referenceArray.shape[0])) )
+
+        else:
+            with ThreadPoolExecutor( max_workers=self.sliceJobs ) as executor:
+                slices = list( executor.map(calcSlice, range(referenceArray.shape[0])) )
+
+        for sliceRecords in slices:
+            self.sliceMetrics.extend( sliceRecords )
+
+
+    def __CalcSlice( self, referenceArray, targetArray, sliceIndex ):
+        """
+        Metrics records of the labels of a slice. Slices with a label on
+        one side only are reported with their volumes, DICE = 0 and
+        undefined (NaN) distances.
+        """
+        referenceSlice = np.asarray( referenceArray[sliceIndex] )
+        targetSlice = np.asarray( targetArray[sliceIndex] )
+
+        spacing = self.referenceImageSegmentation.GetSpacing()[:2]
+
+        records = []
+
+        for label in LABEL:
+            referenceMaskArray = referenceSlice == label
+            targetMaskArray = targetSlice == label
+
+            referencePixels = int( np.count_nonzero(referenceMaskArray) )
+            targetPixels = int( np.count_nonzero(targetMaskArray) )
+
+            if (referencePixels == 0) and (targetPixels == 0):
+                continue
+
+            dice = 2.0 * np.count_nonzero( referenceMaskArray & targetMaskArray ) / ( referencePixels + targetPixels )
+
+            hausdorffDistance = np.NaN
+            assd = np.NaN
+
+            if (referencePixels > 0) and (targetPixels > 0):
+                region = getMaskRegionSlices( referenceMaskArray | targetMaskArray, ROI_MARGIN )
+
+                surfaceDistances = getSurfaceDistances( referenceMaskArray[region], targetMaskArray[region], spacing, self.surfaceEngine )
+
+                hausdorffDistance = surfaceDistances.GetHausdorffDistance()
+                ref2tarDistances, tar2refDistances = surfaceDistances.GetDirectedVoxelDistances()
+
+                assd = ( np.sum(ref2tarDistances, dtype=np.float64) + np.sum(tar2refDistances, dtype=np.float64) ) / \
+                       ( ref2tarDistances.size + tar2refDistances.size )
+
+            records.append( [ self.REFERENCE_SEGMENTATION_FILE_NAME,
+                              sliceIndex,
+                              LABEL[label],
+                              referencePixels * self.pixelVolume * MM_TO_ML_FACTOR,
+                              targetPixels * self.pixelVolume * MM_TO_ML_FACTOR,
+                              dice,
+                              hausdorffDistance,
+                              assd ] )
 
+        return records
 
-    def __CalcASSD( self ):
+
+    def GetSliceDataFrame( self ):
+        """
+        Return per-slice metrics as a DataFrame (empty without slice-wise
+        evaluation).
+        """
+        return pd.DataFrame( data=self.sliceMetrics, columns=SLICE_COLUMNS )
+
+
+    def __GetSparseSurfaceDistances( self, label, referenceArray ):
+        """
+        SparseSurfaceDistances of a small label, on its region of interest:
+        bounding boxes and masks are built from the label voxel lists (see
+        LabelVoxels), without full image masks or filters.
+        """
+        if self.precomputedReference is not None:
+            self.referenceBoundingBoxes[label] = self.precomputedReference.boundingBoxes[label]
+        else:
+            self.referenceBoundingBoxes[label] = self.referenceVoxels.GetBoundingBox( label )
+
+        self.targetBoundingBoxes[label] = self.targetVoxels.GetBoundingBox( label )
+
+        region = getRegionSlices( *self.__GetLabelRegion( label ) )
+
+        if self.referenceVoxels is not None:
+            referenceMaskArray = self.referenceVoxels.GetRegionMask( label, region )
+        else:
+            referenceMaskArray = np.asarray( referenceArray[region] ) == label
+
+        return SparseSurfaceDistances( referenceMaskArray,
+                                       self.targetVoxels.GetRegionMask( label, region ),
+                                       self.referenceImageSegmentation.GetSpacing() )
+
+
+    def __GetSurfaceDistances( self, label, referenceArray, targetArray ):
+        """
+        Surface distance engine of a label (see surfaceEngine), on the label
+        region of interest. Small labels (see SPARSE_LABEL_MAX_PIXELS) use
+        SparseSurfaceDistances.
         """
-        Calculate Average Symmetric Surface distance
+        if (self.targetVoxels is not None) and (label in self.targetVoxels.indices):
+            return self.__GetSparseSurfaceDistances( label, referenceArray )
+
+        # Full image masks give the label bounding boxes.
+        referenceMaskArray = None
+
+        if self.precomputedReference is not None:
+            self.referenceBoundingBoxes[label] = self.precomputedReference.boundingBoxes[label]
+
+        else:
+            referenceMaskArray = referenceArray == label
+            self.referenceBoundingBoxes[label] = getBoundingBox( referenceMaskArray )
+
+        targetMaskArray = targetArray == label
+        self.targetBoundingBoxes[label] = getBoundingBox( targetMaskArray )
+
+        regionIndex, regionSize = self.__GetLabelRegion( label )
+
+        if self.surfaceEngine == SURFACE_ENGINE_KDTREE:
+            region = getRegionSlices( regionIndex, regionSize )
+
+            return KDTreeSurfaceDistances( referenceArray[region] == label,
+                                           targetMaskArray[region],
+                                           self.referenceImageSegmentation.GetSpacing() )
+
+        referenceMaskArray, referenceSliceDistanceArray, referenceSurfaceArray = self.__GetReferenceRegion( label, referenceMaskArray, regionIndex, regionSize )
+
+        return DistanceMapSurfaceDistances( referenceMaskArray, referenceSliceDistanceArray, referenceSurfaceArray,
+                                            targetMaskArray[ getRegionSlices(regionIndex, regionSize) ],
+                                            self.referenceImageSegmentation.GetSpacing() )
+
+
+    def __CalcSurfaceDistances( self ):
+        """
+        Calculate Hausdorff distance and Average Symmetric Surface distance.
         DICE Must be calculated BEFORE HD and/or ASSD.
+
+        Masks, contours and one distance map per mask are built once per
+        label, on the label region of interest (see __GetLabelRegion). HD is
+        the largest outside distance of each mask to the other one (as
+        HausdorffDistanceImageFilter), in physical units. ASSD is the mean
+        distance of both contours to the other mask in voxel units (as
+        distance maps without image spacing). Directed distances in physical units
+        (reference -> target, target -> reference) give HD95 and are kept in
+        directedSurfaceDistances.
+
+        Labels missing from the target are short-circuited (NaN) before
+        any mask or filter is built.
         """
+        # ASSD is not calculated after the first label without overlap (DICE = 0).
+        calcASSD = True
+
+        referenceArray = getImageArray( self.referenceImageSegmentation )
+        targetArray = getImageArray( self.targetImageSegmentation )
+
+        referencePixels = self.confusionMatrix.sum( axis=1 )
+        targetPixels = self.confusionMatrix.sum( axis=0 )
+
+        sparseLabels = [ label for label in self.referenceLabels
+                         if (targetPixels[label] > 0) and (referencePixels[label] + targetPixels[label] <= SPARSE_LABEL_MAX_PIXELS) ]
+
+        if sparseLabels:
+            with self.__Stage( "LabelVoxels" ):
+                # Single scan of each label image for all the small labels.
+                self.targetVoxels = LabelVoxels( targetArray, sparseLabels )
+
+                if self.precomputedReference is None:
+                    self.referenceVoxels = LabelVoxels( referenceArray, sparseLabels )
+
         for label in self.referenceLabels:
-            try:
-                if self.referenceMetrics.DICE[label].value == 0.0: 
+            with self.__Stage( "SurfaceDistances", label ):
+                try:
+                    if targetPixels[label] == 0:
+                        # Missing label in the target: undefined distances (NaN), and DICE = 0 (see below).
+                        self.referenceMetrics.HD[label].value = np.NAN
+                        self.targetMetrics.HD[label].value = np.NAN
+
+                        if calcASSD:
+                            self.referenceMetrics.ASSD[label].value = np.NaN
+                            self.targetMetrics.ASSD[label].value = np.NaN
+
+                            self.referenceMetrics.DICE[label].value = np.NAN
+                            self.targetMetrics.DICE[label].value = np.NAN
+
+                            calcASSD = False
 
-                    self.referenceMetrics.ASSD[label].value = np.NaN
-                    self.targetMetrics.ASSD[label].value = np.NaN
+                        continue
+
+                    surfaceDistances = self.__GetSurfaceDistances( label, referenceArray, targetArray )
+
+                    if surfaceDistances.IsTargetEmpty():
+                        # Undefined distances: NaN, and DICE = 0 (see below).
+                        self.referenceMetrics.HD[label].value = np.NAN
+                        self.targetMetrics.HD[label].value = np.NAN
+
+                    else:
+                        hausdorffDistance = surfaceDistances.GetHausdorffDistance()
+
+                        self.referenceMetrics.HD[label].value = hausdorffDistance
+                        self.targetMetrics.HD[label].value = hausdorffDistance
+
+                    if not calcASSD:
+                        continue
+
+                    if self.referenceMetrics.DICE[label].value == 0.0: 
+
+                        self.referenceMetrics.ASSD[label].value = np.NaN
+                        self.targetMetrics.ASSD[label].value = np.NaN
                     
-                    self.referenceMetrics.DICE[label].value = np.NAN
-                    self.targetMetrics.DICE[label].value = np.NAN
+                        self.referenceMetrics.DICE[label].value = np.NAN
+                        self.targetMetrics.DICE[label].value = np.NAN
+
+                        calcASSD = False
+                        continue
+
+                    if surfaceDistances.IsTargetEmpty():
+                        continue
+
+                    # Symmetric surface distance measures (voxel units)
+                    ref2tarDistances, tar2refDistances = surfaceDistances.GetDirectedVoxelDistances()
+
+                    assd = ( np.sum(ref2tarDistances, dtype=np.float64) + np.sum(tar2refDistances, dtype=np.float64) ) / \
+                           ( ref2tarDistances.size + tar2refDistances.size )
+
+                    self.referenceMetrics.ASSD[label].value = assd
+                    self.targetMetrics.ASSD[label].value = assd
+
+                    ref2tarDistances, tar2refDistances = surfaceDistances.GetDirectedSurfaceDistances()
+
+                    self.directedSurfaceDistances[label] = ( ref2tarDistances, tar2refDistances )
+
+                    hd95 = max( float( np.percentile(ref2tarDistances, SURFACE_DISTANCE_PERCENTILE) ),
+                                float( np.percentile(tar2refDistances, SURFACE_DISTANCE_PERCENTILE) ) )
+
+                    self.referenceMetrics.HD95[label].value = hd95
+                    self.targetMetrics.HD95[label].value = hd95
+
+                except Exception as exception:
+                    self.referenceMetrics.HD[label].value = np.NAN
+                    self.targetMetrics.HD[label].value = np.NAN
+
+                    self.referenceMetrics.ASSD[label].value = np.NAN
+                    self.targetMetrics.ASSD[label].value = np.NAN
+                
+                    log.error("[AssessSegmentation::CalcSurfaceDistances Exception] %s" % str(exception))
+                    log.error("[AssessSegmentation::CalcSurfaceDistances Exception] %s" % str(traceback.format_exc()))   
+
+
+    def PrintSingleMetrics( self ):
+        """
+        Print metrics.
+        """
+        self.referenceMetrics.PrintSingleMetrics()
+        self.targetMetrics.PrintSingleMetrics()
+
+
+class Leaderboard( object ):
+    """
+    Assessment of several submissions (teams) against one reference set.
+    Each reference is loaded once and all the submitted targets are
+    assessed against it.
+    """
+    def __init__( self, inputFilePath, submissions, jobs=1, threadsPerJob=None, referenceStoreDir=None, memoryMap=False,
+                  surfaceEngine=SURFACE_ENGINE_DISTANCE_MAP ):
+        """
+        Default constructor.
+
+        inputFilePath      CSV file with a REFERENCE column.
+        submissions        { team : directory or CSV file }. Directory
+                           targets have the file name of their reference;
+                           CSV files have REFERENCE and TARGET columns
+                           (references matched by file name).
+        jobs               Number of worker processes (1 = sequential).
+        threadsPerJob      SimpleITK threads per worker process.
+        referenceStoreDir  Directory of precomputed reference data
+                           (see ReferenceStore, None = not used).
+        memoryMap          Memory-map uncompressed NIfTI files (see
+                           readLabelImage).
+        surfaceEngine      HD/ASSD engine (see AssessSegmentation).
+        """
+        self.FILE_PATH = None
+
+        self.jobs = max( 1, int(jobs) )
+        self.threadsPerJob = threadsPerJob
+        self.referenceStoreDir = referenceStoreDir
+        self.memoryMap = memoryMap
+        self.surfaceEngine = surfaceEngine
+
+        self.referenceFiles = []
+        self.submissions = dict( submissions )
+        self.targetFiles = {}       # { team : [ target file or None, ... ] }
+
+        self.results = {}           # { team : AssessSegmentations }
+        self.missingCases = {}      # { team : number of references without target }
+
+        if verifyFile( inputFilePath ):
+            self.FILE_PATH = inputFilePath
+            self.__Load()
+        else:
+            print("[Leaderboard] File does not exist!")
+
+
+    def __str__( self ):
+        """
+        Default String obj.
+        """
+        leaderboardStr = "\n[Leaderboard]\n\n"
+        leaderboardStr += "Input file: \n\t%s\n\n" % self.FILE_PATH
+        leaderboardStr += "References: %d\n\n" % len(self.referenceFiles)
+        leaderboardStr += "Submissions (TEAM : targets found) : \n"
+
+        for team in self.submissions:
+            targetFiles = self.targetFiles.get( team, [] )
+            leaderboardStr += "\t%s : %d\n" % ( team, sum( targetFile is not None for targetFile in targetFiles ) )
+
+        return leaderboardStr
+
+
+    def __Load( self ):
+        """
+        Load the reference list and match the targets of each submission.
+        """
+        try:
+            referenceFiles = pd.read_csv( self.FILE_PATH, sep="," )["REFERENCE"].drop_duplicates()
+
+            for referenceFile in referenceFiles:
+                if verifyFile( referenceFile ):
+                    self.referenceFiles.append( referenceFile )
+                else:
+                    print("[Leaderboard::Load Warning] %s  File does not exist!" % referenceFile)
+
+            for team, submission in self.submissions.items():
+                self.targetFiles[team] = self.__MatchTargets( submission )
+
+        except Exception as exception:
+            log.error("[Leaderboard::Load Exception] %s" % str(exception))
+            log.error("[Leaderboard::Load Exception] %s" % str(traceback.format_exc()))
+
+
+    def __MatchTargets( self, submission ):
+        """
+        Return the target file of each reference (None if missing).
+        """
+        if os.path.isdir( submission ):
+            targets = { fileName: os.path.join(submission, fileName) for fileName in os.listdir(submission) }
+
+        else:
+            segmentationsData = pd.read_csv( submission, sep="," )
+            targets = { os.path.basename(reference): target for reference, target in zip( segmentationsData["REFERENCE"],
+                                                                                           segmentationsData["TARGET"] ) }
+
+        targetFiles = []
+
+        for referenceFile in self.referenceFiles:
+            targetFile = targets.get( os.path.basename(referenceFile) )
+
+            if (targetFile is not None) and not verifyFile( targetFile ):
+                targetFile = None
+
+            targetFiles.append( targetFile )
+
+        return targetFiles
+
+
+    def Compute( self ):
+        """
+        Calculate metrics of every submission, one reference at a time.
+        """
+        if not self.referenceFiles:
+            print("[Leaderboard::Compute] Finished!")
+            return
+
+        print("[Leaderboard::Compute] Executing ...")
+
+        teams = list( self.submissions )
+        targetFiles = [ [ self.targetFiles[team][index] for team in teams ] for index in range(len(self.referenceFiles)) ]
+
+        assess = partial( computeReferenceAssessments,
+                          referenceStoreDir=self.referenceStoreDir,
+                          memoryMap=self.memoryMap,
+                          surfaceEngine=self.surfaceEngine )
+
+        metrics = list( mapInWorkers( assess, self.jobs, self.threadsPerJob, self.referenceFiles, targetFiles ) )
+
+        for teamIndex, team in enumerate(teams):
+            assessments = []
+
+            for referenceFile, caseTargets, caseMetrics in zip( self.referenceFiles, targetFiles, metrics ):
+                if caseMetrics[teamIndex] is None:
+                    continue
+
+                assessments.append( AssessmentResult( referenceFile,
+                                                      caseTargets[teamIndex],
+                                                      caseMetrics[teamIndex][0],
+                                                      caseMetrics[teamIndex][1] ) )
+
+            self.results[team] = AssessSegmentations( None )
+            self.results[team].SetAssessments( assessments )
+            self.missingCases[team] = len(self.referenceFiles) - len(assessments)
+
+        print("[Leaderboard::Compute] Finished!")
+
+
+    def ComputeConfidenceIntervals( self, resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE, seed=None ):
+        """
+        Bootstrap confidence intervals of the overall metrics of each team
+        (see AssessSegmentations.ComputeConfidenceIntervals).
+        """
+        for results in self.results.values():
+            results.ComputeConfidenceIntervals( resamples, confidence, seed )
+
+
+    def GetRankingDataFrame( self ):
+        """
+        Return the ranking table: overall target metrics of each team
+        (per label, see RANKING_METRICS), their ranks among teams and the
+        mean rank. Missing values rank last. Confidence intervals are
+        added after ComputeConfidenceIntervals() (not used for ranking).
+        """
+        data = []
+        metricColumns = []
+
+        for labelName in LABEL.values():
+            for rankingMetric in RANKING_METRICS:
+                metricColumns.append( ( "%s %s" % (labelName, rankingMetric[0]), rankingMetric[1] ) )
+
+        valueColumns = [ column for column, _ in metricColumns ]
+
+        if any( (results.results is not None) and (results.results.confidenceIntervals is not None) for results in self.results.values() ):
+            valueColumns = [ name for column in valueColumns for name in [ column ] + [ column + " " + ciColumn for ciColumn in CI_COLUMNS ] ]
+
+        for team, results in self.results.items():
+            wideDataFrame = results.GetDataFrame( layout="wide" )
+            targetRow = wideDataFrame.loc[ wideDataFrame["SEGMENTATION ID"] == "TARGET AVG" ].iloc[0]
+
+            row = [ team, len(results.assessments), self.missingCases[team] ]
+            row += [ targetRow.get( column, np.NaN ) for column in valueColumns ]
+            data.append( row )
+
+        dataFrame = pd.DataFrame( data=data, columns=[ "TEAM", "CASES", "MISSING" ] + valueColumns )
+
+        ranks = pd.DataFrame( { column: dataFrame[column].rank( ascending=ascending, method="min", na_option="bottom" )
+                                for column, ascending in metricColumns } )
+
+        dataFrame["MEAN RANK"] = ranks.mean( axis=1 )
+        dataFrame["RANK"] = dataFrame["MEAN RANK"].rank( method="min" ).astype( int )
+
+        return dataFrame.sort_values( "RANK", kind="stable" ).reset_index( drop=True )
+
+
+    def ToCSV( self, outputDir ):
+        """
+        Export the results of each team (<TEAM>.csv) and the ranking table
+        (Ranking.csv) to a directory.
+        """
+        try:
+            os.makedirs( outputDir, exist_ok=True )
+
+            for team, results in self.results.items():
+                results.ToCSV( os.path.join(outputDir, "%s.csv" % team) )
+
+            self.GetRankingDataFrame().to_csv( os.path.join(outputDir, "Ranking.csv"), index = None, header=True, sep="," )
+            print("[Leaderboard::ToCSV] Ranking to CSV file done!")
+
+        except Exception as exception:
+            log.error("[Leaderboard::ToCSV Exception] %s" % str(exception))
+            log.error("[Leaderboard::ToCSV Exception] %s" % str(traceback.format_exc()))
+
+
+class SegmentationsCRPS( object ):
+    """
+    Fused segmentation to CRPS pipeline: reference volumes of each label
+    are computed from the segmentations of a manifest and CDF submissions
+    (keyed by case ID and label, see VolumesCDF) are scored against them
+    in the same run, without intermediate files.
+
+    The case ID of a segmentation is its file name without extension
+    (e.g. 000_D8 for 000_D8.nii.gz). Without a submission, the CDF of the
+    TARGET volume of each case (VolumesCDF.GetDummyCDF) is scored.
+    """
+    def __init__( self, inputFilePath, cdfFilePath=None, jobs=1, referenceStoreDir=None, memoryMap=False ):
+        """
+        Default constructor.
+
+        inputFilePath      CSV file with a REFERENCE column (and TARGET,
+                           used without submission).
+        cdfFilePath        Submission: ID, LABEL, P0, P1, ... P599 (.csv)
+                           or ID, LABEL and P arrays (.npz). LABEL is a
+                           label name (LV, MYO, MI, MVO) or value.
+        jobs               Number of worker processes (1 = sequential).
+        referenceStoreDir  Directory of precomputed reference data
+                           (see ReferenceStore, None = not used): volumes
+                           are read from the store without the image.
+        memoryMap          Memory-map uncompressed NIfTI (.nii) files.
+        """
+        self.FILE_PATH = None
+
+        self.jobs = max( 1, int(jobs) )
+        self.referenceStoreDir = referenceStoreDir
+        self.memoryMap = memoryMap
+
+        self.caseIDs = []
+        self.referenceFiles = []
+        self.targetFiles = []
+
+        self.volumesCDF = None
+        self.labelsCRPS = None      # [ LABEL, CASES, MISSING, CRPS ] (see CRPS_COLUMNS)
+        self.casesCRPS = None       # [ ID, LABEL, VOLUME, CRPS ] (see CRPS_CASE_COLUMNS)
+
+        if verifyFile( inputFilePath ):
+            self.FILE_PATH = inputFilePath
+            self.__Load( cdfFilePath )
+        else:
+            print("[SegmentationsCRPS] File does not exist!")
+
+
+    def __str__( self ):
+        """
+        Default String obj.
+        """
+        segmentationsCRPSStr = "\n[SegmentationsCRPS]\n\n"
+        segmentationsCRPSStr += "Input file: \n\t%s\n\n" % self.FILE_PATH
+
+        if self.volumesCDF is not None:
+            segmentationsCRPSStr += "Submission: \n\t%s\n\n" % self.volumesCDF.FILE_PATH
+        else:
+            segmentationsCRPSStr += "Submission: \n\tTarget volumes\n\n"
+
+        segmentationsCRPSStr += "Total: %d cases.\n\n" % len(self.caseIDs)
+
+        return segmentationsCRPSStr
+
+
+    def __Load( self, cdfFilePath ):
+        """
+        Load the case list and the submission.
+        """
+        try:
+            segmentationsData = pd.read_csv( self.FILE_PATH, sep="," )
+
+            if "TARGET" not in segmentationsData:
+                segmentationsData["TARGET"] = None
+
+            for referenceFile, targetFile in zip( segmentationsData["REFERENCE"], segmentationsData["TARGET"] ):
+                if not verifyFile( referenceFile ):
+                    print("[SegmentationsCRPS::Load Warning] %s  File does not exist!" % referenceFile)
+                    continue
+
+                caseID = Path( referenceFile ).with_suffix('').stem
+
+                if caseID in self.caseIDs:
+                    print("[SegmentationsCRPS::Load Warning] %s  Duplicated case ID!" % caseID)
+                    continue
+
+                self.caseIDs.append( caseID )
+                self.referenceFiles.append( referenceFile )
+                self.targetFiles.append( targetFile if isinstance( targetFile, str ) else None )
+
+            if cdfFilePath is not None:
+                self.volumesCDF = VolumesCDF( cdfFilePath )
+
+                if self.volumesCDF.cdfs is None:
+                    raise VolumesCDFException( "%s: CDF file not loaded." % cdfFilePath )
+
+                if self.volumesCDF.labelList is None:
+                    raise VolumesCDFException( "%s: ID, LABEL, P0, P1, ... submission expected." % cdfFilePath )
+
+        except Exception as exception:
+            self.volumesCDF = None
+
+            log.error("[SegmentationsCRPS::Load Exception] %s" % str(exception))
+            log.error("[SegmentationsCRPS::Load Exception] %s" % str(traceback.format_exc()))
+
+
+    def __ComputeVolumes( self, segFilePaths, referenceStoreDir=None ):
+        """
+        Return the label volumes (in mL) of segmentations, (cases x labels)
+        array, NaN rows for missing or unreadable files.
+        """
+        compute = partial( computeLabelVolumes, referenceStoreDir=referenceStoreDir, memoryMap=self.memoryMap )
+
+        volumes = list( mapInWorkers( compute, self.jobs, 1, segFilePaths ) )
+
+        return np.array( volumes, dtype=np.float64 ).reshape( len(segFilePaths), len(LABEL) )
+
+
+    def __GetSubmissionRows( self ):
+        """
+        Return the submission row of each case and label, (cases x labels)
+        array, -1 when missing.
+        """
+        labelIndices = { }
+
+        for labelIndex, label in enumerate(LABEL):
+            labelIndices[LABEL[label]] = labelIndex
+            labelIndices[str(label)] = labelIndex
+
+        caseIndices = { caseID: caseIndex for caseIndex, caseID in enumerate(self.caseIDs) }
+
+        rows = np.full( (len(self.caseIDs), len(LABEL)), -1, dtype=np.intp )
+
+        unknownRows = 0
+
+        for row, (caseID, label) in enumerate( zip(self.volumesCDF.volumeList, self.volumesCDF.labelList) ):
+            caseIndex = caseIndices.get( caseID )
+            labelIndex = labelIndices.get( label.upper() )
+
+            if (caseIndex is None) or (labelIndex is None):
+                unknownRows += 1
+                continue
+
+            if rows[caseIndex, labelIndex] >= 0:
+                print("[SegmentationsCRPS::Compute Warning] %s %s  Duplicated row, first one used!" % (caseID, label))
+                continue
+
+            rows[caseIndex, labelIndex] = row
+
+        if unknownRows > 0:
+            print("[SegmentationsCRPS::Compute Warning] %d submission rows of unknown cases or labels ignored." % unknownRows)
+
+        return rows
+
+
+    def Compute( self ):
+        """
+        Calculate reference volumes and the CRPS of each label, and of all
+        labels (ALL).
+        """
+        if not self.caseIDs:
+            print("[SegmentationsCRPS::Compute] Finished!")
+            return
+
+        print("[SegmentationsCRPS::Compute] Executing ...")
+
+        try:
+            referenceVolumes = self.__ComputeVolumes( self.referenceFiles, self.referenceStoreDir )
+
+            if self.volumesCDF is not None:
+                submissionRows = self.__GetSubmissionRows()
+
+            else:
+                # Baseline: step CDFs of the target volumes.
+                targetFiles = [ targetFile if (targetFile is not None) and verifyFile( targetFile ) else None
+                                for targetFile in self.targetFiles ]
+                targetVolumes = self.__ComputeVolumes( targetFiles )
+
+            self.labelsCRPS = []
+            self.casesCRPS = []
+
+            totalSum = 0.0
+            totalCases = 0
+            totalMissing = 0
+
+            for labelIndex, label in enumerate(LABEL):
+                volumes = referenceVolumes[:, labelIndex]
+
+                if self.volumesCDF is not None:
+                    scored = ( submissionRows[:, labelIndex] >= 0 ) & ~np.isnan( volumes )
+                    nSum, corruptedRow = calcCRPSSums( volumes[scored], self.volumesCDF.cdfs, submissionRows[scored, labelIndex] )
+
+                    if corruptedRow is not None:
+                        raise VolumesCDFException( "The row %d has a corrupted element!" % corruptedRow )
+
+                else:
+                    scored = ~np.isnan( targetVolumes[:, labelIndex] ) & ~np.isnan( volumes )
+                    cdfs = np.array( [ VolumesCDF.GetDummyCDF( volume ) for volume in targetVolumes[scored, labelIndex] ] ).reshape( -1, MAX_VOLUME )
+                    nSum, _ = calcCRPSSums( volumes[scored], cdfs )
+
+                numberOfCases = int( scored.sum() )
+                numberOfMissing = len(self.caseIDs) - numberOfCases
+
+                for caseIndex, caseSum in zip( np.flatnonzero(scored), nSum ):
+                    self.casesCRPS.append( [ self.caseIDs[caseIndex], LABEL[label], volumes[caseIndex], caseSum / MAX_VOLUME ] )
+
+                crps = nSum.sum() / (MAX_VOLUME * numberOfCases) if numberOfCases > 0 else np.NaN
+                self.labelsCRPS.append( [ LABEL[label], numberOfCases, numberOfMissing, crps ] )
+
+                totalSum += nSum.sum()
+                totalCases += numberOfCases
+                totalMissing += numberOfMissing
+
+            crps = totalSum / (MAX_VOLUME * totalCases) if totalCases > 0 else np.NaN
+            self.labelsCRPS.append( [ "ALL", totalCases, totalMissing, crps ] )
+
+        except Exception as exception:
+            self.labelsCRPS = None
+            self.casesCRPS = None
+
+            log.error("[SegmentationsCRPS::Compute Exception] %s" % str(exception))
+            log.error("[SegmentationsCRPS::Compute Exception] %s" % str(traceback.format_exc()))
+
+        print("[SegmentationsCRPS::Compute] Finished!")
+
+
+    def GetDataFrame( self ):
+        """
+        Return the CRPS of each label and of all labels (see CRPS_COLUMNS),
+        rounded to ROUND_DECIMALS.
+        """
+        dataFrame = pd.DataFrame( data=self.labelsCRPS or [], columns=CRPS_COLUMNS )
+        dataFrame["CRPS"] = dataFrame["CRPS"].astype( np.float64 ).round( ROUND_DECIMALS )
+
+        return dataFrame
+
+
+    def GetCasesDataFrame( self ):
+        """
+        Return the reference volume and CRPS of each scored case and label
+        (see CRPS_CASE_COLUMNS).
+        """
+        return pd.DataFrame( data=self.casesCRPS or [], columns=CRPS_CASE_COLUMNS )
+
+
+    def ToCSV( self, filePath, casesFilePath=None ):
+        """
+        Export the CRPS of each label (and of each case, if casesFilePath
+        is given) to CSV files.
+        """
+        try:
+            self.GetDataFrame().to_csv( filePath, index = None, header=True, sep="," )
+
+            if casesFilePath is not None:
+                self.GetCasesDataFrame().to_csv( casesFilePath, index = None, header=True, sep="," )
+
+            print("[SegmentationsCRPS::ToCSV] CRPS to CSV file done!")
+
+        except Exception as exception:
+            log.error("[SegmentationsCRPS::ToCSV Exception] %s" % str(exception))
+            log.error("[SegmentationsCRPS::ToCSV Exception] %s" % str(traceback.format_exc()))
+
+
+class EvaluationService( object ):
+    """
+    Long-lived evaluation service (see aseg_server.py): reference images
+    (or their precomputed data) are kept in memory between jobs, and the
+    cases of all jobs are assessed by a shared pool of threads.
+    """
+    def __init__( self, jobs=1, referenceStoreDir=None, memoryMap=False, surfaceEngine=SURFACE_ENGINE_DISTANCE_MAP,
+                  maxReferences=SERVICE_MAX_REFERENCES ):
+        """
+        Default constructor.
+
+        jobs               Number of threads assessing cases (all jobs).
+        referenceStoreDir  Directory of precomputed reference data
+                           (see ReferenceStore, None = not used).
+        memoryMap          Memory-map uncompressed NIfTI files.
+        surfaceEngine      HD/ASSD engine (see AssessSegmentation).
+        maxReferences      Reference images kept in memory (least
+                           recently used are released).
+        """
+        self.jobs = max( 1, int(jobs) )
+
+        self.referenceStore = None
+
+        if referenceStoreDir is not None:
+            self.referenceStore = ReferenceStore( referenceStoreDir )
+
+        self.memoryMap = memoryMap
+        self.surfaceEngine = surfaceEngine
+        self.maxReferences = max( 1, int(maxReferences) )
+
+        self.references = OrderedDict()     # { file path : (modification time, image) }
+        self.lock = threading.Lock()
+
+        self.activeJobs = 0
+        self.completedJobs = 0
+        self.assessedCases = 0
+
+        self.executor = ThreadPoolExecutor( max_workers=self.jobs )
+
+
+    def LoadReferences( self, referenceFiles ):
+        """
+        Load reference images in advance (e.g. the reference set).
+        """
+        for referenceFile in referenceFiles:
+            if verifyFile( referenceFile ):
+                self.GetReference( referenceFile )
+
+
+    def GetReference( self, refSegFilePath ):
+        """
+        Return the in-memory reference image of a file (loaded when missing
+        or modified), None when the reference is in the store.
+        """
+        if (self.referenceStore is not None) and self.referenceStore.Has( refSegFilePath ):
+            return None
+
+        modificationTime = os.stat( refSegFilePath ).st_mtime_ns
+
+        with self.lock:
+            reference = self.references.get( refSegFilePath )
+
+            if (reference is not None) and (reference[0] == modificationTime):
+                self.references.move_to_end( refSegFilePath )
+                return reference[1]
+
+        image = readLabelImage( refSegFilePath, self.memoryMap )
+
+        with self.lock:
+            self.references[refSegFilePath] = ( modificationTime, image )
+            self.references.move_to_end( refSegFilePath )
+
+            while len(self.references) > self.maxReferences:
+                self.references.popitem( last=False )
+
+        return image
+
+
+    def __AssessPair( self, refSegFilePath, tarSegFilePath ):
+        """
+        Assess a (reference, target) pair with the in-memory reference:
+        (referenceMetrics, targetMetrics).
+        """
+        referenceImage = None
+
+        try:
+            referenceImage = self.GetReference( refSegFilePath )
+
+        except Exception as exception:
+            log.error("[EvaluationService::AssessPair Exception] %s" % str(exception))
+            log.error("[EvaluationService::AssessPair Exception] %s" % str(traceback.format_exc()))
+
+        aseg = AssessSegmentation( refSegFilePath, tarSegFilePath, self.referenceStore,
+                                   referenceImage=referenceImage,
+                                   memoryMap=self.memoryMap,
+                                   surfaceEngine=self.surfaceEngine )
+        aseg.Compute()
+
+        return aseg.referenceMetrics, aseg.targetMetrics
+
+
+    def Assess( self, pairs ):
+        """
+        Assess a job: list of (reference, target) file paths. Return an
+        AssessSegmentations object with the assessments (input order,
+        missing files skipped) and overall statistics.
+        """
+        with self.lock:
+            self.activeJobs += 1
+
+        try:
+            assessmentPlan = []
+
+            for row, pair in enumerate( pairs ):
+                if verifyFile( pair[0] ) and verifyFile( pair[1] ):
+                    assessmentPlan.append( (pair[0], pair[1], row) )
+                else:
+                    print("[EvaluationService::Assess Warning] %s  <- %s  File does not exist!" % (pair[0], pair[1]) )
+
+            futures = [ self.executor.submit( self.__AssessPair, segmentation[0], segmentation[1] ) for segmentation in assessmentPlan ]
+
+            aSegmentations = AssessSegmentations( None )
+            aSegmentations.NUM_SEGMENTATIONS = len(assessmentPlan)
+            aSegmentations.SetAssessments( [ AssessmentResult( segmentation[0],
+                                                               segmentation[1],
+                                                               *future.result(),
+                                                               segmentation[2] ) for segmentation, future in zip( assessmentPlan, futures ) ] )
+
+            with self.lock:
+                self.completedJobs += 1
+                self.assessedCases += len(assessmentPlan)
+
+            return aSegmentations
+
+        finally:
+            with self.lock:
+                self.activeJobs -= 1
+
+
+    def GetStatus( self ):
+        """
+        Return the service status (dict).
+        """
+        with self.lock:
+            return { "jobs": self.jobs,
+                     "active jobs": self.activeJobs,
+                     "completed jobs": self.completedJobs,
+                     "assessed cases": self.assessedCases,
+                     "references": len(self.references),
+                     "metrics version": METRICS_VERSION }
+
+
+    def Shutdown( self ):
+        """
+        Wait for running cases and stop the pool of threads.
+        """
+        self.executor.shutdown( wait=True )
+
+
+class AssessmentResult( object ):
+    """
+    Metrics of an assessed (reference, target) pair, without images.
+    """
+    def __init__( self, refSegFilePath, tarSegFilePath, referenceMetrics, targetMetrics, row=None ):
+        """
+        Default constructor (row: input file row).
+        """
+        self.REFERENCE_SEGMENTATION_FILE_PATH = refSegFilePath
+        self.TARGET_SEGMENTATION_FILE_PATH = tarSegFilePath
+
+        self.row = row
+
+        self.referenceMetrics = referenceMetrics
+        self.targetMetrics = targetMetrics
+
+
+class ResultsCache( object ):
+    """
+    On-disk cache of per-case metrics. Entries are keyed by a content hash
+    of the reference and target files plus the metric settings, and are
+    evicted in least recently used order beyond the size cap. Failed
+    assessments (no metric values) are not stored, and unreadable entries
+    are removed and computed again.
+    """
+    def __init__( self, cacheDir, maxSize=CACHE_MAX_SIZE ):
+        """
+        Default constructor.
+        """
+        self.CACHE_DIR = cacheDir
+        self.maxSize = maxSize
+
+        self.fileHashes = {}
+
+        os.makedirs( self.CACHE_DIR, exist_ok=True )
+
+
+    def __str__( self ):
+        """
+        Default String obj.
+        """
+        resultsCacheStr = "\n[ResultsCache]\n\n"
+        resultsCacheStr += "Cache directory: \n\t%s\n\n" % self.CACHE_DIR
+        resultsCacheStr += "Entries: %d (%d bytes, max. %d bytes)\n\n" % ( len(self.__GetEntries()),
+                                                                          self.GetSize(),
+                                                                          self.maxSize )
+        return resultsCacheStr
+
+
+    def __HashFile( self, filePath ):
+        """
+        SHA-256 of a file content. Hashes are computed once per file.
+        """
+        if filePath not in self.fileHashes:
+            self.fileHashes[filePath] = hashFile( filePath )
+
+        return self.fileHashes[filePath]
+
+
+    def GetKey( self, refSegFilePath, tarSegFilePath, sliceWise=False, surfaceEngine=SURFACE_ENGINE_DISTANCE_MAP ):
+        """
+        Return the cache key of a (reference, target) pair and metric
+        settings (slice-wise evaluation, surface distance engine).
+        """
+        settings = repr( (METRICS_VERSION, sorted(LABEL.items()), MM_TO_ML_FACTOR, sliceWise, surfaceEngine) )
+
+        key = hashlib.sha256()
+        key.update( self.__HashFile(refSegFilePath).encode() )
+        key.update( self.__HashFile(tarSegFilePath).encode() )
+        key.update( settings.encode() )
+
+        return key.hexdigest()
+
+
+    def __GetEntryPath( self, key ):
+        """
+        Return the file path of a cache entry.
+        """
+        return os.path.join( self.CACHE_DIR, key + ".pkl" )
+
+
+    def __GetEntries( self ):
+        """
+        Return the cache entries (os.DirEntry).
+        """
+        return [ entry for entry in os.scandir(self.CACHE_DIR) if entry.is_file() and entry.name.endswith(".pkl") ]
+
+
+    def GetSize( self ):
+        """
+        Return the cache size (in bytes).
+        """
+        return sum( entry.stat().st_size for entry in self.__GetEntries() )
+
+
+    def __HasValues( self, metrics ):
+        """
+        True if metrics (referenceMetrics, targetMetrics) hold at least one
+        table metric value, i.e. the assessment did not fail.
+        """
+        if (metrics is None) or any( caseMetrics is None for caseMetrics in metrics ):
+            return False
+
+        return any( np.isfinite( getattr(caseMetrics, tableMetric[1])[label].value )
+                    for caseMetrics in metrics for tableMetric in TABLE_METRICS for label in LABEL )
+
+
+    def Get( self, key, refSegFilePath, tarSegFilePath ):
+        """
+        Return cached results (referenceMetrics, targetMetrics, slice
+        records or None when not slice-wise), None if missing. Segmentation
+        names follow the given file paths. Unreadable entries are removed
+        (None: the case is computed again).
+        """
+        entryPath = self.__GetEntryPath( key )
+
+        try:
+            with open( entryPath, "rb" ) as entryFile:
+                entry = pickle.load( entryFile )
+
+            referenceMetrics, targetMetrics = entry[:2]
+            sliceMetrics = entry[2] if len(entry) > 2 else None
+
+            if not self.__HasValues( (referenceMetrics, targetMetrics) ):
+                raise ValueError( "Entry %s has no metric values" % key )
+
+        except FileNotFoundError:
+            return None
+
+        except Exception as exception:
+            log.error("[ResultsCache::Get Exception] %s" % str(exception))
+
+            try:
+                os.remove( entryPath )
+
+            except OSError:
+                pass
+
+            return None
+
+        # Access time for the eviction policy.
+        os.utime( entryPath )
+
+        referenceMetrics.segmentationName = "r_" + str(Path(refSegFilePath).with_suffix('').stem)
+        targetMetrics.segmentationName = "t_" + str(Path(tarSegFilePath).with_suffix('').stem)
+
+        if sliceMetrics is not None:
+            sliceMetrics = [ [ referenceMetrics.segmentationName ] + list(record[1:]) for record in sliceMetrics ]
+
+        return referenceMetrics, targetMetrics, sliceMetrics
+
+
+    def Put( self, key, metrics, sliceMetrics=None ):
+        """
+        Store metrics (referenceMetrics, targetMetrics) and the slice
+        records of a slice-wise evaluation. Failed assessments are not
+        stored.
+        """
+        if not self.__HasValues( metrics ):
+            return
+
+        entryPath = self.__GetEntryPath( key )
+        temporaryPath = "%s.%d.tmp" % (entryPath, os.getpid())
+
+        try:
+            with open( temporaryPath, "wb" ) as entryFile:
+                pickle.dump( tuple(metrics) + (sliceMetrics,), entryFile, protocol=pickle.HIGHEST_PROTOCOL )
+
+            os.replace( temporaryPath, entryPath )
+
+        except Exception as exception:
+            log.error("[ResultsCache::Put Exception] %s" % str(exception))
+            log.error("[ResultsCache::Put Exception] %s" % str(traceback.format_exc()))
+
+
+    def Evict( self ):
+        """
+        Remove least recently used entries until the cache fits maxSize.
+        """
+        entries = [ (entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in self.__GetEntries() ]
+        cacheSize = sum( entry[1] for entry in entries )
+
+        for accessTime, entrySize, entryPath in sorted(entries):
+            if cacheSize <= self.maxSize:
+                break
+
+            try:
+                os.remove( entryPath )
+                cacheSize -= entrySize
+
+            except OSError:
+                pass
+
+
+class ReferenceStore( object ):
+    """
+    On-disk store of precomputed reference data. Each reference
+    segmentation (keyed by its content hash) has a directory with:
+
+        header.json       spacing, origin, direction, labels, number of
+                          pixels and bounding box of each label
+        labels.npy        label image (UInt16, z-y-x order)
+        slice_distance_<L>.npy  slice distance map of label L (see
+                          getSliceDistanceMap, Float32)
+        surface_<L>.npy   contour pixel indices of label L (z, y, x)
+
+    Arrays are memory-mapped when loaded.
+    """
+    def __init__( self, storeDir ):
+        """
+        Default constructor.
+        """
+        self.STORE_DIR = storeDir
+
+        self.fileHashes = {}
+
+        os.makedirs( self.STORE_DIR, exist_ok=True )
+
+
+    def __str__( self ):
+        """
+        Default String obj.
+        """
+        referenceStoreStr = "\n[ReferenceStore]\n\n"
+        referenceStoreStr += "Store directory: \n\t%s\n\n" % self.STORE_DIR
+
+        return referenceStoreStr
+
+
+    def __GetEntryDir( self, refSegFilePath ):
+        """
+        Return the directory of a reference segmentation.
+        """
+        if refSegFilePath not in self.fileHashes:
+            self.fileHashes[refSegFilePath] = hashFile( refSegFilePath )
+
+        key = hashlib.sha256( (self.fileHashes[refSegFilePath] + METRICS_VERSION + REFERENCE_STORE_VERSION).encode() ).hexdigest()
+
+        return os.path.join( self.STORE_DIR, key )
+
+
+    def Has( self, refSegFilePath ):
+        """
+        Return True if the reference segmentation has been precomputed.
+        """
+        return os.path.isfile( os.path.join(self.__GetEntryDir(refSegFilePath), "header.json") )
+
+
+    def Precompute( self, refSegFilePath ):
+        """
+        Compute and save the data of a reference segmentation.
+        Return True on success.
+        """
+        entryDir = self.__GetEntryDir( refSegFilePath )
+        temporaryDir = "%s.%d.tmp" % (entryDir, os.getpid())
+
+        try:
+            referenceImageSegmentation = sitk.Cast( sitk.ReadImage(refSegFilePath), sitk.sitkUInt16 )
+            referenceArray = sitk.GetArrayViewFromImage( referenceImageSegmentation )
+
+            labelPixels = np.bincount( referenceArray.ravel() )
+
+            numberOfPixels = {}
+            boundingBoxes = {}
+
+            for label in LABEL:
+                if (label < labelPixels.size) and (labelPixels[label] > 0):
+                    numberOfPixels[label] = int( labelPixels[label] )
+                    boundingBoxes[label] = getBoundingBox( referenceArray == label )
+
+            os.makedirs( temporaryDir, exist_ok=True )
+
+            np.save( os.path.join(temporaryDir, "labels.npy"), referenceArray )
+
+            for label in numberOfPixels:
+                referenceMaskArray = referenceArray == label
+
+                np.save( os.path.join(temporaryDir, "slice_distance_%d.npy" % label), getSliceDistanceMap(referenceMaskArray) )
+                np.save( os.path.join(temporaryDir, "surface_%d.npy" % label),
+                         np.argwhere( getContourArray(referenceMaskArray) ).astype(np.int32) )
+
+            header = { "file":refSegFilePath,
+                       "spacing":referenceImageSegmentation.GetSpacing(),
+                       "origin":referenceImageSegmentation.GetOrigin(),
+                       "direction":referenceImageSegmentation.GetDirection(),
+                       "labels":list(numberOfPixels),
+                       "numberOfPixels":{ str(label):int(numberOfPixels[label]) for label in numberOfPixels },
+                       "boundingBoxes":{ str(label):[ int(value) for value in boundingBoxes[label] ] for label in boundingBoxes } }
+
+            # Written last: an entry is complete once header.json exists.
+            with open( os.path.join(temporaryDir, "header.json"), "w" ) as headerFile:
+                json.dump( header, headerFile, indent=2 )
+
+            if os.path.isdir( entryDir ):
+                shutil.rmtree( entryDir )
+
+            os.replace( temporaryDir, entryDir )
+
+            return True
+
+        except Exception as exception:
+            log.error("[ReferenceStore::Precompute Exception] %s" % str(exception))
+            log.error("[ReferenceStore::Precompute Exception] %s" % str(traceback.format_exc()))
+
+            shutil.rmtree( temporaryDir, ignore_errors=True )
+
+            return False
+
+
+    def Load( self, refSegFilePath ):
+        """
+        Return the PrecomputedReference of a reference segmentation.
+        """
+        return PrecomputedReference( self.__GetEntryDir(refSegFilePath) )
+
+
+class PrecomputedReference( object ):
+    """
+    Precomputed data of a reference segmentation (see ReferenceStore).
+    """
+    def __init__( self, entryDir ):
+        """
+        Default constructor.
+        """
+        self.ENTRY_DIR = entryDir
+
+        with open( os.path.join(self.ENTRY_DIR, "header.json"), "r" ) as headerFile:
+            header = json.load( headerFile )
+
+        self.spacing = tuple( header["spacing"] )
+        self.origin = tuple( header["origin"] )
+        self.direction = tuple( header["direction"] )
+
+        self.labels = tuple( header["labels"] )
+        self.numberOfPixels = { int(label):header["numberOfPixels"][label] for label in header["numberOfPixels"] }
+        self.boundingBoxes = { int(label):tuple(header["boundingBoxes"][label]) for label in header["boundingBoxes"] }
+
+        self.labelsArray = np.load( os.path.join(self.ENTRY_DIR, "labels.npy"), mmap_mode="r" )
+
+
+    def GetImage( self ):
+        """
+        Return the label image (memory-mapped LabelImage).
+        """
+        return LabelImage( self.labelsArray, self.spacing, self.origin, self.direction )
+
+
+    def GetLabelRegion( self, label, regionIndex, regionSize ):
+        """
+        Return mask, slice distance map (memory-mapped, see
+        getSliceDistanceMap) and contour of a label on a region of interest
+        (index and size in x-y-z order, arrays in z-y-x order).
+        """
+        region = getRegionSlices( regionIndex, regionSize )
+
+        maskArray = self.labelsArray[region] == label
+
+        sliceDistanceMap = np.load( os.path.join(self.ENTRY_DIR, "slice_distance_%d.npy" % label), mmap_mode="r" )
+        sliceDistanceArray = sliceDistanceMap[region]
+
+        surfaceIndices = np.load( os.path.join(self.ENTRY_DIR, "surface_%d.npy" % label) )
+        lowerIndex = np.array( [ axisRegion.start for axisRegion in region ] )
+
+        surfaceArray = np.zeros( maskArray.shape, dtype=bool )
+        surfaceIndices = surfaceIndices - lowerIndex
+        inside = np.all( (surfaceIndices >= 0) & (surfaceIndices < np.array(maskArray.shape)), axis=1 )
+        surfaceArray[ tuple(surfaceIndices[inside].T) ] = True
+
+        return maskArray, sliceDistanceArray, surfaceArray
+
+
+class LabelImage( object ):
+    """
+    Label image backed by a NumPy array (z-y-x order, e.g. memory-mapped),
+    with the geometry accessors of sitk.Image used by the metric code.
+    """
+    def __init__( self, array, spacing, origin, direction ):
+        """
+        Default constructor.
+        """
+        self.array = array
+
+        self.spacing = tuple( spacing )
+        self.origin = tuple( origin )
+        self.direction = tuple( direction )
+
+
+    def GetArray( self ):
+        """
+        Return the label array (z-y-x order, no copy).
+        """
+        return self.array
+
+
+    def GetSize( self ):
+        return tuple( int(size) for size in self.array.shape[::-1] )
+
+
+    def GetSpacing( self ):
+        return self.spacing
+
+
+    def GetOrigin( self ):
+        return self.origin
+
+
+    def GetDirection( self ):
+        return self.direction
+
+
+    def TransformIndexToPhysicalPoint( self, index ):
+        """
+        Physical point of a pixel index (x-y-z order).
+        """
+        dimension = len(self.spacing)
+        direction = np.array( self.direction ).reshape( dimension, dimension )
+
+        point = np.array( self.origin ) + direction @ ( np.array(self.spacing) * np.array(index, dtype=float) )
+
+        return tuple( float(coordinate) for coordinate in point )
+
+
+class LabelVoxels( object ):
+    """
+    Voxel coordinate lists of some labels of a label image (flat indices,
+    z-y-x order), built by a single scan of the image. Bounding boxes and
+    region masks of a label then cost its number of voxels and region
+    size, not the image size.
+    """
+    def __init__( self, array, labels ):
+        """
+        Default constructor (3D label array, z-y-x order).
+        """
+        self.shape = tuple( array.shape )
+
+        flatArray = np.asarray( array ).reshape( -1 )
+
+        # Voxels within the range of the labels.
+        selected = np.flatnonzero( (flatArray >= min(labels)) & (flatArray <= max(labels)) )
+        selectedLabels = flatArray[selected]
+
+        # Stable sort: the indices of each label stay in increasing order.
+        order = np.argsort( selectedLabels, kind="stable" )
+        selectedLabels = selectedLabels[order]
+
+        self.indices = {}       # { label : flat indices }
+
+        for label in labels:
+            start, stop = np.searchsorted( selectedLabels, [ label, label + 1 ] )
+            self.indices[label] = selected[ order[start:stop] ]
+
+
+    def GetCoordinates( self, label ):
+        """
+        Return the coordinates (z, y, x arrays) of the voxels of a label.
+        """
+        return np.unravel_index( self.indices[label], self.shape )
+
+
+    def GetBoundingBox( self, label ):
+        """
+        Return the bounding box (index..., size...) of a label in image
+        (x-y-z) order, None if the label is empty (see getBoundingBox).
+        """
+        if self.indices[label].size == 0:
+            return None
+
+        z, y, x = self.GetCoordinates( label )
+
+        return ( int(x.min()), int(y.min()), int(z[0]),
+                 int(x.max() - x.min() + 1), int(y.max() - y.min() + 1), int(z[-1] - z[0] + 1) )
+
+
+    def GetRegionMask( self, label, region ):
+        """
+        Return the mask of a label on a region of interest containing it
+        (array slices, z-y-x order).
+        """
+        maskArray = np.zeros( tuple( axisRegion.stop - axisRegion.start for axisRegion in region ), dtype=bool )
+
+        coordinates = self.GetCoordinates( label )
+        maskArray[ tuple( axisCoordinates - axisRegion.start for axisCoordinates, axisRegion in zip(coordinates, region) ) ] = True
+
+        return maskArray
+
+
+class DistanceMapSurfaceDistances( object ):
+    """
+    Hausdorff and surface distances of a label from one slice distance map
+    per mask (see getSliceDistanceMap) on its region of interest. Distances
+    in physical units (HD) and in voxel units (ASSD) are both derived from
+    it (see getSliceDistances), only for the pixels they need: a single
+    SignedMaurerDistanceMap per mask instead of one per mask and unit.
+    A non-square pixel (x and y spacings differ) needs a second map per
+    mask for physical distances.
+    """
+    def __init__( self, referenceMaskArray, referenceSliceDistanceArray, referenceSurfaceArray, targetMaskArray, spacing ):
+        """
+        Default constructor (reference arrays and target mask on the same
+        region of interest, z-y-x order; spacing in x-y-z order).
+        """
+        self.maskArrays = ( referenceMaskArray, targetMaskArray )
+        self.surfaceArrays = [ referenceSurfaceArray, None ]
+        self.sliceDistanceArrays = [ referenceSliceDistanceArray, None ]
+        self.physicalSliceDistanceArrays = [ None, None ]
+
+        self.spacing = tuple( spacing )
+
+
+    def IsTargetEmpty( self ):
+        return not self.maskArrays[1].any()
+
+
+    def __GetSurface( self, side ):
+        """
+        Contour of the reference (side 0) or target (side 1) mask.
+        """
+        if self.surfaceArrays[side] is None:
+            self.surfaceArrays[side] = getContourArray( self.maskArrays[side] )
+
+        return self.surfaceArrays[side]
+
+
+    def __GetDistances( self, side, indices, physical ):
+        """
+        Distances of pixels (indices) to the contour of the reference
+        (side 0) or target (side 1) mask, in physical or voxel units.
+        """
+        if self.sliceDistanceArrays[side] is None:
+            self.sliceDistanceArrays[side] = getSliceDistanceMap( self.maskArrays[side] )
+
+        if not physical:
+            return getSliceDistances( self.sliceDistanceArrays[side], indices, 1.0, 1.0 )
+
+        sliceWeight = self.spacing[2]**2 if len(self.spacing) > 2 else 0.0
+
+        if self.spacing[0] == self.spacing[1]:
+            return getSliceDistances( self.sliceDistanceArrays[side], indices, self.spacing[0]**2, sliceWeight )
+
+        if self.physicalSliceDistanceArrays[side] is None:
+            self.physicalSliceDistanceArrays[side] = getSliceDistanceMap( self.maskArrays[side], self.spacing[:2] )
+
+        return getSliceDistances( self.physicalSliceDistanceArrays[side], indices, 1.0, sliceWeight )
+
+
+    def GetHausdorffDistance( self ):
+        """
+        Largest distance of the pixels of each mask outside the other one
+        to the other mask (as HausdorffDistanceImageFilter).
+        """
+        referenceMaskArray, targetMaskArray = self.maskArrays
+
+        ref2tarDistances = self.__GetDistances( 1, np.nonzero( referenceMaskArray & ~targetMaskArray ), True )
+        tar2refDistances = self.__GetDistances( 0, np.nonzero( targetMaskArray & ~referenceMaskArray ), True )
+
+        return max( float( ref2tarDistances.max(initial=0.0) ),
+                    float( tar2refDistances.max(initial=0.0) ) )
+
+
+    def __GetDirectedDistances( self, physical ):
+        return ( self.__GetDistances( 1, np.nonzero( self.__GetSurface(0) ), physical ),
+                 self.__GetDistances( 0, np.nonzero( self.__GetSurface(1) ), physical ) )
+
+
+    def GetDirectedSurfaceDistances( self ):
+        """
+        Distances (in physical units) of the reference contour to the
+        target mask and of the target contour to the reference one:
+        (ref2tar, tar2ref).
+        """
+        return self.__GetDirectedDistances( True )
+
+
+    def GetDirectedVoxelDistances( self ):
+        """
+        Directed surface distances (see GetDirectedSurfaceDistances) in
+        voxel units.
+        """
+        return self.__GetDirectedDistances( False )
+
+
+class KDTreeSurfaceDistances( object ):
+    """
+    Hausdorff and surface distances of a label from KD-trees of contour
+    points in physical space: only contour and mismatched pixels are
+    queried, whatever the grid size. Query contours follow LabelContour
+    (face connected) and tree contours the one of SignedMaurerDistanceMap
+    (fully connected), so distances agree with the distance map engine up
+    to its float32 precision (about 1e-5 mm).
+    """
+    def __init__( self, referenceMaskArray, targetMaskArray, spacing ):
+        """
+        Default constructor (masks on the same region of interest, z-y-x
+        order; spacing in x-y-z order).
+        """
+        self.referenceMaskArray = referenceMaskArray
+        self.targetMaskArray = targetMaskArray
+
+        self.spacing = np.array( spacing[::-1], dtype=np.float64 )      # z-y-x order
+
+        self.referenceTree = None
+        self.targetTree = None
+
+
+    def IsTargetEmpty( self ):
+        return not self.targetMaskArray.any()
+
+
+    def __GetPoints( self, maskArray ):
+        return np.argwhere( maskArray ) * self.spacing
+
+
+    def __GetContour( self, maskArray, connectivity ):
+        """
+        Contour of a mask: pixels with a background neighbour (pixels
+        outside the grid are not background, as in LabelContour).
+        """
+        structure = scipy.ndimage.generate_binary_structure( maskArray.ndim, connectivity )
+
+        return maskArray & ~scipy.ndimage.binary_erosion( maskArray, structure=structure, border_value=1 )
+
+
+    def __GetTrees( self ):
+        """
+        KD-trees of the fully connected contour points of both masks.
+        """
+        if self.referenceTree is None:
+            self.referenceTree = scipy.spatial.cKDTree( self.__GetPoints( self.__GetContour(self.referenceMaskArray, self.referenceMaskArray.ndim) ) )
+            self.targetTree = scipy.spatial.cKDTree( self.__GetPoints( self.__GetContour(self.targetMaskArray, self.targetMaskArray.ndim) ) )
+
+        return self.referenceTree, self.targetTree
+
+
+    def __Query( self, tree, maskArray ):
+        """
+        Distances of the mask points to the nearest tree point.
+        """
+        if not maskArray.any():
+            return np.zeros( 0 )
+
+        return tree.query( self.__GetPoints(maskArray) )[0]
+
+
+    def GetHausdorffDistance( self ):
+        """
+        Largest distance of the pixels of each mask outside the other one
+        to the other mask.
+        """
+        referenceTree, targetTree = self.__GetTrees()
+
+        ref2tarDistances = self.__Query( targetTree, self.referenceMaskArray & ~self.targetMaskArray )
+        tar2refDistances = self.__Query( referenceTree, self.targetMaskArray & ~self.referenceMaskArray )
+
+        return max( float( ref2tarDistances.max(initial=0.0) ),
+                    float( tar2refDistances.max(initial=0.0) ) )
+
+
+    def GetDirectedSurfaceDistances( self ):
+        """
+        Distances of the reference contour to the target contour and of the
+        target contour to the reference one: (ref2tar, tar2ref).
+        """
+        referenceTree, targetTree = self.__GetTrees()
+
+        return ( self.__Query( targetTree, self.__GetContour(self.referenceMaskArray, 1) ),
+                 self.__Query( referenceTree, self.__GetContour(self.targetMaskArray, 1) ) )
+
+
+    def GetDirectedVoxelDistances( self ):
+        """
+        Directed surface distances (see GetDirectedSurfaceDistances) in
+        voxel units (unit spacing).
+        """
+        return KDTreeSurfaceDistances( self.referenceMaskArray, self.targetMaskArray,
+                                       (1.0,) * self.referenceMaskArray.ndim ).GetDirectedSurfaceDistances()
+
+
+class SparseSurfaceDistances( object ):
+    """
+    Hausdorff and surface distances of a small label from its pixel
+    coordinates (NumPy only): contours are found by neighbour lookups and
+    nearest distances computed between point sets by blocks of
+    SPARSE_BLOCK_SIZE pairs, without distance maps or image filters.
+    Contours and distances are the ones of KDTreeSurfaceDistances.
+    """
+    def __init__( self, referenceMaskArray, targetMaskArray, spacing ):
+        """
+        Default constructor (masks on the same region of interest, z-y-x
+        order; spacing in x-y-z order).
+        """
+        self.referenceMaskArray = referenceMaskArray
+        self.targetMaskArray = targetMaskArray
+
+        self.spacing = np.array( spacing[::-1], dtype=np.float64 )      # z-y-x order
+
+        self.referencePoints = None
+        self.targetPoints = None
+
+
+    def IsTargetEmpty( self ):
+        return not self.targetMaskArray.any()
+
+
+    def __GetPoints( self, maskArray ):
+        return np.argwhere( maskArray ) * self.spacing
+
+
+    def __GetContour( self, maskArray, connectivity ):
+        """
+        Contour of a mask: pixels with a background neighbour within the
+        connectivity (pixels outside the grid are not background, as in
+        LabelContour).
+        """
+        paddedMaskArray = np.pad( maskArray, 1, mode="constant", constant_values=True )
+        interior = maskArray.copy()
+
+        for offset in itertools.product( (-1, 0, 1), repeat=maskArray.ndim ):
+            if 0 < np.abs( offset ).sum() <= connectivity:
+                interior &= paddedMaskArray[ tuple( slice(1 + shift, 1 + shift + size) for shift, size in zip(offset, maskArray.shape) ) ]
+
+        return maskArray & ~interior
+
+
+    def __GetContourPoints( self ):
+        """
+        Fully connected contour points of both masks.
+        """
+        if self.referencePoints is None:
+            self.referencePoints = self.__GetPoints( self.__GetContour(self.referenceMaskArray, self.referenceMaskArray.ndim) )
+            self.targetPoints = self.__GetPoints( self.__GetContour(self.targetMaskArray, self.targetMaskArray.ndim) )
+
+        return self.referencePoints, self.targetPoints
+
+
+    def __Query( self, points, maskArray ):
+        """
+        Distances of the mask points to the nearest of points.
+        """
+        if not maskArray.any():
+            return np.zeros( 0 )
+
+        queryPoints = self.__GetPoints( maskArray )
+        distances = np.empty( queryPoints.shape[0] )
+
+        blockSize = max( 1, SPARSE_BLOCK_SIZE // max(1, points.shape[0]) )
+
+        for start in range( 0, queryPoints.shape[0], blockSize ):
+            block = queryPoints[start:start + blockSize]
+
+            # Squared distances (block x points), accumulated axis by axis.
+            squaredDistances = np.square( block[:, 0, np.newaxis] - points[np.newaxis, :, 0] )
+
+            for axis in range( 1, points.shape[1] ):
+                squaredDistances += np.square( block[:, axis, np.newaxis] - points[np.newaxis, :, axis] )
+
+            distances[start:start + blockSize] = np.sqrt( squaredDistances.min( axis=1 ) )
+
+        return distances
+
+
+    def GetHausdorffDistance( self ):
+        """
+        Largest distance of the pixels of each mask outside the other one
+        to the other mask.
+        """
+        referencePoints, targetPoints = self.__GetContourPoints()
+
+        ref2tarDistances = self.__Query( targetPoints, self.referenceMaskArray & ~self.targetMaskArray )
+        tar2refDistances = self.__Query( referencePoints, self.targetMaskArray & ~self.referenceMaskArray )
+
+        return max( float( ref2tarDistances.max(initial=0.0) ),
+                    float( tar2refDistances.max(initial=0.0) ) )
+
+
+    def GetDirectedSurfaceDistances( self ):
+        """
+        Distances of the reference contour to the target contour and of the
+        target contour to the reference one: (ref2tar, tar2ref).
+        """
+        referencePoints, targetPoints = self.__GetContourPoints()
+
+        return ( self.__Query( targetPoints, self.__GetContour(self.referenceMaskArray, 1) ),
+                 self.__Query( referencePoints, self.__GetContour(self.targetMaskArray, 1) ) )
+
+
+    def GetDirectedVoxelDistances( self ):
+        """
+        Directed surface distances (see GetDirectedSurfaceDistances) in
+        voxel units (unit spacing).
+        """
+        return SparseSurfaceDistances( self.referenceMaskArray, self.targetMaskArray,
+                                       (1.0,) * self.referenceMaskArray.ndim ).GetDirectedSurfaceDistances()
+
+
+class StageProfiler( object ):
+    """
+    Wall time and, optionally, peak memory of the stages of an assessment.
+    Peak memory is traced with tracemalloc (NumPy and Python allocations,
+    SimpleITK internal buffers are not seen) and reported above the memory
+    in use when the stage starts.
+    """
+    def __init__( self, segmentationName, traceMemory=False ):
+        """
+        Default constructor.
+        """
+        self.SEGMENTATION_NAME = segmentationName
+        self.traceMemory = traceMemory
+
+        self.records = []       # [ SEGMENTATION ID, STAGE, LABEL, TIME (s), PEAK MEMORY (MB) ]
+
+        self.startedTracing = False
+
+
+    def AddRecord( self, stage, label, elapsedTime, peakMemory=np.NaN ):
+        """
+        Add a stage record (label None = whole case).
+        """
+        self.records.append( [ self.SEGMENTATION_NAME, stage, label, elapsedTime, peakMemory ] )
+
 
-                    return
+    @contextlib.contextmanager
+    def Stage( self, stage, label=None ):
+        """
+        Record wall time (and peak memory) of the enclosed block.
+        """
+        if self.traceMemory:
+            tracemalloc.reset_peak()
+            startMemory = tracemalloc.get_traced_memory()[0]
 
-                # Symmetric surface distance measures
-                referenceDistanceMap = sitk.Abs( sitk.SignedMaurerDistanceMap(self.referenceImageSegmentation == label, squaredDistance=False) )
-                referenceSurface = sitk.LabelContour(self.referenceImageSegmentation == label)
+        start = time.perf_counter()
 
-                statisticsImageFilter = sitk.StatisticsImageFilter()
-                # Get the number of pixels in the reference surface by counting all pixels that are 1.
-                statisticsImageFilter.Execute(referenceSurface)
-                numReferenceSurfacePixels = int(statisticsImageFilter.GetSum()) 
+        try:
+            yield
 
+        finally:
+            elapsedTime = time.perf_counter() - start
+            peakMemory = np.NaN
 
-                targetDistanceMap = sitk.Abs( sitk.SignedMaurerDistanceMap(self.targetImageSegmentation == label, squaredDistance=False) )
-                targetSurface = sitk.LabelContour(self.targetImageSegmentation == label)
-                
-                # Multiply the binary surface segmentations with the distance maps. The resulting distance
-                # maps contain non-zero values only on the surface (they can also contain zero on the surface)
-                tar2refDistanceMap = referenceDistanceMap*sitk.Cast(targetSurface, sitk.sitkFloat32)
-                ref2tarDistanceMap = targetDistanceMap*sitk.Cast(referenceSurface, sitk.sitkFloat32)
-
-                # Get the number of pixels in the segmented surface by counting all pixels that are 1.
-                statisticsImageFilter.Execute(targetSurface)
-                numTargetSurfacePixels = int(statisticsImageFilter.GetSum())
-            
-                # Get all non-zero distances and then add zero distances if required.
-                tar2refDistanceMapArray = sitk.GetArrayViewFromImage(tar2refDistanceMap)
-                tar2refDistances = list(tar2refDistanceMapArray[tar2refDistanceMapArray!=0]) 
-
-                tar2refDistances = tar2refDistances + \
-                                   list( np.zeros(numTargetSurfacePixels - len(tar2refDistances)) )
-                
-                ref2tarDistanceMapArray = sitk.GetArrayViewFromImage(ref2tarDistanceMap)
-                ref2tarDistances = list(ref2tarDistanceMapArray[ref2tarDistanceMapArray!=0]) 
+            if self.traceMemory:
+                peakMemory = ( tracemalloc.get_traced_memory()[1] - startMemory ) / ( 1024.0 * 1024.0 )
 
-                ref2tarDistances = ref2tarDistances + \
-                                   list( np.zeros(numReferenceSurfacePixels - len(ref2tarDistances)) )
-                
-                surfaceDistances = tar2refDistances + ref2tarDistances
+            self.AddRecord( stage, label, elapsedTime, peakMemory )
 
-                self.referenceMetrics.ASSD[label].value = np.nanmean( surfaceDistances )
-                self.targetMetrics.ASSD[label].value = np.nanmean( surfaceDistances )                
 
-            except Exception as exception:
-                self.referenceMetrics.ASSD[label].value = np.NAN
-                self.targetMetrics.ASSD[label].value = np.NAN
-                
-                log.error("[AssessSegmentation::CalcASSD Exception] %s" % str(exception))
-                log.error("[AssessSegmentation::CalcASSD Exception] %s" % str(traceback.format_exc()))   
+    def Start( self ):
+        """
+        Start memory tracing if required and not already running.
+        """
+        if self.traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.startedTracing = True
 
 
-    def PrintSingleMetrics( self ):
+    def Stop( self ):
         """
-        Print metrics.
+        Stop memory tracing if started by this profiler.
         """
-        self.referenceMetrics.PrintSingleMetrics()
-        self.targetMetrics.PrintSingleMetrics()
+        if self.startedTracing:
+            tracemalloc.stop()
+            self.startedTracing = False
 
 
 class MyosaiqMetrics( object ):
@@ -578,6 +2937,27 @@ class MyosaiqMetrics( object ):
                       MYOCARDIAL_INFARCTION:Measurement(np.NAN, np.NAN),
                       MVO:Measurement(np.NAN, np.NAN) }
 
+        # Additional measures (not included in tables).
+        self.HD95 = { LEFT_VENTRICULAR_CAVITY:Measurement(np.NAN, np.NAN),
+                      MYOCARDIUM:Measurement(np.NAN, np.NAN),
+                      MYOCARDIAL_INFARCTION:Measurement(np.NAN, np.NAN),
+                      MVO:Measurement(np.NAN, np.NAN) }
+
+        self.JACCARD = { LEFT_VENTRICULAR_CAVITY:Measurement(np.NAN, np.NAN),
+                         MYOCARDIUM:Measurement(np.NAN, np.NAN),
+                         MYOCARDIAL_INFARCTION:Measurement(np.NAN, np.NAN),
+                         MVO:Measurement(np.NAN, np.NAN) }
+
+        self.SENSITIVITY = { LEFT_VENTRICULAR_CAVITY:Measurement(np.NAN, np.NAN),
+                             MYOCARDIUM:Measurement(np.NAN, np.NAN),
+                             MYOCARDIAL_INFARCTION:Measurement(np.NAN, np.NAN),
+                             MVO:Measurement(np.NAN, np.NAN) }
+
+        self.PRECISION = { LEFT_VENTRICULAR_CAVITY:Measurement(np.NAN, np.NAN),
+                           MYOCARDIUM:Measurement(np.NAN, np.NAN),
+                           MYOCARDIAL_INFARCTION:Measurement(np.NAN, np.NAN),
+                           MVO:Measurement(np.NAN, np.NAN) }
+
 
     def PrintSingleMetrics( self ):
         """
@@ -626,11 +3006,10 @@ class MyosaiqMetrics( object ):
         """
         Return a Pandas data frame.
         """
-        metricsData = self.GetTable()
-        dataFrame = pd.DataFrame( data=metricsData,
-                                  columns=["SEGMENTATION ID", "LABEL", "METRIC", "VALUE", "STD"] )
-        
-        return dataFrame
+        results = MetricsStore( [ self.segmentationName ] )
+        results.Set( 0, self )
+
+        return results.GetDataFrame()
 
 
     def PrintMetrics( self ):
@@ -652,61 +3031,311 @@ class MyosaiqMetrics( object ):
         """
         Return a table with all metrics.
         """
-        table = []
+        return self.GetDataFrame().values.tolist()
+
+
+class MetricsStore( object ):
+    """
+    Columnar store of table metrics: value and std arrays indexed by
+    segmentation x label x metric (see TABLE_METRICS).
+    """
+    def __init__( self, segmentationNames ):
+        """
+        Default constructor.
+        """
+        self.segmentationNames = [ str(segmentationName) for segmentationName in segmentationNames ]
+
+        shape = ( len(self.segmentationNames), len(LABEL), len(TABLE_METRICS) )
+
+        self.values = np.full( shape, np.NaN )
+        self.stds = np.full( shape, np.NaN )
+
+        self.confidenceIntervals = None     # [ CI LOW, CI HIGH ] arrays (see Bootstrap)
+
+
+    def GetMetricIndex( self, metric ):
+        """
+        Return the index of a metric (METRIC name) in the store.
+        """
+        return [ tableMetric[0] for tableMetric in TABLE_METRICS ].index( metric )
+
+
+    def Set( self, index, metrics ):
+        """
+        Store the table metrics of a MyosaiqMetrics object.
+        """
+        for labelIndex, key in enumerate(LABEL):
+            for metricIndex, tableMetric in enumerate(TABLE_METRICS):
+                measurement = getattr( metrics, tableMetric[1] )[key]
+
+                self.values[index, labelIndex, metricIndex] = measurement.value
+                self.stds[index, labelIndex, metricIndex] = measurement.std
+
+
+    def GetMetrics( self, index ):
+        """
+        Return a MyosaiqMetrics object with the stored table metrics.
+        """
+        metrics = MyosaiqMetrics( self.segmentationNames[index] )
+
+        for labelIndex, key in enumerate(LABEL):
+            for metricIndex, tableMetric in enumerate(TABLE_METRICS):
+                measurement = getattr( metrics, tableMetric[1] )[key]
+
+                measurement.value = float( self.values[index, labelIndex, metricIndex] )
+                measurement.std = float( self.stds[index, labelIndex, metricIndex] )
+
+        return metrics
+
+
+    def Bootstrap( self, resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE, seed=None ):
+        """
+        Percentile bootstrap confidence intervals of the overall statistics
+        (first two rows, see AssessSegmentations) from the case rows:
+        mean VOLUME, DICE, HD and ASSD, VOLUME MAE and VOLUME CC of every
+        label at once. Each block of resamples is drawn as one index array
+        and turned into case weights, so resampled statistics are weighted
+        sums (matrix products) of the case values.
+        """
+        referenceValues = self.values[2::2]
+        targetValues = self.values[3::2]
+
+        numberOfCases = referenceValues.shape[0]
+
+        self.confidenceIntervals = [ np.full( self.values.shape, np.NaN ), np.full( self.values.shape, np.NaN ) ]
+
+        if numberOfCases == 0:
+            return
+
+        rng = np.random.default_rng( seed )
+
+        # Means: NaN-aware sums of (side x label x metric) values.
+        values = np.stack( (referenceValues, targetValues) ).reshape( 2, numberOfCases, -1 )
+        valid = ~np.isnan( values )
+        values = np.where( valid, values, 0.0 )
+
+        # Paired volumes (centered): count, sums, squares, products, absolute errors per label.
+        volumeIndex = self.GetMetricIndex("VOLUME")
+
+        x = referenceValues[ :, :, volumeIndex ]
+        y = targetValues[ :, :, volumeIndex ]
+        paired = ~( np.isnan(x) | np.isnan(y) )
+
+        absoluteErrors = np.where( paired, np.abs(x - y), 0.0 )
+
+        with np.errstate( invalid="ignore" ):
+            x = np.where( paired, x - np.nanmean( np.where(paired, x, np.NaN), axis=0 ), 0.0 )
+            y = np.where( paired, y - np.nanmean( np.where(paired, y, np.NaN), axis=0 ), 0.0 )
+
+        volumes = np.concatenate( ( paired, x, y, x * x, y * y, x * y, absoluteErrors ), axis=1 ).astype( np.float64 )
+
+        blockSize = max( 1, BOOTSTRAP_BLOCK_SIZE // numberOfCases )
+        statistics = []
+
+        for start in range( 0, resamples, blockSize ):
+            size = min( blockSize, resamples - start )
+
+            # One index array per block -> resample counts of each case.
+            indices = rng.integers( 0, numberOfCases, size=(size, numberOfCases) )
+            weights = np.bincount( (indices + numberOfCases * np.arange(size)[:, None]).reshape(-1),
+                                   minlength=size * numberOfCases ).reshape( size, numberOfCases ).astype( np.float64 )
+
+            with np.errstate( invalid="ignore", divide="ignore" ):
+                means = (weights @ values) / (weights @ valid)     # side x resample x (label, metric)
+
+                sums = ( weights @ volumes ).reshape( size, 7, len(LABEL) )
+                counts = sums[:, 0]
+                meanX, meanY = sums[:, 1] / counts, sums[:, 2] / counts
+
+                varianceX = sums[:, 3] / counts - meanX * meanX
+                varianceY = sums[:, 4] / counts - meanY * meanY
+                covariance = sums[:, 5] / counts - meanX * meanY
+
+                mae = sums[:, 6] / counts
+                coco = np.where( counts > 1, covariance / np.sqrt(varianceX * varianceY), np.NaN )
+
+            block = means.reshape( 2, size, len(LABEL), len(TABLE_METRICS) )
+            block[ :, :, :, self.GetMetricIndex("VOLUME MAE") ] = mae
+            block[ :, :, :, self.GetMetricIndex("VOLUME CC") ] = coco
+
+            statistics.append( block )
+
+        statistics = np.concatenate( statistics, axis=1 )
+
+        alpha = 100.0 * (1.0 - confidence) / 2.0
+
+        with warnings.catch_warnings():
+            warnings.simplefilter( "ignore", category=RuntimeWarning )     # All-NaN statistics
+            low, high = np.nanpercentile( statistics, [ alpha, 100.0 - alpha ], axis=1 )
+
+        for side in range(2):
+            self.confidenceIntervals[0][side] = low[side]
+            self.confidenceIntervals[1][side] = high[side]
+
+
+    def GetDataFrame( self ):
+        """
+        Return a Pandas data frame (long layout, one row per segmentation,
+        label and metric) with rounded values, and CI LOW / CI HIGH
+        columns after Bootstrap().
+        """
+        decimals = [ tableMetric[2] for tableMetric in TABLE_METRICS ]
+
+        values = np.empty( self.values.shape )
+        stds = np.empty( self.stds.shape )
+
+        for metricIndex, metricDecimals in enumerate(decimals):
+            values[..., metricIndex] = np.round( self.values[..., metricIndex], metricDecimals )
+            stds[..., metricIndex] = np.round( self.stds[..., metricIndex], metricDecimals )
+
+        numberOfSegmentations = len( self.segmentationNames )
+        rowsPerSegmentation = len(LABEL) * len(TABLE_METRICS)
+
+        data = { "SEGMENTATION ID": np.repeat( np.array(self.segmentationNames, dtype=object), rowsPerSegmentation ),
+                 "LABEL": np.tile( np.repeat( np.array(list(LABEL.values()), dtype=object), len(TABLE_METRICS) ), numberOfSegmentations ),
+                 "METRIC": np.tile( np.array([ tableMetric[0] for tableMetric in TABLE_METRICS ], dtype=object), numberOfSegmentations * len(LABEL) ),
+                 "VALUE": values.reshape(-1),
+                 "STD": stds.reshape(-1) }
+
+        columns = TABLE_COLUMNS
+
+        if self.confidenceIntervals is not None:
+            for column, bounds in zip( CI_COLUMNS, self.confidenceIntervals ):
+                rounded = np.empty( bounds.shape )
+
+                for metricIndex, metricDecimals in enumerate(decimals):
+                    rounded[..., metricIndex] = np.round( bounds[..., metricIndex], metricDecimals )
+
+                data[column] = rounded.reshape(-1)
+
+            columns = TABLE_COLUMNS + CI_COLUMNS
+
+        return pd.DataFrame( data=data, columns=columns )
+
+
+    def GetWideDataFrame( self ):
+        """
+        Return a Pandas data frame (wide layout, one row per segmentation)
+        with rounded values: "<LABEL> <METRIC>" and "<LABEL> <METRIC> STD"
+        columns ("<LABEL> <METRIC> CI LOW" and "... CI HIGH" after
+        Bootstrap()).
+        """
+        columns = [ "SEGMENTATION ID" ]
+        data = { "SEGMENTATION ID": np.array( self.segmentationNames, dtype=object ) }
+
+        for labelIndex, labelName in enumerate( LABEL.values() ):
+            for metricIndex, tableMetric in enumerate(TABLE_METRICS):
+                valueColumn = "%s %s" % ( labelName, tableMetric[0] )
+                stdColumn = valueColumn + " STD"
+
+                data[valueColumn] = np.round( self.values[:, labelIndex, metricIndex], tableMetric[2] )
+                data[stdColumn] = np.round( self.stds[:, labelIndex, metricIndex], tableMetric[2] )
+
+                columns += [ valueColumn, stdColumn ]
+
+                if self.confidenceIntervals is not None:
+                    for ciColumn, bounds in zip( CI_COLUMNS, self.confidenceIntervals ):
+                        data[valueColumn + " " + ciColumn] = np.round( bounds[:, labelIndex, metricIndex], tableMetric[2] )
+                        columns.append( valueColumn + " " + ciColumn )
+
+        return pd.DataFrame( data=data, columns=columns )
+
+
+class RunningStatistics( object ):
+    """
+    Online overall statistics of table metrics, updated case by case in
+    constant memory: NaN-aware (Welford) mean and variance per side, label
+    and metric, plus the absolute error and co-moment of the paired
+    reference/target volumes (VOLUME MAE, VOLUME CC).
+    """
+    def __init__( self ):
+        """
+        Default constructor.
+        """
+        self.NUM_CASES = 0
+
+        shape = ( 2, len(LABEL), len(TABLE_METRICS) )   # Reference, target
+
+        self.counts = np.zeros( shape, dtype=np.int64 )
+        self.means = np.zeros( shape )
+        self.squares = np.zeros( shape )                # Sum of squared deviations
+
+        self.volumeIndex = [ tableMetric[0] for tableMetric in TABLE_METRICS ].index("VOLUME")
+
+        self.pairCounts = np.zeros( len(LABEL), dtype=np.int64 )
+        self.pairMeans = np.zeros( (2, len(LABEL)) )
+        self.pairSquares = np.zeros( (2, len(LABEL)) )
+        self.pairCoMoments = np.zeros( len(LABEL) )
+        self.absoluteErrors = np.zeros( len(LABEL) )    # Mean absolute error
+
+
+    def Update( self, referenceMetrics, targetMetrics ):
+        """
+        Add the table metrics of one case.
+        """
+        values = np.full( self.counts.shape, np.NaN )
+
+        for side, metrics in enumerate( (referenceMetrics, targetMetrics) ):
+            for labelIndex, key in enumerate(LABEL):
+                for metricIndex, tableMetric in enumerate(TABLE_METRICS):
+                    values[side, labelIndex, metricIndex] = getattr( metrics, tableMetric[1] )[key].value
+
+        valid = ~np.isnan( values )
+
+        self.counts += valid
+
+        delta = np.where( valid, values - self.means, 0.0 )
+        self.means += np.where( valid, delta / np.maximum( self.counts, 1 ), 0.0 )
+        self.squares += np.where( valid, delta * (values - self.means), 0.0 )
+
+        # Paired volumes: cases with both volumes only.
+        volumes = values[ :, :, self.volumeIndex ]
+        paired = valid[ 0, :, self.volumeIndex ] & valid[ 1, :, self.volumeIndex ]
+
+        self.pairCounts += paired
+
+        counts = np.maximum( self.pairCounts, 1 )
+        delta = np.where( paired, volumes - self.pairMeans, 0.0 )
+
+        self.pairMeans += delta / counts
+        self.pairSquares += np.where( paired, delta * (volumes - self.pairMeans), 0.0 )
+        self.pairCoMoments += np.where( paired, delta[0] * (volumes[1] - self.pairMeans[1]), 0.0 )
+        self.absoluteErrors += np.where( paired, (np.abs( volumes[0] - volumes[1] ) - self.absoluteErrors) / counts, 0.0 )
+
+        self.NUM_CASES += 1
+
+
+    def GetMetrics( self ):
+        """
+        Return overall (reference, target) MyosaiqMetrics: mean and std of
+        the table metrics, volume MAE, CC and LOA (NaN without values).
+        """
+        overallMetrics = ( MyosaiqMetrics("REFERENCE AVG"), MyosaiqMetrics("TARGET AVG") )
+
+        with np.errstate( invalid="ignore", divide="ignore" ):
+            means = np.where( self.counts > 0, self.means, np.NaN )
+            stds = np.sqrt( self.squares / self.counts )
+
+            mae = np.where( self.pairCounts > 0, self.absoluteErrors, np.NaN )
+            coco = np.where( self.pairCounts > 1,
+                             self.pairCoMoments / np.sqrt( self.pairSquares[0] * self.pairSquares[1] ),
+                             np.NaN )
+
+        for side, metrics in enumerate( overallMetrics ):
+            for labelIndex, key in enumerate(LABEL):
+                for measure in ( "VOLUME", "DICE", "HD", "ASSD" ):
+                    metricIndex = [ tableMetric[1] for tableMetric in TABLE_METRICS ].index( measure )
+
+                    getattr( metrics, measure )[key].value = float( means[side, labelIndex, metricIndex] )
+                    getattr( metrics, measure )[key].std = float( stds[side, labelIndex, metricIndex] )
+
+                metrics.VOLUME_MAE[key].value = float( mae[labelIndex] )
+                metrics.VOLUME_CC[key].value = float( coco[labelIndex] )
+                metrics.VOLUME_LOA[key].value = 1.96 * metrics.VOLUME[key].std
+
+        return overallMetrics
 
-        for key in LABEL:
 
-            volume = []
-            volume.append( self.segmentationName )
-            volume.append( LABEL[key] )
-            volume.append( "VOLUME" )
-            volume.append( np.round(self.VOLUME[key].value, ROUND_DECIMALS_VOLUME) )
-            volume.append( np.round(self.VOLUME[key].std, ROUND_DECIMALS_VOLUME) )
-            table.append( volume )
-
-            volumeMAE = []
-            volumeMAE.append( self.segmentationName )
-            volumeMAE.append( LABEL[key] )
-            volumeMAE.append( "VOLUME MAE" )
-            volumeMAE.append( np.round(self.VOLUME_MAE[key].value, ROUND_DECIMALS_VOLUME_MAE) )
-            volumeMAE.append( np.round(self.VOLUME_MAE[key].std, ROUND_DECIMALS_VOLUME_MAE) )
-            table.append( volumeMAE )
-
-            volumeCC = []
-            volumeCC.append( self.segmentationName )
-            volumeCC.append( LABEL[key] )
-            volumeCC.append( "VOLUME CC" )
-            volumeCC.append( np.round(self.VOLUME_CC[key].value, ROUND_DECIMALS_VOLUME_MAE) )
-            volumeCC.append( np.round(self.VOLUME_CC[key].std, ROUND_DECIMALS_VOLUME_MAE) )
-            table.append( volumeCC )
-
-            dice = []
-            dice.append( self.segmentationName )
-            dice.append( LABEL[key] )
-            dice.append( "DICE" )
-            dice.append( np.round(self.DICE[key].value, ROUND_DECIMALS_DICE) )
-            dice.append( np.round(self.DICE[key].std, ROUND_DECIMALS_DICE) )
-            table.append( dice )
-
-            hd = []
-            hd.append( self.segmentationName )
-            hd.append( LABEL[key] )
-            hd.append( "HD" )
-            hd.append( np.round(self.HD[key].value, ROUND_DECIMALS_ASSD_HD) )
-            hd.append( np.round(self.HD[key].std, ROUND_DECIMALS_ASSD_HD) )
-            table.append( hd )
-
-            assd = []
-            assd.append( self.segmentationName )
-            assd.append( LABEL[key] )
-            assd.append( "ASSD" )
-            assd.append( np.round(self.ASSD[key].value, ROUND_DECIMALS_ASSD_HD) )
-            assd.append( np.round(self.ASSD[key].std, ROUND_DECIMALS_ASSD_HD) )
-            table.append( assd )
-
-        return table         
-
-       
 class Measurement( object ):
     """
     Measurement class.
@@ -730,181 +3359,384 @@ class Counter( object ):
             return False
 
 
-class VolumesCDFException(Exception):
+def initWorker( numberOfThreads ):
     """
-    Default manager exception class.
+    Worker process initializer: cap SimpleITK internal threads.
     """
+    sitk.ProcessObject.SetGlobalDefaultNumberOfThreads( numberOfThreads )
 
 
-class VolumesCDF(object):
+def mapInWorkers( function, jobs, threadsPerJob, *iterables ):
     """
-    Class for the management of cumulative probability distribution's file.
+    Map a function over lists, sequentially (jobs = 1 or a single item)
+    or in a pool of worker processes with threadsPerJob SimpleITK threads
+    each (None = CPU count / jobs). Results are yielded in order.
     """
-    def __init__( self, inputFilePath ):
-        """
-        Default constructor.
-        """
-        self.FILE_PATH = None
-        self.NUM_VOLUMES = 0
+    if (jobs == 1) or (len(iterables[0]) < 2):
+        yield from map( function, *iterables )
+        return
 
-        self.volumeList = None
-        self.volumesData = None
+    if threadsPerJob is None:
+        threadsPerJob = max( 1, (os.cpu_count() or 1) // jobs )
 
-        if verifyFile( inputFilePath ):
-            self.FILE_PATH = inputFilePath
-            self.__Load()
-        else:
-            print("[VolumesCDF] File does not exist!")
+    with ProcessPoolExecutor( max_workers=jobs,
+                              initializer=initWorker,
+                              initargs=(threadsPerJob,) ) as executor:
 
+        yield from executor.map( function, *iterables )
 
-    def __str__( self ):
-        """
-        Default String obj.
-        """
-        volumesCDFStr = "\n[VolumesCDF]\n\n"
-        volumesCDFStr += "Input file: \n\t%s\n\n" % self.FILE_PATH
 
-        if self.volumeList is not None:
-            volumesCDFStr += "Contents (Volume ID) : \n"
-            for index, row in self.volumeList.iterrows():
-                volumesCDFStr += "\t" + row["ID"]
-                volumesCDFStr += "\n" 
-            volumesCDFStr += "\nTotal: %d volumes.\n\n" % self.NUM_VOLUMES
+def computeAssessment( refSegFilePath, tarSegFilePath, referenceStoreDir=None, profile=False, traceMemory=False,
+                       referenceImage=None, targetImage=None, memoryMap=False, surfaceEngine=SURFACE_ENGINE_DISTANCE_MAP,
+                       sliceWise=False, sliceJobs=1 ):
+    """
+    Assess a (reference, target) pair and return its metrics, timing and
+    slice records (referenceMetrics, targetMetrics, timings or None when
+    not profiled, slice metrics or None when not slice-wise). Images (read
+    from file unless given) are released on return.
+    """
+    referenceStore = None
+
+    if referenceStoreDir is not None:
+        referenceStore = ReferenceStore( referenceStoreDir )
 
-        return volumesCDFStr
+    aseg = AssessSegmentation( refSegFilePath, tarSegFilePath, referenceStore, profile, traceMemory, referenceImage, targetImage, memoryMap, surfaceEngine,
+                               sliceWise, sliceJobs )
+    aseg.Compute()
 
+    timings = aseg.profiler.records if aseg.profiler is not None else None
+    sliceMetrics = aseg.sliceMetrics if sliceWise else None
 
-    def __Load( self ):
-        """
-        Load volumes CDF data from csv file.
-        """
+    return aseg.referenceMetrics, aseg.targetMetrics, timings, sliceMetrics
+
+
+def loadAssessmentImages( refSegFilePath, tarSegFilePath, referenceStoreDir=None, memoryMap=False ):
+    """
+    Read the images of a (reference, target) pair as AssessSegmentation
+    does: (referenceImage, targetImage), UInt16. The reference is None when
+    it is in the reference store, and both are None on error (they are
+    then read again, and the error reported, by AssessSegmentation).
+    """
+    try:
+        referenceImage = None
+
+        if (referenceStoreDir is None) or not ReferenceStore( referenceStoreDir ).Has( refSegFilePath ):
+            referenceImage = readLabelImage( refSegFilePath, memoryMap )
+
+        targetImage = readLabelImage( tarSegFilePath, memoryMap )
+
+        return referenceImage, targetImage
+
+    except Exception:
+        return None, None
+
+
+def computeReferenceAssessments( refSegFilePath, tarSegFilePaths, referenceStoreDir=None, memoryMap=False,
+                                 surfaceEngine=SURFACE_ENGINE_DISTANCE_MAP ):
+    """
+    Assess several targets against one reference, loaded once, and return
+    their metrics [ (referenceMetrics, targetMetrics) or None, ... ]
+    (None for missing targets).
+    """
+    referenceStore = None
+    referenceImage = None
+
+    if referenceStoreDir is not None:
+        referenceStore = ReferenceStore( referenceStoreDir )
+
+    if (referenceStore is None) or not referenceStore.Has( refSegFilePath ):
         try:
-            self.volumesData = pd.read_csv( self.FILE_PATH, sep="," )
-            self.volumeList = self.volumesData[ ["ID"] ]
-            self.NUM_VOLUMES = int( self.volumeList.count() )
+            referenceImage = readLabelImage( refSegFilePath, memoryMap )
 
         except Exception as exception:
-            log.error("[VolumesCDF::Load Exception] %s" % str(exception))
-            log.error("[VolumesCDF::Load Exception] %s" % str(traceback.format_exc()))
+            log.error("[computeReferenceAssessments Exception] %s" % str(exception))
+            log.error("[computeReferenceAssessments Exception] %s" % str(traceback.format_exc()))
 
+    metrics = []
 
-    def H(self, x):
-        """
-        Heaviside step function:
-            1 if x is positive or zero, 0 otherwise
+    for tarSegFilePath in tarSegFilePaths:
+        if tarSegFilePath is None:
+            metrics.append( None )
+            continue
 
-        H(x) = \left\{ \begin{array}{cl}
-                        1 & : \ x \ge 0 \\
-                        0 & : \text{Otherwise}
-               \end{array} \right.
+        aseg = AssessSegmentation( refSegFilePath, tarSegFilePath, referenceStore, referenceImage=referenceImage, memoryMap=memoryMap,
+                                   surfaceEngine=surfaceEngine )
+        aseg.Compute()
 
-        """
-        if x < 0.0:
-            return 0 
-        return 1
+        metrics.append( (aseg.referenceMetrics, aseg.targetMetrics) )
 
+    return metrics
 
-    def CalcCRPS( self ):
-        """
-        Calculate Continuous Ranked Probability Score (CRPS).
-        """
 
-        crps = 0
+def computeLabelVolumes( segFilePath, referenceStoreDir=None, memoryMap=False ):
+    """
+    Return the volume (in mL) of each label of a segmentation, NaN if the
+    file is missing or cannot be read. Pixels are counted in a single pass
+    (or read from the reference store, without the image).
+    """
+    volumes = np.full( len(LABEL), np.NaN )
+
+    if segFilePath is None:
+        return volumes
 
-        if self.volumesData is None:
-            return crps
+    try:
+        if referenceStoreDir is not None:
+            referenceStore = ReferenceStore( referenceStoreDir )
 
-        try:
-            # N is the number of rows in the test set (equal to twice the number of cases)
-            N = self.NUM_VOLUMES
-            print("[VolumesCDF] Number of volumes: %d" % N)
-            print("[VolumesCDF] Calculating CRPS ...\n")
+            if referenceStore.Has( segFilePath ):
+                precomputedReference = referenceStore.Load( segFilePath )
+                pixelVolume = np.prod( precomputedReference.spacing )
 
-            mSum = 0
+                return np.array( [ precomputedReference.numberOfPixels.get( label, 0 ) * pixelVolume * MM_TO_ML_FACTOR for label in LABEL ] )
 
-            #-----------------------------------------------------------------------
-            # volumeData  data of the m-th volume
-            #     m       index across volumes (cases)
-            #     n       index across the cdf
-            #-----------------------------------------------------------------------        
-            for index, volumeData in self.volumesData.iterrows():
-                print("\tReading data from %s (%.4f mL) ..." % (volumeData[0], volumeData[1]))
+        image = readLabelImage( segFilePath, memoryMap )
+        labelPixels = np.bincount( getImageArray( image ).ravel(), minlength=max( LABEL ) + 1 )
+        pixelVolume = np.prod( image.GetSpacing() )
 
-                elementsInARow = int ( volumeData.shape[0] ) 
+        return np.array( [ labelPixels[label] * pixelVolume * MM_TO_ML_FACTOR for label in LABEL ] )
 
-                if (elementsInARow < MAX_VOLUME+2):
-                    print("\tThe row %d does not have the number of elemens required (ID, VOL, P0, P1, P2,... P599) ...\n" % index)
-                    return crps
+    except Exception as exception:
+        log.error("[computeLabelVolumes Exception] %s" % str(exception))
+        log.error("[computeLabelVolumes Exception] %s" % str(traceback.format_exc()))
 
-                # n:[0,599]
-                n = 0
+        return volumes
 
-                # V is the actual volume (in mL) 
-                Vm = volumeData[1]
 
-                nSum = 0
+def readLabelImage( filePath, memoryMap=False ):
+    """
+    Read a label image: sitk.Image cast to UInt16 or, with memoryMap, a
+    LabelImage memory-mapping the data of an uncompressed NIfTI-1 file
+    (.nii, 3D, integer labels of NIFTI_LABEL_TYPES, no intensity scaling)
+    without copy or cast. The geometry is read from the header by
+    SimpleITK. Other files are read by SimpleITK.
+    """
+    if memoryMap:
+        labelImage = mapNiftiLabelImage( filePath )
 
-                for j in range(2, MAX_VOLUME+2):
-                    # $P(y \le n)$
-                    Pn = volumeData[j]
+        if labelImage is not None:
+            return labelImage
 
-                    if not isinstance(Pn, float):
-                        print("\tThe row %d has a corrupted element!\n" % index)
-                        return crps                   
+    return sitk.Cast( sitk.ReadImage( filePath ), sitk.sitkUInt16 )
 
-                    if np.isnan(Pn):
-                        print("\tThe row %d has a corrupted element!\n" % index)
-                        return crps
 
-                    # \sum_{n=0}^{599} \left( P(y \le n) - H(n-V_{m}) \right)^2
-                    nSum += np.power(  Pn - self.H(n-Vm), 2 )
-                    n += 1
+def mapNiftiLabelImage( filePath ):
+    """
+    Return a memory-mapped LabelImage of an uncompressed NIfTI-1 label
+    file, None if the file cannot be mapped (see readLabelImage).
+    """
+    if not str(filePath).endswith(".nii"):
+        return None
 
-                mSum += nSum
+    try:
+        with open( filePath, "rb" ) as niftiFile:
+            header = niftiFile.read( 348 )
 
-            crps = 1/(MAX_VOLUME*N) * mSum
+        if len(header) < 348:
+            return None
 
-            return np.round(crps, ROUND_DECIMALS)
+        byteOrder = "<" if np.frombuffer( header, dtype="<i4", count=1 )[0] == 348 else ">"
 
-        except Exception as exception:
-            log.error("[VolumesCDF::Load Exception] %s" % str(exception))
-            log.error("[VolumesCDF::Load Exception] %s" % str(traceback.format_exc()))
+        if np.frombuffer( header, dtype=byteOrder + "i4", count=1 )[0] != 348 or header[344:348] != b"n+1\0":
+            return None
 
-            return 0
+        dim = np.frombuffer( header, dtype=byteOrder + "i2", count=8, offset=40 )
+        datatype = int( np.frombuffer( header, dtype=byteOrder + "i2", count=1, offset=70 )[0] )
+        voxOffset = int( np.frombuffer( header, dtype=byteOrder + "f4", count=1, offset=108 )[0] )
+        sclSlope, sclInter = np.frombuffer( header, dtype=byteOrder + "f4", count=2, offset=112 )
 
+        if (dim[0] != 3) or (datatype not in NIFTI_LABEL_TYPES):
+            return None
 
-    @staticmethod
-    def GetDummyCDF( volume ):
-        """
-        Returns cumulative probability distribution.
-        """
-        cdf = np.zeros( MAX_VOLUME )
+        if not ( (sclSlope in (0.0, 1.0)) and (sclInter == 0.0) ):
+            return None
 
-        if (volume > 0) and (volume < MAX_VOLUME):
-            volumeIndex = int( np.fix( volume ) )
-            cdf[volumeIndex:] = 1
+        shape = ( int(dim[3]), int(dim[2]), int(dim[1]) )       # z-y-x order
+        array = np.memmap( filePath, dtype=np.dtype(NIFTI_LABEL_TYPES[datatype]).newbyteorder(byteOrder),
+                           mode="r", offset=voxOffset, shape=shape )
 
-        return cdf
+        if (array.dtype.kind == "i") and (array.min() < 0):
+            return None     # Negative labels: UInt16 cast semantics.
 
+        reader = sitk.ImageFileReader()
+        reader.SetFileName( str(filePath) )
+        reader.ReadImageInformation()
 
-#-------------------------------------------------------------------------------
-# LOG
-#-------------------------------------------------------------------------------
-log = logging.getLogger('myosaiq')
-log.setLevel(logging.ERROR)
+        return LabelImage( array, reader.GetSpacing(), reader.GetOrigin(), reader.GetDirection() )
 
-logFormatter = logging.Formatter("[%(asctime)s] %(name)s - %(levelname)s %(message)s")
-logFileHandler = logging.FileHandler('myosaiq_stderr.log')
-logFileHandler.setFormatter(logFormatter)
-log.addHandler(logFileHandler)
+    except Exception as exception:
+        log.error("[mapNiftiLabelImage Exception] %s" % str(exception))
 
+        return None
 
-def verifyFile( filePath ):
+
+def getImageArray( image ):
     """
-    Verify file path.
+    Return the pixel array (z-y-x order, no copy) of a sitk.Image or
+    LabelImage.
     """
-    if os.path.isfile( filePath ):
-        return True
-    
-    else:
-        return False 
+    if isinstance( image, LabelImage ):
+        return image.GetArray()
+
+    return sitk.GetArrayViewFromImage( image )
+
+
+def getTimingsDataFrame( records ):
+    """
+    Return timing records (see StageProfiler) as a DataFrame, with empty
+    labels for whole-case stages.
+    """
+    dataFrame = pd.DataFrame( data=records, columns=TIMING_COLUMNS )
+    dataFrame["LABEL"] = dataFrame["LABEL"].astype( "Int64" )
+
+    return dataFrame
+
+
+def getTypedDataFrame( dataFrame ):
+    """
+    Return a copy of a results data frame with typed columns for binary
+    export: string identifiers, categorical labels and metrics, float64
+    values.
+    """
+    dataFrame = dataFrame.copy()
+    dataFrame["SEGMENTATION ID"] = dataFrame["SEGMENTATION ID"].astype( "string" )
+
+    for column in [ "LABEL", "METRIC" ]:
+        if column in dataFrame.columns:
+            dataFrame[column] = dataFrame[column].astype( "category" )
+
+    return dataFrame
+
+
+def getBoundingBox( maskArray ):
+    """
+    Return the bounding box (index..., size...) of a 3D mask array
+    (z-y-x order) in image (x-y-z) order, None if the mask is empty.
+    """
+    slices = np.flatnonzero( maskArray.reshape(maskArray.shape[0], -1).any(axis=1) )
+
+    if slices.size == 0:
+        return None
+
+    sliceMask = maskArray[ slices[0]:slices[-1] + 1 ].any( axis=0 )
+
+    rows = np.flatnonzero( sliceMask.any(axis=1) )
+    columns = np.flatnonzero( sliceMask.any(axis=0) )
+
+    return ( int(columns[0]), int(rows[0]), int(slices[0]),
+             int(columns[-1] - columns[0] + 1), int(rows[-1] - rows[0] + 1), int(slices[-1] - slices[0] + 1) )
+
+
+def getRegionSlices( regionIndex, regionSize ):
+    """
+    Return the array slices (z-y-x order) of a region of interest given as
+    index and size (x-y-z order).
+    """
+    return tuple( slice(index, index + size) for index, size in zip(reversed(regionIndex), reversed(regionSize)) )
+
+
+def getMaskRegionSlices( maskArray, margin ):
+    """
+    Return the slices (NumPy order) of the bounding box of a non-empty
+    mask array, padded by margin pixels and clipped to the array.
+    """
+    region = []
+
+    for axis in range( maskArray.ndim ):
+        indices = np.flatnonzero( maskArray.any( axis=tuple(otherAxis for otherAxis in range(maskArray.ndim) if otherAxis != axis) ) )
+        region.append( slice( max(0, indices[0] - margin), min(maskArray.shape[axis], indices[-1] + 1 + margin) ) )
+
+    return tuple( region )
+
+
+def getSurfaceDistances( referenceMaskArray, targetMaskArray, spacing, surfaceEngine=SURFACE_ENGINE_DISTANCE_MAP ):
+    """
+    Return the surface distance engine of two mask arrays (NumPy order,
+    spacing in image order), e.g. 2D slices.
+    """
+    if surfaceEngine == SURFACE_ENGINE_KDTREE:
+        return KDTreeSurfaceDistances( referenceMaskArray, targetMaskArray, spacing )
+
+    return DistanceMapSurfaceDistances( referenceMaskArray, None, None, targetMaskArray, spacing )
+
+
+def getContourArray( maskArray ):
+    """
+    Return the contour (LabelContour) of a mask array.
+    """
+    return sitk.GetArrayFromImage( sitk.LabelContour( sitk.GetImageFromArray(maskArray.astype(np.uint8)) ) ) != 0
+
+
+def getSliceDistanceMap( maskArray, inPlaneSpacing=(1.0, 1.0) ):
+    """
+    Return the squared in-plane distances of the pixels of a mask array
+    (z-y-x or y-x order) to the contour of the mask (the one of
+    SignedMaurerDistanceMap, found in 3D) in their own slice, inf in
+    slices without contour pixels (Float32). inPlaneSpacing (x-y order)
+    defaults to pixel units.
+
+    A single SignedMaurerDistanceMap with slices far apart: distances to
+    other slices follow from getSliceDistances, in voxel or physical units.
+    """
+    mask = sitk.GetImageFromArray( maskArray.astype(np.uint8) )
+
+    if maskArray.ndim == 2:
+        mask.SetSpacing( tuple( inPlaneSpacing ) )
+
+        return np.abs( sitk.GetArrayFromImage( sitk.SignedMaurerDistanceMap(mask, squaredDistance=True, useImageSpacing=True) ) )
+
+    # Larger than any in-plane distance.
+    sliceSpacing = float( max(inPlaneSpacing) * (maskArray.shape[1] + maskArray.shape[2]) )
+    mask.SetSpacing( tuple( inPlaneSpacing ) + (sliceSpacing,) )
+
+    sliceDistanceArray = np.abs( sitk.GetArrayFromImage( sitk.SignedMaurerDistanceMap(mask, squaredDistance=True, useImageSpacing=True) ) )
+    sliceDistanceArray[ sliceDistanceArray >= sliceSpacing**2 ] = np.inf
+
+    return sliceDistanceArray
+
+
+def getSliceDistances( sliceDistanceArray, indices, inPlaneWeight, sliceWeight ):
+    """
+    Return the distances of pixels (indices, e.g. np.nonzero of a mask) to
+    the contour of a slice distance map (see getSliceDistanceMap): square
+    root of the smallest inPlaneWeight * (in-plane squared distance) +
+    sliceWeight * (slice offset)^2 over all slices, as in the last pass of
+    a separable distance transform. Weights are squared spacings (1 for
+    voxel units). Slice offsets grow only for the pixels they can still
+    bring closer.
+    """
+    if sliceDistanceArray.ndim == 2:
+        return np.sqrt( inPlaneWeight * sliceDistanceArray[indices].astype(np.float64) )
+
+    sliceIndices, rowIndices, columnIndices = indices
+    numberOfSlices = sliceDistanceArray.shape[0]
+
+    squaredDistances = inPlaneWeight * sliceDistanceArray[indices].astype(np.float64)
+
+    for offset in range( 1, numberOfSlices ):
+        offsetWeight = sliceWeight * offset**2
+        points = np.flatnonzero( squaredDistances > offsetWeight )
+
+        if points.size == 0:
+            break
+
+        for neighbourSlices in ( sliceIndices[points] - offset, sliceIndices[points] + offset ):
+            inside = (neighbourSlices >= 0) & (neighbourSlices < numberOfSlices)
+            neighbourPoints = points[inside]
+
+            squaredDistances[neighbourPoints] = np.minimum( squaredDistances[neighbourPoints],
+                                                            inPlaneWeight * sliceDistanceArray[ neighbourSlices[inside], rowIndices[neighbourPoints], columnIndices[neighbourPoints] ] + offsetWeight )
+
+    return np.sqrt( squaredDistances )
+
+
+def hashFile( filePath ):
+    """
+    Return the SHA-256 (hexadecimal) of a file content.
+    """
+    fileHash = hashlib.sha256()
+
+    with open( filePath, "rb" ) as inputFile:
+        for chunk in iter( lambda: inputFile.read(1024 * 1024), b"" ):
+            fileHash.update( chunk )
+
+    return fileHash.hexdigest()
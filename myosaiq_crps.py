@@ -0,0 +1,474 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name        : myosaiq_crps.py
+# Description : CRPS of cumulative volume distributions and shared helpers.
+#               Only depends on NumPy (fast start-up, no imaging libraries).
+#
+# Authors     : William A. Romero R.  <romero@creatis.insa-lyon.fr>
+#                                     <contact@waromero.com>
+#-------------------------------------------------------------------------------
+import os
+import csv
+import zipfile
+import logging
+import warnings
+import traceback
+
+import numpy as np
+
+#-------------------------------------------------------------------------------
+# DEFS
+#-------------------------------------------------------------------------------
+ROUND_DECIMALS = 4
+
+MAX_VOLUME = 600            # in mL
+
+CRPS_CHUNK_ROWS = 4096      # CDF rows scored at once (bounded memory)
+
+#-------------------------------------------------------------------------------
+# LOG
+#-------------------------------------------------------------------------------
+log = logging.getLogger('myosaiq')
+log.setLevel(logging.ERROR)
+
+logFormatter = logging.Formatter("[%(asctime)s] %(name)s - %(levelname)s %(message)s")
+logFileHandler = logging.FileHandler('myosaiq_stderr.log', delay=True)    # File created on first error.
+logFileHandler.setFormatter(logFormatter)
+log.addHandler(logFileHandler)
+
+
+def verifyFile( filePath ):
+    """
+    Verify file path.
+    """
+    if os.path.isfile( filePath ):
+        return True
+
+    else:
+        return False
+
+
+#-------------------------------------------------------------------------------
+# CRPS
+#-------------------------------------------------------------------------------
+class VolumesCDFException(Exception):
+    """
+    Default manager exception class.
+    """
+
+
+class VolumesCDF(object):
+    """
+    Class for the management of cumulative probability distribution's file.
+
+    File formats:
+
+        .csv  ID, VOL, P0, P1, ... P599 columns.
+        .npy  2D float array, one row per volume: VOL, P0, P1, ... P599
+              (memory-mapped). IDs in an optional <name>.ids text file (one
+              per line), row numbers otherwise.
+        .npz  ID (optional), VOL (N) and P (N x 600) arrays. P is
+              memory-mapped when the archive is not compressed (np.savez).
+
+    Submissions scored against segmentations (see SegmentationsCRPS) are
+    keyed by case ID and label instead of volume: ID, LABEL, P0, P1, ...
+    P599 columns (.csv) or ID, LABEL and P arrays (.npz). VOL is then
+    optional (NaN).
+    """
+    def __init__( self, inputFilePath ):
+        """
+        Default constructor.
+        """
+        self.FILE_PATH = None
+        self.NUM_VOLUMES = 0
+
+        self.volumeList = None      # [ ID, ... ]
+        self.labelList = None       # [ LABEL, ... ] (labelled submissions)
+        self.volumes = None         # VOL of each row (NaN if not numeric or missing)
+        self.cdfs = None            # P0, P1, ... of each row (may be memory-mapped)
+        self.columns = None         # ID, VOL, P0, P1, ... (CSV files)
+
+        self.casesCRPS = None
+
+        if verifyFile( inputFilePath ):
+            self.FILE_PATH = inputFilePath
+            self.__Load()
+        else:
+            print("[VolumesCDF] File does not exist!")
+
+
+    def __str__( self ):
+        """
+        Default String obj.
+        """
+        volumesCDFStr = "\n[VolumesCDF]\n\n"
+        volumesCDFStr += "Input file: \n\t%s\n\n" % self.FILE_PATH
+
+        if self.volumeList is not None:
+            volumesCDFStr += "Contents (Volume ID) : \n"
+            for volumeID in self.volumeList:
+                volumesCDFStr += "\t" + volumeID
+                volumesCDFStr += "\n"
+            volumesCDFStr += "\nTotal: %d volumes.\n\n" % self.NUM_VOLUMES
+
+        return volumesCDFStr
+
+
+    def __Load( self ):
+        """
+        Load volumes CDF data (see file formats).
+        """
+        try:
+            extension = os.path.splitext( self.FILE_PATH )[1].lower()
+
+            if extension == ".npy":
+                self.__LoadNpy()
+
+            elif extension == ".npz":
+                self.__LoadNpz()
+
+            else:
+                self.__LoadCSV()
+
+            self.NUM_VOLUMES = sum( 1 for volumeID in self.volumeList if volumeID != "" )
+
+        except Exception as exception:
+            self.volumes = None
+            self.cdfs = None
+            self.volumeList = None
+            self.labelList = None
+
+            log.error("[VolumesCDF::Load Exception] %s" % str(exception))
+            log.error("[VolumesCDF::Load Exception] %s" % str(traceback.format_exc()))
+
+
+    def __LoadCSV( self ):
+        """
+        Load volumes CDF data from csv file: NumPy parser, or csv module
+        when rows are incomplete or not numeric (rows padded to the header
+        width, blank lines skipped).
+        """
+        with open( self.FILE_PATH, newline="" ) as csvFile:
+            self.columns = next( csv.reader( csvFile ) )
+
+        # ID, LABEL, P0, P1, ... (labelled submission) or ID, VOL, P0, P1, ...
+        labelled = (len(self.columns) > 1) and (self.columns[1].strip().upper() == "LABEL")
+        first = 2 if labelled else 1
+        width = len(self.columns) - first
+
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter( "ignore", category=UserWarning )     # Header only.
+
+                volumesData = np.loadtxt( self.FILE_PATH, delimiter=",", skiprows=1, usecols=range(first, first + width),
+                                          quotechar='"', ndmin=2 ).reshape( -1, width )
+                keys = np.loadtxt( self.FILE_PATH, delimiter=",", skiprows=1, usecols=range(first), dtype=str,
+                                   quotechar='"', ndmin=2 ).reshape( -1, first )
+
+        except ValueError:
+            with open( self.FILE_PATH, newline="" ) as csvFile:
+                rows = [ row for row in csv.reader( csvFile ) if row ][1:]
+
+            # Non numeric or missing elements: NaN.
+            volumesData = np.array( [ [ toFloat(value) for value in row[first:first + width] ] + [ np.NaN ] * (first + width - len(row))
+                                      for row in rows ], dtype=np.float64 ).reshape( len(rows), width )
+            keys = np.array( [ (row + [ "" ] * first)[:first] for row in rows ], dtype=str ).reshape( -1, first )
+
+        self.volumeList = keys[:, 0].tolist()
+
+        if labelled:
+            self.labelList = [ label.strip() for label in keys[:, 1].tolist() ]
+            self.volumes = np.full( volumesData.shape[0], np.NaN )
+            self.cdfs = volumesData
+
+        else:
+            self.volumes = volumesData[:, 0]
+            self.cdfs = volumesData[:, 1:]
+
+
+    def __LoadNpy( self ):
+        """
+        Memory-map volumes CDF data from a .npy file (VOL, P0, P1, ...
+        rows) and read IDs from the <name>.ids file, if any.
+        """
+        volumesData = np.load( self.FILE_PATH, mmap_mode="r" )
+
+        if volumesData.ndim != 2:
+            raise VolumesCDFException( "%s: 2D array (VOL, P0, P1, ... rows) expected." % self.FILE_PATH )
+
+        self.volumes = volumesData[:, 0]
+        self.cdfs = volumesData[:, 1:]
+        self.volumeList = self.__ReadIDs( os.path.splitext( self.FILE_PATH )[0] + ".ids", volumesData.shape[0] )
+
+
+    def __LoadNpz( self ):
+        """
+        Load volumes CDF data from a .npz file (ID, VOL and P arrays), P
+        memory-mapped if not compressed.
+        """
+        with np.load( self.FILE_PATH ) as volumesData:
+            volumeList = None
+
+            if "ID" in volumesData.files:
+                volumeList = [ str(volumeID) for volumeID in volumesData["ID"] ]
+
+            if "LABEL" in volumesData.files:
+                self.labelList = [ str(label).strip() for label in volumesData["LABEL"] ]
+
+            self.cdfs = mapNpzArray( self.FILE_PATH, "P" )
+
+            if self.cdfs is None:
+                self.cdfs = volumesData["P"]
+
+            if ("VOL" not in volumesData.files) and (self.labelList is not None):
+                self.volumes = np.full( self.cdfs.shape[0], np.NaN )
+            else:
+                self.volumes = np.asarray( volumesData["VOL"], dtype=np.float64 ).reshape(-1)
+
+        if (self.cdfs.ndim != 2) or (self.cdfs.shape[0] != self.volumes.shape[0]):
+            raise VolumesCDFException( "%s: P (N x %d) and VOL (N) arrays expected." % (self.FILE_PATH, MAX_VOLUME) )
+
+        if (self.labelList is not None) and (len(self.labelList) != self.volumes.shape[0]):
+            raise VolumesCDFException( "%s: LABEL (N) array expected." % self.FILE_PATH )
+
+        if volumeList is None:
+            volumeList = [ str(row) for row in range(self.volumes.shape[0]) ]
+
+        self.volumeList = volumeList
+
+
+    @staticmethod
+    def __ReadIDs( filePath, numberOfRows ):
+        """
+        Return the IDs of an ID file (one per line), row numbers when the
+        file does not exist.
+        """
+        if not verifyFile( filePath ):
+            return [ str(row) for row in range(numberOfRows) ]
+
+        with open( filePath ) as idFile:
+            volumeList = [ line.strip() for line in idFile if line.strip() ]
+
+        if len(volumeList) != numberOfRows:
+            raise VolumesCDFException( "%s: %d IDs for %d rows." % (filePath, len(volumeList), numberOfRows) )
+
+        return volumeList
+
+
+    def H(self, x):
+        """
+        Heaviside step function:
+            1 if x is positive or zero, 0 otherwise
+
+        H(x) = \left\{ \begin{array}{cl}
+                        1 & : \ x \ge 0 \\
+                        0 & : \text{Otherwise}
+               \end{array} \right.
+
+        """
+        if x < 0.0:
+            return 0
+        return 1
+
+
+    def CalcCRPS( self ):
+        """
+        Calculate Continuous Ranked Probability Score (CRPS).
+
+        CDF rows are scored as (CRPS_CHUNK_ROWS x 600) matrices, so memory
+        is bounded for memory-mapped files; per-case scores are available
+        afterwards in casesCRPS ({ "ID", "VOL", "CRPS" } arrays).
+        """
+
+        crps = 0
+
+        if self.cdfs is None:
+            return crps
+
+        try:
+            # N is the number of rows in the test set (equal to twice the number of cases)
+            N = self.NUM_VOLUMES
+            print("[VolumesCDF] Number of volumes: %d" % N)
+            print("[VolumesCDF] Calculating CRPS ...\n")
+
+            if N == 0:
+                return crps
+
+            if self.cdfs.shape[1] < MAX_VOLUME:
+                self.__PrintVolumes( 1 )
+                print("\tThe row %d does not have the number of elemens required (ID, VOL, P0, P1, P2,... P599) ...\n" % 0)
+                return crps
+
+            nSum, corruptedRow = calcCRPSSums( self.volumes, self.cdfs )
+
+            if corruptedRow is not None:
+                self.__PrintVolumes( corruptedRow + 1 )
+                print("\tThe row %d has a corrupted element!\n" % corruptedRow)
+                return crps
+
+            self.__PrintVolumes( len(self.volumes) )
+
+            self.casesCRPS = { "ID":np.array( self.volumeList, dtype=object ),
+                               "VOL":np.asarray( self.volumes, dtype=np.float64 ),
+                               "CRPS":nSum / MAX_VOLUME }
+
+            crps = 1/(MAX_VOLUME*N) * nSum.sum()
+
+            return np.round(crps, ROUND_DECIMALS)
+
+        except Exception as exception:
+            log.error("[VolumesCDF::CalcCRPS Exception] %s" % str(exception))
+            log.error("[VolumesCDF::CalcCRPS Exception] %s" % str(traceback.format_exc()))
+
+            return 0
+
+
+    def __PrintVolumes( self, numberOfRows ):
+        """
+        Print the ID and volume of the first rows (the rows read before the
+        result or the first error).
+        """
+        for volumeID, volume in zip( self.volumeList[:numberOfRows], self.volumes[:numberOfRows] ):
+            print("\tReading data from %s (%.4f mL) ..." % (volumeID, volume))
+
+
+    def Save( self, filePath ):
+        """
+        Save volumes CDF data as .npy (float32, with a <name>.ids file) or
+        uncompressed .npz (memory-mapped when loaded, see file formats).
+        """
+        try:
+            cdfs = np.asarray( self.cdfs[:, :MAX_VOLUME], dtype=np.float32 )
+
+            if filePath.lower().endswith(".npz"):
+                arrays = { "ID":np.array( self.volumeList, dtype=str ), "VOL":np.asarray( self.volumes, dtype=np.float64 ), "P":cdfs }
+
+                if self.labelList is not None:
+                    arrays["LABEL"] = np.array( self.labelList, dtype=str )
+
+                np.savez( filePath, **arrays )
+
+            elif self.labelList is not None:
+                raise VolumesCDFException( "%s: labelled CDFs are saved as .npz files." % filePath )
+
+            else:
+                np.save( filePath, np.column_stack( (np.asarray(self.volumes, dtype=np.float32), cdfs) ) )
+
+                with open( os.path.splitext( filePath )[0] + ".ids", "w" ) as idFile:
+                    idFile.writelines( "%s\n" % volumeID for volumeID in self.volumeList )
+
+            print("[VolumesCDF::Save] Volumes CDF to file done!")
+
+        except Exception as exception:
+            log.error("[VolumesCDF::Save Exception] %s" % str(exception))
+            log.error("[VolumesCDF::Save Exception] %s" % str(traceback.format_exc()))
+
+
+    @staticmethod
+    def GetDummyCDF( volume ):
+        """
+        Returns cumulative probability distribution.
+        """
+        cdf = np.zeros( MAX_VOLUME )
+
+        if (volume > 0) and (volume < MAX_VOLUME):
+            volumeIndex = int( np.fix( volume ) )
+            cdf[volumeIndex:] = 1
+
+        return cdf
+
+
+def calcCRPSSums( volumes, cdfs, rows=None ):
+    """
+    Return the CRPS sums of CDF rows, \sum_{n=0}^{599} (P(y <= n) - H(n - V))^2,
+    and the first corrupted row (None if there is none). Rows are scored as
+    (CRPS_CHUNK_ROWS x 600) matrices; rows selects the CDF rows of volumes
+    (all rows by default).
+    """
+    numberOfRows = len(volumes)
+    nSum = np.empty( numberOfRows )
+
+    #---------------------------------------------------------------------------
+    # Vm      actual volume of the m-th case (in mL), shape (rows, 1)
+    # P       $P(y \le n)$, shape (rows, 600)
+    # n       index across the cdf, shape (1, 600)
+    #---------------------------------------------------------------------------
+    n = np.arange( MAX_VOLUME, dtype=np.float64 )[np.newaxis, :]
+
+    for start in range( 0, numberOfRows, CRPS_CHUNK_ROWS ):
+        stop = min( start + CRPS_CHUNK_ROWS, numberOfRows )
+
+        Vm = np.asarray( volumes[start:stop], dtype=np.float64 )[:, np.newaxis]
+
+        if rows is None:
+            P = np.array( cdfs[start:stop, :MAX_VOLUME], dtype=np.float64 )         # Copy, updated in place
+        else:
+            P = np.array( cdfs[rows[start:stop], :MAX_VOLUME], dtype=np.float64 )
+
+        # Non numeric and missing elements are both NaN after conversion.
+        corrupted = np.isnan(P).any( axis=1 )
+
+        if corrupted.any():
+            corruptedRow = start + int( np.argmax(corrupted) )
+            return nSum, (corruptedRow if rows is None else int( rows[corruptedRow] ))
+
+        # H(n - V_{m}), written as NOT (x < 0) to match H() for NaN volumes.
+        heaviside = ~( (n - Vm) < 0.0 )
+
+        # \sum_{n=0}^{599} \left( P(y \le n) - H(n-V_{m}) \right)^2
+        P -= heaviside
+        nSum[start:stop] = np.square( P, out=P ).sum( axis=1 )
+
+    return nSum, None
+
+
+def toFloat( value ):
+    """
+    Convert a CSV field to float, NaN if not numeric.
+    """
+    try:
+        return float( value )
+
+    except ValueError:
+        return np.NaN
+
+
+def mapNpzArray( filePath, name ):
+    """
+    Memory-map an array stored without compression in a .npz file (e.g.
+    np.savez), None if it is compressed or cannot be mapped.
+    """
+    with zipfile.ZipFile( filePath ) as npzFile:
+        info = npzFile.getinfo( name + ".npy" )
+
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+
+    with open( filePath, "rb" ) as npzFile:
+        # Local file header: 30 bytes, file name and extra field lengths at 26.
+        npzFile.seek( info.header_offset )
+        localHeader = npzFile.read( 30 )
+
+        nameLength = int.from_bytes( localHeader[26:28], "little" )
+        extraLength = int.from_bytes( localHeader[28:30], "little" )
+
+        npzFile.seek( info.header_offset + 30 + nameLength + extraLength )
+
+        version = np.lib.format.read_magic( npzFile )
+
+        if version == (1, 0):
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0( npzFile )
+
+        elif version == (2, 0):
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0( npzFile )
+
+        else:
+            return None
+
+        offset = npzFile.tell()
+
+    if dtype.hasobject:
+        return None
+
+    return np.memmap( filePath, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortranOrder else "C" )
@@ -0,0 +1,21 @@
+#-------------------------------------------------------------------------------
+# Name        : conftest.py
+# Description : Shared fixtures: synthetic cardiac phantom cohorts.
+#-------------------------------------------------------------------------------
+import os
+import sys
+
+import pytest
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+
+from benchmark import makeCohort
+
+
+@pytest.fixture( scope="session" )
+def cohort( tmp_path_factory ):
+    """
+    Segmentation list (CSV file) of 6 reference/target phantom pairs,
+    64 x 64 pixels, 8 mm slices.
+    """
+    return makeCohort( str( tmp_path_factory.mktemp("cohort") ), 6, 64, 8.0, seed=1 )
@@ -0,0 +1,84 @@
+#-------------------------------------------------------------------------------
+# Name        : test_cache.py
+# Description : Results cache: cached and computed results are the same,
+#               failed and unreadable entries are computed again.
+#-------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from myosaiq import AssessSegmentations, ResultsCache, SURFACE_ENGINE_KDTREE
+
+
+def assess( cohort, cacheDir, **options ):
+    aSegmentations = AssessSegmentations( cohort, cacheDir=str(cacheDir), **options )
+    aSegmentations.Compute()
+
+    return aSegmentations
+
+
+def test_cache_hit_equals_miss( cohort, tmp_path ):
+    computed = assess( cohort, tmp_path )
+    cached = assess( cohort, tmp_path )
+
+    pd.testing.assert_frame_equal( cached.GetDataFrame(), computed.GetDataFrame() )
+
+
+def test_cache_replays_slice_metrics( cohort, tmp_path ):
+    computed = assess( cohort, tmp_path, sliceWise=True )
+    cached = assess( cohort, tmp_path, sliceWise=True )
+
+    assert len( computed.GetSliceDataFrame() ) > 0
+
+    pd.testing.assert_frame_equal( cached.GetSliceDataFrame(), computed.GetSliceDataFrame() )
+    pd.testing.assert_frame_equal( cached.GetDataFrame(), computed.GetDataFrame() )
+
+
+def test_cache_key_includes_surface_engine( cohort, tmp_path ):
+    assess( cohort, tmp_path )
+    numberOfEntries = len( list( tmp_path.glob("*.pkl") ) )
+
+    # Results of another engine are computed and stored, not read back.
+    assess( cohort, tmp_path, surfaceEngine=SURFACE_ENGINE_KDTREE )
+
+    assert numberOfEntries > 0
+    assert len( list( tmp_path.glob("*.pkl") ) ) == 2 * numberOfEntries
+
+
+def test_cache_skips_failed_assessments( cohort, tmp_path ):
+    refSegFilePath = pd.read_csv( cohort )["REFERENCE"].values[0]
+
+    corruptedFilePath = tmp_path / "corrupted.nii.gz"
+    corruptedFilePath.write_bytes( b"not an image" )
+
+    failedCohort = tmp_path / "failed.csv"
+    pd.DataFrame( { "REFERENCE":[ refSegFilePath ], "TARGET":[ str(corruptedFilePath) ] } ).to_csv( failedCohort, index=False )
+
+    cacheDir = tmp_path / "cache"
+    aSegmentations = assess( failedCohort, cacheDir )
+
+    assert np.isnan( aSegmentations.assessments[0].referenceMetrics.DICE[1].value )
+    assert not list( cacheDir.glob("*.pkl") )
+
+
+def test_cache_recomputes_unreadable_entries( cohort, tmp_path ):
+    computed = assess( cohort, tmp_path )
+
+    refSegFilePath, tarSegFilePath = pd.read_csv( cohort )[ ["REFERENCE", "TARGET"] ].values[0]
+
+    cache = ResultsCache( str(tmp_path) )
+    key = cache.GetKey( refSegFilePath, tarSegFilePath )
+    entryPath = tmp_path / (key + ".pkl")
+
+    assert entryPath.is_file()
+    entryPath.write_bytes( b"corrupted" )
+
+    # Unreadable entry: a miss, and removed.
+    assert cache.Get( key, refSegFilePath, tarSegFilePath ) is None
+    assert not entryPath.exists()
+
+    recomputed = assess( cohort, tmp_path )
+
+    assert entryPath.is_file()
+    assert cache.Get( key, refSegFilePath, tarSegFilePath ) is not None
+
+    pd.testing.assert_frame_equal( recomputed.GetDataFrame(), computed.GetDataFrame() )
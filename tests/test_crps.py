@@ -0,0 +1,54 @@
+#-------------------------------------------------------------------------------
+# Name        : test_crps.py
+# Description : Chunked CRPS scoring matches the unchunked (row by row) score.
+#-------------------------------------------------------------------------------
+import numpy as np
+import pytest
+
+import myosaiq_crps
+from myosaiq_crps import VolumesCDF, MAX_VOLUME
+
+from benchmark import makeCDFFile
+
+
+NUMBER_OF_VOLUMES = 50
+
+
+@pytest.fixture( scope="module" )
+def cdfFile( tmp_path_factory ):
+    return makeCDFFile( str( tmp_path_factory.mktemp("cdf") / "cdf.csv" ), NUMBER_OF_VOLUMES, seed=1 )
+
+
+def calcCasesCRPS( volumesCDF ):
+    """
+    Per-case CRPS, row by row with the Heaviside step function.
+    """
+    return np.array( [ sum( (volumesCDF.cdfs[row, n] - volumesCDF.H(n - volumesCDF.volumes[row]))**2 for n in range(MAX_VOLUME) ) / MAX_VOLUME
+                       for row in range( volumesCDF.NUM_VOLUMES ) ] )
+
+
+@pytest.mark.parametrize( "chunkRows", [ 1, 7, NUMBER_OF_VOLUMES, 4096 ] )
+def test_chunked_crps_matches_unchunked( cdfFile, monkeypatch, chunkRows ):
+    volumesCDF = VolumesCDF( cdfFile )
+    expected = calcCasesCRPS( volumesCDF )
+
+    monkeypatch.setattr( myosaiq_crps, "CRPS_CHUNK_ROWS", chunkRows )
+    crps = volumesCDF.CalcCRPS()
+
+    np.testing.assert_allclose( volumesCDF.casesCRPS["CRPS"], expected, rtol=1e-12 )
+    assert crps == np.round( expected.mean(), myosaiq_crps.ROUND_DECIMALS )
+
+
+@pytest.mark.parametrize( "extension", [ ".npy", ".npz" ] )
+def test_memory_mapped_crps_matches_csv( cdfFile, tmp_path, monkeypatch, extension ):
+    volumesCDF = VolumesCDF( cdfFile )
+    crps = volumesCDF.CalcCRPS()
+
+    binaryFile = str( tmp_path / ("cdf" + extension) )
+    volumesCDF.Save( binaryFile )
+
+    monkeypatch.setattr( myosaiq_crps, "CRPS_CHUNK_ROWS", 7 )
+    binaryVolumesCDF = VolumesCDF( binaryFile )
+
+    assert binaryVolumesCDF.CalcCRPS() == crps
+    np.testing.assert_allclose( binaryVolumesCDF.casesCRPS["CRPS"], volumesCDF.casesCRPS["CRPS"], atol=1e-5 )
@@ -0,0 +1,111 @@
+#-------------------------------------------------------------------------------
+# Name        : test_distance_maps.py
+# Description : Distance map engine: one SignedMaurerDistanceMap per mask,
+#               distances equal to the ones of full distance maps.
+#-------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+import pytest
+import SimpleITK as sitk
+
+import myosaiq
+from myosaiq import AssessSegmentation, DistanceMapSurfaceDistances, LABEL, ReferenceStore
+
+
+DISTANCE_TOLERANCE = 1e-4       # float32 precision of the distance maps
+
+
+@pytest.fixture
+def maurerCalls( monkeypatch ):
+    """
+    Count the SignedMaurerDistanceMap calls.
+    """
+    calls = []
+    signedMaurerDistanceMap = sitk.SignedMaurerDistanceMap
+
+    def countedSignedMaurerDistanceMap( *args, **kwargs ):
+        calls.append( args[0].GetSize() )
+        return signedMaurerDistanceMap( *args, **kwargs )
+
+    monkeypatch.setattr( sitk, "SignedMaurerDistanceMap", countedSignedMaurerDistanceMap )
+
+    return calls
+
+
+def test_one_distance_map_per_mask( cohort, monkeypatch, maurerCalls ):
+    monkeypatch.setattr( myosaiq, "SPARSE_LABEL_MAX_PIXELS", 0 )
+
+    refSegFilePath, tarSegFilePath = pd.read_csv( cohort )[ ["REFERENCE", "TARGET"] ].values[0]
+
+    aseg = AssessSegmentation( refSegFilePath, tarSegFilePath )
+    aseg.Compute()
+
+    numberOfLabels = sum( np.isfinite( aseg.referenceMetrics.HD[label].value ) for label in LABEL )
+
+    assert numberOfLabels > 0
+    assert len( maurerCalls ) == 2 * numberOfLabels
+
+
+def test_store_hit_builds_no_reference_distance_map( cohort, tmp_path, monkeypatch, maurerCalls ):
+    monkeypatch.setattr( myosaiq, "SPARSE_LABEL_MAX_PIXELS", 0 )
+
+    refSegFilePath, tarSegFilePath = pd.read_csv( cohort )[ ["REFERENCE", "TARGET"] ].values[0]
+
+    aseg = AssessSegmentation( refSegFilePath, tarSegFilePath )
+    aseg.Compute()
+
+    referenceStore = ReferenceStore( str(tmp_path) )
+    assert referenceStore.Precompute( refSegFilePath )
+
+    del maurerCalls[:]
+    storeAseg = AssessSegmentation( refSegFilePath, tarSegFilePath, referenceStore=referenceStore )
+    storeAseg.Compute()
+
+    assert referenceStore.Has( refSegFilePath )
+
+    numberOfLabels = sum( np.isfinite( aseg.referenceMetrics.HD[label].value ) for label in LABEL )
+
+    # Target side only.
+    assert len( maurerCalls ) == numberOfLabels
+
+    for label in LABEL:
+        for metric in ("DICE", "HD", "HD95", "ASSD"):
+            np.testing.assert_array_equal( getattr(storeAseg.referenceMetrics, metric)[label].value,
+                                           getattr(aseg.referenceMetrics, metric)[label].value )
+
+
+def getMaurerDistances( maskArray, spacing, indices, useImageSpacing ):
+    mask = sitk.GetImageFromArray( maskArray.astype(np.uint8) )
+    mask.SetSpacing( spacing )
+
+    return np.abs( sitk.GetArrayFromImage( sitk.SignedMaurerDistanceMap(mask, squaredDistance=False, useImageSpacing=useImageSpacing) ) )[indices]
+
+
+@pytest.mark.parametrize( "spacing", [ (1.25, 1.25, 8.0), (0.7, 1.1, 5.0), (2.0, 2.0, 2.0), (1.25, 1.25) ] )
+def test_distances_match_distance_maps( spacing ):
+    rng = np.random.default_rng( 3 )
+    shape = (24, 20, 9)[:len(spacing)][::-1]
+
+    # Blobs: smoothed noise, thresholded.
+    referenceMaskArray = sitk.GetArrayFromImage( sitk.SmoothingRecursiveGaussian( sitk.GetImageFromArray(rng.random(shape)), 1.5 ) ) > 0.5
+    targetMaskArray = np.roll( referenceMaskArray, 1, axis=-1 ) | np.roll( referenceMaskArray, 1, axis=0 )
+
+    distances = DistanceMapSurfaceDistances( referenceMaskArray, None, None, targetMaskArray, spacing )
+
+    referenceSurface = np.nonzero( myosaiq.getContourArray(referenceMaskArray) )
+    targetSurface = np.nonzero( myosaiq.getContourArray(targetMaskArray) )
+
+    for directedDistances, useImageSpacing in ( (distances.GetDirectedSurfaceDistances(), True),
+                                                (distances.GetDirectedVoxelDistances(), False) ):
+        np.testing.assert_allclose( directedDistances[0], getMaurerDistances(targetMaskArray, spacing, referenceSurface, useImageSpacing), atol=DISTANCE_TOLERANCE )
+        np.testing.assert_allclose( directedDistances[1], getMaurerDistances(referenceMaskArray, spacing, targetSurface, useImageSpacing), atol=DISTANCE_TOLERANCE )
+
+    referenceMask = sitk.GetImageFromArray( referenceMaskArray.astype(np.uint8) )
+    targetMask = sitk.GetImageFromArray( targetMaskArray.astype(np.uint8) )
+    referenceMask.SetSpacing( spacing )
+    targetMask.SetSpacing( spacing )
+
+    hausdorffDistance = sitk.HausdorffDistanceImageFilter()
+    hausdorffDistance.Execute( referenceMask, targetMask )
+
+    assert distances.GetHausdorffDistance() == pytest.approx( hausdorffDistance.GetHausdorffDistance(), abs=DISTANCE_TOLERANCE )
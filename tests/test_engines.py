@@ -0,0 +1,89 @@
+#-------------------------------------------------------------------------------
+# Name        : test_engines.py
+# Description : Surface distance engines (distance maps, KD-tree, sparse)
+#               give the same HD, HD95 and ASSD.
+#-------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+import pytest
+
+import myosaiq
+from myosaiq import AssessSegmentation, LABEL, SURFACE_ENGINE_DISTANCE_MAP, SURFACE_ENGINE_KDTREE
+
+
+DISTANCE_TOLERANCE = 1e-4       # float32 precision of the distance maps
+
+
+def getCases( cohort ):
+    return pd.read_csv( cohort )[ ["REFERENCE", "TARGET"] ].values.tolist()
+
+
+def getDistances( refSegFilePath, tarSegFilePath, **options ):
+    """
+    HD, HD95 and ASSD of each label (3 x labels).
+    """
+    aseg = AssessSegmentation( refSegFilePath, tarSegFilePath, **options )
+    aseg.Compute()
+
+    metrics = aseg.referenceMetrics
+
+    return np.array( [ [ measurements[label].value for label in LABEL ] for measurements in (metrics.HD, metrics.HD95, metrics.ASSD) ] )
+
+
+def test_kdtree_engine_matches_distance_maps( cohort ):
+    for refSegFilePath, tarSegFilePath in getCases( cohort ):
+        expected = getDistances( refSegFilePath, tarSegFilePath, surfaceEngine=SURFACE_ENGINE_DISTANCE_MAP )
+        distances = getDistances( refSegFilePath, tarSegFilePath, surfaceEngine=SURFACE_ENGINE_KDTREE )
+
+        assert np.isfinite( expected ).any()
+        np.testing.assert_allclose( distances, expected, rtol=0, atol=DISTANCE_TOLERANCE )
+
+
+def test_kdtree_engine_matches_slice_distance_maps( cohort ):
+    for refSegFilePath, tarSegFilePath in getCases( cohort )[:3]:
+        slices = {}
+
+        for surfaceEngine in ( SURFACE_ENGINE_DISTANCE_MAP, SURFACE_ENGINE_KDTREE ):
+            aseg = AssessSegmentation( refSegFilePath, tarSegFilePath, surfaceEngine=surfaceEngine, sliceWise=True )
+            aseg.Compute()
+
+            slices[surfaceEngine] = aseg.GetSliceDataFrame()
+
+        expected = slices[SURFACE_ENGINE_DISTANCE_MAP]
+
+        assert np.isfinite( expected["HD"] ).any()
+        np.testing.assert_allclose( slices[SURFACE_ENGINE_KDTREE][ ["HD", "ASSD"] ].values, expected[ ["HD", "ASSD"] ].values,
+                                    rtol=0, atol=DISTANCE_TOLERANCE )
+
+
+def test_slice_wise_keeps_case_distances( cohort ):
+    for refSegFilePath, tarSegFilePath in getCases( cohort ):
+        aseg = AssessSegmentation( refSegFilePath, tarSegFilePath, sliceWise=True )
+        aseg.Compute()
+
+        slices = aseg.GetSliceDataFrame()
+
+        # Slices with a label on one side only are reported, with undefined distances.
+        oneSided = (slices["REFERENCE VOLUME"] == 0) | (slices["TARGET VOLUME"] == 0)
+        assert slices.loc[ oneSided, ["HD", "ASSD"] ].isna().all().all()
+        assert ( slices.loc[ oneSided, "DICE" ] == 0 ).all()
+
+        metrics = aseg.referenceMetrics
+        distances = np.array( [ [ measurements[label].value for label in LABEL ] for measurements in (metrics.HD, metrics.HD95, metrics.ASSD) ] )
+
+        np.testing.assert_array_equal( distances, getDistances(refSegFilePath, tarSegFilePath) )
+
+
+def test_sparse_engine_matches_dense_engines( cohort, monkeypatch ):
+    # All labels through SparseSurfaceDistances (brute force: a few cases only).
+    for refSegFilePath, tarSegFilePath in getCases( cohort )[:3]:
+        monkeypatch.setattr( myosaiq, "SPARSE_LABEL_MAX_PIXELS", 10**9 )
+        distances = getDistances( refSegFilePath, tarSegFilePath )
+
+        monkeypatch.setattr( myosaiq, "SPARSE_LABEL_MAX_PIXELS", 0 )
+
+        for surfaceEngine in ( SURFACE_ENGINE_DISTANCE_MAP, SURFACE_ENGINE_KDTREE ):
+            expected = getDistances( refSegFilePath, tarSegFilePath, surfaceEngine=surfaceEngine )
+
+            assert np.isfinite( expected ).any()
+            np.testing.assert_allclose( distances, expected, rtol=0, atol=DISTANCE_TOLERANCE )
@@ -0,0 +1,28 @@
+#-------------------------------------------------------------------------------
+# Name        : test_imports.py
+# Description : Heavy dependencies are loaded on first use, without lazy
+#               proxies in sys.modules.
+#-------------------------------------------------------------------------------
+import os
+import sys
+import subprocess
+
+
+REPOSITORY_DIR = os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) )
+
+
+def runPython( code ):
+    return subprocess.check_output( [ sys.executable, "-c", code ], cwd=REPOSITORY_DIR, text=True ).split()
+
+
+def test_import_does_not_load_heavy_dependencies():
+    loaded = runPython( "import sys, myosaiq; print(*[ name in sys.modules for name in ('pandas', 'SimpleITK', 'scipy') ])" )
+
+    assert loaded == [ "False", "False", "False" ]
+
+
+def test_other_importers_get_real_modules():
+    moduleTypes = runPython( "import myosaiq, pandas, SimpleITK, types; "
+                             "print(type(pandas) is types.ModuleType, type(SimpleITK) is types.ModuleType, myosaiq.pd.DataFrame is pandas.DataFrame)" )
+
+    assert moduleTypes == [ "True", "True", "True" ]
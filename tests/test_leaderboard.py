@@ -0,0 +1,38 @@
+#-------------------------------------------------------------------------------
+# Name        : test_leaderboard.py
+# Description : Leaderboard results equal the ones of AssessSegmentations
+#               with the same options.
+#-------------------------------------------------------------------------------
+import pandas as pd
+
+import myosaiq
+from myosaiq import AssessSegmentations, Leaderboard, SURFACE_ENGINE_KDTREE
+
+
+def test_leaderboard_matches_assess_segmentations( cohort ):
+    expected = AssessSegmentations( cohort, surfaceEngine=SURFACE_ENGINE_KDTREE )
+    expected.Compute()
+
+    leaderboard = Leaderboard( cohort, { "TEAM":cohort }, jobs=2, surfaceEngine=SURFACE_ENGINE_KDTREE )
+    leaderboard.Compute()
+
+    assert leaderboard.missingCases["TEAM"] == 0
+
+    pd.testing.assert_frame_equal( leaderboard.results["TEAM"].GetDataFrame(), expected.GetDataFrame() )
+
+
+def test_leaderboard_uses_surface_engine( cohort, monkeypatch ):
+    engines = []
+
+    class CountedKDTreeSurfaceDistances( myosaiq.KDTreeSurfaceDistances ):
+        def __init__( self, *args, **kwargs ):
+            engines.append( self )
+            super().__init__( *args, **kwargs )
+
+    monkeypatch.setattr( myosaiq, "SPARSE_LABEL_MAX_PIXELS", 0 )
+    monkeypatch.setattr( myosaiq, "KDTreeSurfaceDistances", CountedKDTreeSurfaceDistances )
+
+    leaderboard = Leaderboard( cohort, { "TEAM":cohort }, surfaceEngine=SURFACE_ENGINE_KDTREE )
+    leaderboard.Compute()
+
+    assert engines
@@ -0,0 +1,77 @@
+#-------------------------------------------------------------------------------
+# Name        : test_segmentations_crps.py
+# Description : The fused segmentation to CRPS pipeline gives the scores of
+#               separate volume assessment and CRPS runs.
+#-------------------------------------------------------------------------------
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from myosaiq import AssessSegmentation, SegmentationsCRPS, VolumesCDF, LABEL, MAX_VOLUME
+
+
+def getVolumes( cohort ):
+    """
+    Case IDs, reference and target volumes (cases x labels) of separate
+    AssessSegmentation runs.
+    """
+    caseIDs = []
+    referenceVolumes = []
+    targetVolumes = []
+
+    for refSegFilePath, tarSegFilePath in pd.read_csv( cohort )[ ["REFERENCE", "TARGET"] ].values:
+        aseg = AssessSegmentation( refSegFilePath, tarSegFilePath )
+        aseg.Compute()
+
+        caseIDs.append( Path( refSegFilePath ).with_suffix('').stem )
+        referenceVolumes.append( [ aseg.referenceMetrics.VOLUME[label].value for label in LABEL ] )
+        targetVolumes.append( [ aseg.targetMetrics.VOLUME[label].value for label in LABEL ] )
+
+    return caseIDs, np.array( referenceVolumes ), np.array( targetVolumes )
+
+
+def writeSubmission( filePath, caseIDs, targetVolumes ):
+    """
+    ID, LABEL, P0, ... P599 submission with the step CDFs of the target
+    volumes.
+    """
+    with open( filePath, "w" ) as cdfFile:
+        cdfFile.write( "ID,LABEL," + ",".join( "P%d" % index for index in range(MAX_VOLUME) ) + "\n" )
+
+        for caseIndex, caseID in enumerate( caseIDs ):
+            for labelIndex, label in enumerate( LABEL ):
+                cdf = VolumesCDF.GetDummyCDF( targetVolumes[caseIndex, labelIndex] )
+                cdfFile.write( "%s,%s," % (caseID, LABEL[label]) + ",".join( "%g" % value for value in cdf ) + "\n" )
+
+    return filePath
+
+
+def test_fused_crps_matches_separate_runs( cohort, tmp_path ):
+    caseIDs, referenceVolumes, targetVolumes = getVolumes( cohort )
+
+    # Row by row CRPS of the step CDFs of the target volumes.
+    expected = {}
+
+    for caseIndex, caseID in enumerate( caseIDs ):
+        for labelIndex, label in enumerate( LABEL ):
+            cdf = VolumesCDF.GetDummyCDF( targetVolumes[caseIndex, labelIndex] )
+            volume = referenceVolumes[caseIndex, labelIndex]
+
+            expected[(caseID, LABEL[label])] = ( volume, sum( (cdf[n] - (n - volume >= 0))**2 for n in range(MAX_VOLUME) ) / MAX_VOLUME )
+
+    baseline = SegmentationsCRPS( cohort )
+    baseline.Compute()
+
+    submission = SegmentationsCRPS( cohort, writeSubmission( str(tmp_path / "submission.csv"), caseIDs, targetVolumes ) )
+    submission.Compute()
+
+    for segmentationsCRPS in ( baseline, submission ):
+        casesCRPS = segmentationsCRPS.GetCasesDataFrame()
+
+        assert len( casesCRPS ) == len( expected )
+
+        for caseID, label, volume, crps in casesCRPS.values:
+            np.testing.assert_allclose( (volume, crps), expected[(caseID, label)], rtol=1e-12 )
+
+    pd.testing.assert_frame_equal( submission.GetDataFrame(), baseline.GetDataFrame() )
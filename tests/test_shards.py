@@ -0,0 +1,71 @@
+#-------------------------------------------------------------------------------
+# Name        : test_shards.py
+# Description : Shards merged by LoadPartials give the results of a single run.
+#-------------------------------------------------------------------------------
+import pandas as pd
+
+from myosaiq import AssessSegmentations
+
+
+NUMBER_OF_SHARDS = 3
+
+
+def assessShards( cohort, outputDir, numberOfShards=NUMBER_OF_SHARDS ):
+    """
+    Partial results files of all the shards of the cohort.
+    """
+    partialFiles = []
+
+    for index in range( numberOfShards ):
+        aSegmentations = AssessSegmentations( cohort, shard=(index, numberOfShards) )
+        aSegmentations.Compute()
+
+        partialFile = str( outputDir / ("shard_%d.npz" % index) )
+        aSegmentations.ToPartial( partialFile )
+        partialFiles.append( partialFile )
+
+    return partialFiles
+
+
+def merge( partialFiles ):
+    merged = AssessSegmentations( None )
+
+    return merged, merged.LoadPartials( partialFiles )
+
+
+def test_merged_shards_equal_single_run( cohort, tmp_path ):
+    single = AssessSegmentations( cohort )
+    single.Compute()
+
+    merged, loaded = merge( assessShards(cohort, tmp_path) )
+
+    assert loaded
+    assert merged.NUM_SEGMENTATIONS == single.NUM_SEGMENTATIONS
+
+    pd.testing.assert_frame_equal( merged.GetDataFrame(), single.GetDataFrame() )
+    pd.testing.assert_frame_equal( merged.GetDataFrame("wide"), single.GetDataFrame("wide") )
+
+
+def test_duplicate_shard_is_rejected( cohort, tmp_path ):
+    partialFiles = assessShards( cohort, tmp_path )
+
+    merged, loaded = merge( [ partialFiles[0] ] + partialFiles )
+
+    assert not loaded
+    assert merged.NUM_SEGMENTATIONS == 0
+
+
+def test_missing_shard_is_rejected( cohort, tmp_path ):
+    partialFiles = assessShards( cohort, tmp_path )
+
+    assert not merge( partialFiles[:-1] )[1]
+
+
+def test_shards_of_another_split_are_rejected( cohort, tmp_path ):
+    (tmp_path / "three").mkdir()
+    (tmp_path / "two").mkdir()
+
+    partialFiles = assessShards( cohort, tmp_path / "three" )
+    otherPartialFiles = assessShards( cohort, tmp_path / "two", 2 )
+
+    assert not merge( partialFiles[:2] + otherPartialFiles[1:] )[1]